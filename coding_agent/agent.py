@@ -4,20 +4,35 @@ Core agent loop using litellm for provider-agnostic LLM calls.
 
 import json
 import os
-from typing import Any, Dict, List, Optional
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
 
-import litellm
 from rich import box
 from rich.console import Console
+from rich.live import Live
 from rich.markdown import Markdown
 from rich.panel import Panel
+from rich.spinner import Spinner
 from rich.table import Table
 from rich.text import Text
 
-from tools import TOOL_DEFINITIONS, execute_tool
-
-# Suppress litellm's verbose success messages
-litellm.suppress_debug_info = True
+from context import DEFAULT_CONTEXT_BUDGET, ContextManager
+from file_cache import get_file_cache
+from journal import SessionJournal
+from output_capture import OutputCallback
+from prompt_cache import CacheStats, add_cache_breakpoints
+from result_budget import DEFAULT_RESULT_BUDGET, ResultBudget
+from router import ModelRouter
+from scratch import ScratchDir
+from streaming import StreamAccumulator
+from shell import ShellSession
+from speculation import Speculator
+from tools import READ_ONLY_TOOLS, TOOL_DEFINITIONS, execute_tool
+from tracing import Tracer
+from transport import LiteLLMTransport, Transport
 
 SYSTEM_PROMPT = """\
 You are an expert coding agent with access to file-system and shell tools.
@@ -33,24 +48,90 @@ Always think step by step. When asked to build something, plan first, then
 implement incrementally, verifying each step with execute_bash when useful.\
 """
 
+# Upper bound on read-only tool calls run concurrently within one turn
+MAX_PARALLEL_TOOLS = 8
+
+# Minimum seconds between re-renders of the streaming preview
+STREAM_RENDER_INTERVAL = 0.1
+
+# Lines of a running shell command's output shown live in the console
+LIVE_TAIL_LINES = 8
+
+# Most recent turns listed by /stats
+STATS_TURNS = 10
+
+# (tool_call_id, tool name, parsed arguments)
+ToolCall = Tuple[str, str, Dict[str, Any]]
+
+EXIT_COMMANDS = {"exit", "quit", "bye", "/exit", "/quit"}
+
 # Icons for each tool (used in the CLI display)
 TOOL_ICONS: Dict[str, str] = {
     "read_file": "📖",
     "write_file": "✍️ ",
+    "edit_file": "🩹",
     "create_directory": "📁",
     "list_directory": "📂",
     "execute_bash": "⚡",
     "search_files": "🔍",
     "grep_search": "🔎",
+    "repo_map": "🗺️ ",
+    "find_symbol": "🧭",
+    "read_symbol": "📑",
+    "start_job": "🚀",
+    "job_status": "📊",
+    "job_output": "📜",
+    "kill_job": "🛑",
 }
 
 
 class CodingAgent:
-    def __init__(self, model: str = "claude-3-5-sonnet-20241022", cwd: str = "."):
+    def __init__(
+        self,
+        model: str = "claude-3-5-sonnet-20241022",
+        cwd: str = ".",
+        stream: bool = False,
+        console: Optional[Console] = None,
+        context_budget: int = DEFAULT_CONTEXT_BUDGET,
+        prompt_cache: bool = False,
+        persistent_shell: bool = False,
+        result_budget: int = DEFAULT_RESULT_BUDGET,
+        tool_budgets: Optional[Dict[str, int]] = None,
+        journal: Optional[SessionJournal] = None,
+        transport: Optional[Transport] = None,
+        trace_export: Optional[str] = None,
+        speculate: bool = True,
+    ):
         self.model = model
         self.cwd = os.path.abspath(cwd)
-        self.messages: List[Dict[str, Any]] = []
-        self.console = Console()
+        self.stream = stream
+        # Every message added to the history is also appended to the journal;
+        # a journal opened with --resume brings its live conversation back
+        self.journal = journal
+        self.messages: List[Dict[str, Any]] = journal.load() if journal is not None else []
+        self.console = console or Console()
+        # Where completions come from: the provider, a recording, or a script
+        self.transport = transport or LiteLLMTransport()
+        self.context = ContextManager(model, budget=context_budget)
+        self.prompt_cache = prompt_cache
+        self.cache_stats = CacheStats()
+        # Spilled command output and untruncated tool results; removed by close()
+        self.scratch = ScratchDir()
+        self.result_budget = ResultBudget(result_budget, tool_budgets, self.scratch)
+        # Spans for every turn, LLM call and tool run; /stats reads them
+        self.tracer = Tracer(
+            {"session.id": journal.id if journal is not None else None},
+            export_path=trace_export,
+        )
+        # One long-lived bash process for execute_bash, if requested
+        self.shell: Optional[ShellSession] = ShellSession(self.cwd) if persistent_shell else None
+        self._tool_pool = ThreadPoolExecutor(
+            max_workers=MAX_PARALLEL_TOOLS, thread_name_prefix="tool"
+        )
+        # Starts read-only tool calls while a streamed response is still arriving
+        self.speculator: Optional[Speculator] = (
+            Speculator(self._start_speculative) if speculate else None
+        )
 
     # ------------------------------------------------------------------
     # Public entry point
@@ -66,98 +147,354 @@ class CodingAgent:
                     continue
 
                 cmd = user_input.strip().lower()
-                if cmd in {"exit", "quit", "bye", "/exit", "/quit"}:
-                    self.console.print("\n[dim]Goodbye! 👋[/dim]\n")
+                if cmd in EXIT_COMMANDS:
+                    self._print_goodbye()
                     break
-                elif cmd in {"/clear", "/reset"}:
-                    self.messages = []
-                    self.console.print("[dim]Conversation cleared.[/dim]\n")
-                    continue
-                elif cmd == "/help":
-                    self._print_help()
+                if self._handle_command(cmd):
                     continue
 
-                self.messages.append({"role": "user", "content": user_input})
+                self._add_messages({"role": "user", "content": user_input})
                 self._run_agent_loop()
 
             except KeyboardInterrupt:
                 self.console.print("\n\n[dim]Interrupted. Type 'exit' to quit.[/dim]\n")
             except EOFError:
-                self.console.print("\n[dim]Goodbye! 👋[/dim]\n")
+                self._print_goodbye()
                 break
 
+    def turn_outcome(self) -> Dict[str, Any]:
+        """Status, error and metrics of the most recent turn, for headless callers."""
+        turn = self.tracer.turns[-1]
+        summary = self.tracer.turn_summary(turn)
+        outcome: Dict[str, Any] = {"status": "ok"}
+        if summary["error"]:
+            outcome.update(status="error", error=summary["error"])
+        elif turn.attributes.get("agent.turn.max_iterations_reached"):
+            outcome.update(status="incomplete", error="reached the maximum number of iterations")
+        outcome["metrics"] = {
+            "seconds": round(summary["seconds"], 3),
+            "llm_calls": summary["llm_calls"],
+            "llm_seconds": round(summary["llm_seconds"], 3),
+            "input_tokens": summary["input_tokens"],
+            "output_tokens": summary["output_tokens"],
+            "cache_read_tokens": summary["cache_read_tokens"],
+            "tool_calls": summary["tool_calls"],
+            "tool_seconds": round(summary["tool_seconds"], 3),
+            "tool_errors": sum(1 for s in turn.children if s.kind == "tool" and s.error),
+            "results_truncated": self.result_budget.truncated,
+        }
+        return outcome
+
+    def close(self) -> None:
+        """Release the shell, tool threads, journal and scratch files; the agent is done after this."""
+        if self.shell is not None:
+            self.shell.close()
+        self._tool_pool.shutdown(wait=False)
+        if self.journal is not None:
+            self.journal.close()
+        self.scratch.close()
+
+    def _handle_command(self, cmd: str) -> bool:
+        """Run a REPL slash command; returns False if *cmd* is not one."""
+        if cmd in {"/clear", "/reset"}:
+            self.messages = []
+            if self.journal is not None:
+                self.journal.clear()
+            self.console.print("[dim]Conversation cleared.[/dim]\n")
+            return True
+        if cmd == "/stats":
+            self._print_stats()
+            return True
+        if cmd == "/help":
+            self._print_help()
+            return True
+        return False
+
     # ------------------------------------------------------------------
     # Agent loop
     # ------------------------------------------------------------------
 
-    def _run_agent_loop(self, max_iterations: int = 50) -> None:
-        """Call the LLM repeatedly until it stops requesting tool calls."""
-        for _ in range(max_iterations):
-            with self.console.status(
-                "[bold blue]◉  Thinking…[/bold blue]", spinner="dots", spinner_style="bold blue"
-            ):
+    def _run_agent_loop(self, max_iterations: int = 50) -> Optional[str]:
+        """
+        Call the LLM repeatedly until it stops requesting tool calls.
+
+        Returns the final assistant text, or None if the turn failed.
+        """
+        with self.tracer.turn() as turn:
+            for _ in range(max_iterations):
+                self._compact_context()
                 try:
-                    response = litellm.completion(
-                        model=self.model,
-                        messages=[{"role": "system", "content": SYSTEM_PROMPT}] + self.messages,
-                        tools=TOOL_DEFINITIONS,
-                        tool_choice="auto",
-                        max_tokens=8096,
-                    )
+                    message, finish_reason = self._complete()
                 except Exception as exc:
                     self.console.print(f"\n[bold red]LLM error:[/bold red] {exc}\n")
-                    return
+                    return None
 
-            message = response.choices[0].message
-            finish_reason = response.choices[0].finish_reason
+                # Persist the assistant turn (serialise to plain dict for history)
+                self._add_messages(self._serialise_message(message))
 
-            # Persist the assistant turn (serialise to plain dict for history)
-            self.messages.append(self._serialise_message(message))
+                # ---- Final text response ----
+                if finish_reason != "tool_calls" or not message.tool_calls:
+                    if message.content:
+                        self._display_response(message.content)
+                    return message.content
 
-            # ---- Final text response ----
-            if finish_reason != "tool_calls" or not message.tool_calls:
+                # ---- Display any prose before tool calls ----
                 if message.content:
-                    self._display_response(message.content)
-                return
+                    self._display_thinking(message.content)
 
-            # ---- Display any prose before tool calls ----
-            if message.content:
-                self._display_thinking(message.content)
+                # ---- Execute the requested tool calls ----
+                self._add_messages(*self._execute_tool_calls(message.tool_calls))
 
-            # ---- Execute each requested tool call ----
-            tool_result_messages: List[Dict[str, Any]] = []
-            for tc in message.tool_calls:
-                try:
-                    args = json.loads(tc.function.arguments)
-                except json.JSONDecodeError:
-                    args = {}
-                result = self._execute_tool(tc.function.name, args, tc.id)
-                tool_result_messages.append(
-                    {
-                        "role": "tool",
-                        "tool_call_id": tc.id,
-                        "name": tc.function.name,
-                        "content": result,
-                    }
-                )
+            self.console.print("[yellow]Warning: reached maximum tool-call iterations.[/yellow]")
+            turn.set("agent.turn.max_iterations_reached", True)
+            return None
+
+    # ------------------------------------------------------------------
+    # LLM calls
+    # ------------------------------------------------------------------
 
-            self.messages.extend(tool_result_messages)
+    def _add_messages(self, *messages: Dict[str, Any]) -> None:
+        """Append to the history, journaling each message first."""
+        for message in messages:
+            if self.journal is not None:
+                self.journal.append(message)
+            self.messages.append(message)
+
+    def _compact_context(self) -> None:
+        """Shrink old tool output if the history has outgrown its token budget."""
+        report = self.context.compact(self.messages)
+        if report:
+            self.console.print(
+                f"[dim]Context compacted: {report.compacted} old tool result(s) elided, "
+                f"saved {report.saved:,} tokens ({report.before:,} → {report.after:,}).[/dim]"
+            )
 
-        self.console.print("[yellow]Warning: reached maximum tool-call iterations.[/yellow]")
+    def _build_request(self) -> Dict[str, Any]:
+        """Keyword arguments for the next completion call (``litellm.completion`` format)."""
+        request: Dict[str, Any] = dict(
+            model=self.model,
+            messages=[{"role": "system", "content": SYSTEM_PROMPT}] + self.messages,
+            tools=TOOL_DEFINITIONS,
+            tool_choice="auto",
+            max_tokens=8096,
+        )
+        if self.stream:
+            request["stream_options"] = {"include_usage": True}
+        if self.prompt_cache:
+            request = add_cache_breakpoints(request)
+        return request
+
+    def _llm_span(self, request: Dict[str, Any]) -> Any:
+        """Span for one model call, named per the OpenTelemetry GenAI conventions."""
+        return self.tracer.span(
+            f"chat {self.model}",
+            "llm",
+            {
+                "gen_ai.operation.name": "chat",
+                "gen_ai.request.model": self.model,
+                "gen_ai.request.max_tokens": request.get("max_tokens"),
+                "llm.streaming": self.stream,
+                "llm.request.messages": len(request["messages"]),
+            },
+        )
+
+    def _record_usage(self, usage: Any) -> None:
+        span = self.tracer.current()
+        if span is not None:
+            span.record_usage(usage)
+        stats = self.cache_stats.record(usage)
+        if self.prompt_cache and stats:
+            self.console.print(
+                f"[dim]  cache: {stats['read']:,} read · {stats['written']:,} written · "
+                f"{stats['uncached']:,} uncached[/dim]"
+            )
+
+    def _complete(self) -> Tuple[Any, Optional[str]]:
+        """Request the next assistant turn; returns (message, finish_reason)."""
+        request = self._build_request()
+        with self._llm_span(request) as span:
+            if self.stream:
+                message, finish_reason = self._complete_streaming(request)
+            else:
+                with self.console.status(
+                    "[bold blue]◉  Thinking…[/bold blue]", spinner="dots", spinner_style="bold blue"
+                ):
+                    response = self.transport.complete(request)
+                self._record_usage(getattr(response, "usage", None))
+                choice = response.choices[0]
+                message, finish_reason = choice.message, choice.finish_reason
+            span.set("gen_ai.response.finish_reasons", [finish_reason or "unknown"])
+            span.set("llm.tool_calls", len(message.tool_calls or []))
+        return message, finish_reason
+
+    def _complete_streaming(self, request: Dict[str, Any]) -> Tuple[Any, Optional[str]]:
+        """
+        Stream the next assistant turn, previewing prose as it arrives.
+
+        The live preview is transient: once the stream ends it is cleared and
+        the caller renders the finished message exactly as in non-streaming
+        mode.
+        """
+        acc = StreamAccumulator()
+        span = self.tracer.current()
+        last_render = 0.0
+        if self.speculator is not None:
+            self.speculator.reset()
+        with self._stream_live() as live:
+            for chunk in self.transport.stream(request):
+                if span is not None and not span.events:
+                    span.event("first_token")
+                text = acc.add_chunk(chunk)
+                if self.speculator is not None:
+                    self.speculator.observe(acc)
+                now = time.monotonic()
+                if text and now - last_render >= STREAM_RENDER_INTERVAL:
+                    live.update(self._render_stream_preview(acc.content))
+                    last_render = now
+        self._record_usage(acc.usage)
+        return acc.build_message(), acc.finish_reason
+
+    def _stream_live(self) -> Live:
+        thinking = Spinner("dots", text="[bold blue]◉  Thinking…[/bold blue]", style="bold blue")
+        return Live(thinking, console=self.console, transient=True, refresh_per_second=10)
+
+    def _render_stream_preview(self, text: str) -> Panel:
+        # Show only the tail so long answers keep scrolling inside the viewport
+        max_lines = max(self.console.height - 6, 5)
+        tail = "\n".join(text.splitlines()[-max_lines:])
+        return Panel(Markdown(tail), border_style="dim blue", padding=(0, 2))
 
     # ------------------------------------------------------------------
     # Tool execution
     # ------------------------------------------------------------------
 
+    def _execute_tool_calls(self, tool_calls: List[Any]) -> List[Dict[str, Any]]:
+        """
+        Run one turn's tool calls and return their tool messages in call order.
+
+        Consecutive read-only calls are fanned out to the thread pool; any
+        other call runs on its own, so writes and shell commands keep their
+        position relative to everything around them.  Calls already started
+        while the response streamed in are picked up where they are.
+        """
+        calls = self._parse_tool_calls(tool_calls)
+        speculated = self.speculator.claim(calls) if self.speculator is not None else {}
+        results: List[str] = []
+        for batch in self._batch_tool_calls(calls):
+            if len(batch) == 1 and batch[0][0] not in speculated:
+                call_id, name, args = batch[0]
+                results.append(self._execute_tool(name, args, call_id))
+                continue
+            futures = [
+                speculated.get(call_id) or self._tool_pool.submit(self._run_tool, name, args)
+                for call_id, name, args in batch
+            ]
+            for (_, name, args), future in zip(batch, futures):
+                self._display_tool_call(name, args)
+                result = future.result()
+                self._display_tool_result(result)
+                results.append(result)
+        return self._tool_messages(calls, results)
+
+    @staticmethod
+    def _parse_tool_calls(tool_calls: List[Any]) -> List[ToolCall]:
+        calls = []
+        for tc in tool_calls:
+            try:
+                args = json.loads(tc.function.arguments)
+            except json.JSONDecodeError:
+                args = {}
+            calls.append((tc.id, tc.function.name, args))
+        return calls
+
+    @staticmethod
+    def _batch_tool_calls(calls: List[ToolCall]) -> List[List[ToolCall]]:
+        """Group consecutive read-only calls; every other call is a batch of one."""
+        batches: List[List[ToolCall]] = []
+        for call in calls:
+            if (
+                call[1] in READ_ONLY_TOOLS
+                and batches
+                and all(c[1] in READ_ONLY_TOOLS for c in batches[-1])
+            ):
+                batches[-1].append(call)
+            else:
+                batches.append([call])
+        return batches
+
+    def _tool_messages(self, calls: List[ToolCall], results: List[str]) -> List[Dict[str, Any]]:
+        """Tool messages for *results*, each cut down to its tool's budget."""
+        return [
+            {
+                "role": "tool",
+                "tool_call_id": call_id,
+                "name": name,
+                "content": self.result_budget.apply(name, args, result),
+            }
+            for (call_id, name, args), result in zip(calls, results)
+        ]
+
     def _execute_tool(self, name: str, args: Dict[str, Any], call_id: str) -> str:
         self._display_tool_call(name, args)
-        try:
-            result = execute_tool(name, args, self.cwd)
-        except Exception as exc:
-            result = f"Error: {exc}"
+        if name == "execute_bash":
+            with self._live_tail() as on_output:
+                result = self._run_tool(name, args, on_output)
+        else:
+            result = self._run_tool(name, args)
         self._display_tool_result(result)
         return result
 
+    def _run_tool(
+        self,
+        name: str,
+        args: Dict[str, Any],
+        on_output: Optional[OutputCallback] = None,
+        speculative: bool = False,
+    ) -> str:
+        with self._tool_span(name, speculative) as span:
+            try:
+                result = execute_tool(name, args, self.cwd, self.shell, on_output, self.scratch)
+            except Exception as exc:
+                result = f"Error: {exc}"
+            span.record_tool_result(result)
+        return result
+
+    def _tool_span(self, name: str, speculative: bool = False) -> Any:
+        attributes: Dict[str, Any] = {"gen_ai.tool.name": name}
+        if speculative:
+            attributes["tool.speculative"] = True
+        return self.tracer.span(f"execute_tool {name}", "tool", attributes)
+
+    def _start_speculative(self, name: str, args: Dict[str, Any]) -> Any:
+        """Run a read-only call ahead of the end of the stream (see ``Speculator``)."""
+        return self._tool_pool.submit(self._run_tool, name, args, speculative=True)
+
+    @contextmanager
+    def _live_tail(self) -> Iterator[OutputCallback]:
+        """
+        Show the last few lines of a running command below its tool call.
+
+        Yields the ``on_output`` callback to hand to the tool; the view is
+        transient and disappears once the command finishes.
+        """
+        lines: Deque[str] = deque([""], maxlen=LIVE_TAIL_LINES)
+        last_render = 0.0
+        with Live(Text(""), console=self.console, transient=True, refresh_per_second=10) as live:
+
+            def on_output(text: str) -> None:
+                nonlocal last_render
+                first, *rest = text.replace("\r", "\n").split("\n")
+                lines[-1] += first
+                lines.extend(rest)
+                now = time.monotonic()
+                if now - last_render >= STREAM_RENDER_INTERVAL:
+                    last_render = now
+                    width = max(self.console.width - 6, 20)
+                    shown = "\n".join(f"    {line[:width]}" for line in lines)
+                    live.update(Text(shown, style="dim"))
+
+            yield on_output
+
     # ------------------------------------------------------------------
     # Display helpers
     # ------------------------------------------------------------------
@@ -168,10 +505,24 @@ class CodingAgent:
         # Build a short human-readable description of the call
         if name == "read_file":
             desc = f"[cyan]{args.get('path', '')}[/cyan]"
+            if args.get("byte_range"):
+                start, end = args["byte_range"][:2]
+                desc += f" [dim](bytes {start}-{end})[/dim]"
+            elif args.get("offset") or args.get("limit"):
+                start = args.get("offset") or 1
+                end = f"{start + args['limit'] - 1}" if args.get("limit") else "end"
+                desc += f" [dim](lines {start}-{end})[/dim]"
         elif name == "write_file":
             path = args.get("path", "")
             lines = len(args.get("content", "").splitlines())
             desc = f"[cyan]{path}[/cyan] [dim]({lines} lines)[/dim]"
+        elif name == "edit_file":
+            path = args.get("path", "")
+            if args.get("patch"):
+                hunks = args["patch"].count("\n@@") + args["patch"].startswith("@@")
+                desc = f"[cyan]{path}[/cyan] [dim]({hunks} hunk(s))[/dim]"
+            else:
+                desc = f"[cyan]{path}[/cyan] [dim]({len(args.get('edits') or [])} edit(s))[/dim]"
         elif name == "create_directory":
             desc = f"[cyan]{args.get('path', '')}[/cyan]"
         elif name == "list_directory":
@@ -180,6 +531,12 @@ class CodingAgent:
             cmd = args.get("command", "")
             truncated = cmd[:90] + ("…" if len(cmd) > 90 else "")
             desc = f"[bold yellow]{truncated}[/bold yellow]"
+        elif name == "start_job":
+            cmd = args.get("command", "")
+            truncated = cmd[:90] + ("…" if len(cmd) > 90 else "")
+            desc = f"[bold yellow]{truncated}[/bold yellow]"
+        elif name in ("job_status", "job_output", "kill_job"):
+            desc = f"[cyan]{args.get('job_id') or 'all jobs'}[/cyan]"
         elif name == "search_files":
             desc = (
                 f"[cyan]{args.get('pattern', '')}[/cyan]"
@@ -190,6 +547,12 @@ class CodingAgent:
                 f"[cyan]{args.get('pattern', '')}[/cyan]"
                 f" in [cyan]{args.get('path', '.')}[/cyan]"
             )
+        elif name == "repo_map":
+            desc = f"[cyan]{args.get('path', '.')}[/cyan]"
+        elif name in ("find_symbol", "read_symbol"):
+            desc = f"[cyan]{args.get('name', '')}[/cyan]"
+            if args.get("path", ".") != ".":
+                desc += f" in [cyan]{args['path']}[/cyan]"
         else:
             desc = " ".join(f"{k}={v!r}" for k, v in args.items())
 
@@ -213,11 +576,13 @@ class CodingAgent:
             self.console.print(f"\n[dim]{text.strip()}[/dim]\n")
 
     def _display_response(self, text: str) -> None:
-        self.console.print()
-        self.console.print(
-            Panel(Markdown(text), border_style="blue", padding=(1, 2))
-        )
-        self.console.print()
+        # Markdown rendering of a long answer is not free; keep it visible in /stats
+        with self.tracer.span("render response", "render", {"render.chars": len(text)}):
+            self.console.print()
+            self.console.print(
+                Panel(Markdown(text), border_style="blue", padding=(1, 2))
+            )
+            self.console.print()
 
     def _get_user_input(self) -> str:
         self.console.print("[bold cyan]❯[/bold cyan] ", end="")
@@ -240,18 +605,121 @@ class CodingAgent:
         )
         self.console.print(f"  [dim]Model  :[/dim]  [bold]{self.model}[/bold]")
         self.console.print(f"  [dim]Workdir:[/dim]  {self.cwd}")
+        if self.journal is not None:
+            resumed = f"  ·  resumed {len(self.messages)} messages" if self.messages else ""
+            self.console.print(f"  [dim]Session:[/dim]  {self.journal.id}[dim]{resumed}[/dim]")
         self.console.print()
 
+    def _print_goodbye(self) -> None:
+        if self.journal is not None:
+            self.journal.close()
+            self.console.print(f"\n[dim]Resume this session with --resume {self.journal.id}[/dim]")
+        self.console.print("\n[dim]Goodbye! 👋[/dim]\n")
+
     def _print_help(self) -> None:
         table = Table(box=box.SIMPLE, show_header=False, padding=(0, 2))
         table.add_column("Command", style="cyan bold")
         table.add_column("Description", style="dim")
         table.add_row("/clear, /reset", "Clear conversation history")
+        table.add_row("/stats", "Show timings and token usage for recent turns and the session")
         table.add_row("/help", "Show this help")
         table.add_row("exit, quit", "Exit the agent")
         self.console.print(Panel(table, title="[bold]Commands[/bold]", border_style="dim"))
         self.console.print()
 
+    def _print_stats(self) -> None:
+        tracer = self.tracer
+        totals = tracer.totals
+        if not totals["turns"]:
+            self.console.print("[dim]No turns yet.[/dim]\n")
+            return
+
+        turns = Table(
+            box=box.SIMPLE,
+            padding=(0, 1),
+            caption="Model, Tools: time (calls)  ·  Tokens: in→out  ·  Tools: wall time",
+            caption_style="dim",
+        )
+        for column in ("Turn", "Total", "Model", "Tokens", "Cached", "Tools", "Render", "Other"):
+            turns.add_column(column, justify="right", no_wrap=True)
+        for turn in list(tracer.turns)[-STATS_TURNS:]:
+            t = tracer.turn_summary(turn)
+            turns.add_row(
+                f"[red]{t['number']}[/red]" if t["error"] else str(t["number"]),
+                f"{t['seconds']:.2f}s",
+                f"{t['llm_seconds']:.2f}s ({t['llm_calls']})",
+                f"{t['input_tokens']:,}→{t['output_tokens']:,}",
+                f"{t['cache_read_tokens']:,}",
+                f"{t['tool_seconds']:.2f}s ({t['tool_calls']})",
+                f"{t['render_seconds']:.2f}s",
+                f"{t['other_seconds']:.2f}s",
+            )
+
+        tools = Table(box=box.SIMPLE, padding=(0, 1))
+        tools.add_column("Tool", style="cyan")
+        for column in ("Calls", "Errors", "Total", "p50", "p90", "Max", "Output"):
+            tools.add_column(column, justify="right")
+        for name, t in tracer.tool_summary().items():
+            tools.add_row(
+                name,
+                str(t["calls"]),
+                str(t["errors"]),
+                f"{t['seconds']:.2f}s",
+                f"{t['p50'] * 1000:.0f}ms",
+                f"{t['p90'] * 1000:.0f}ms",
+                f"{t['max'] * 1000:.0f}ms",
+                f"{t['bytes'] / 1024:,.1f}KB",
+            )
+
+        models = Table(box=box.SIMPLE, padding=(0, 1))
+        models.add_column("Model", style="cyan")
+        for column in ("Calls", "Errors", "p50", "p95", "Hedges won", "Status"):
+            models.add_column(column, justify="right")
+        if isinstance(self.transport, ModelRouter):
+            for m in self.transport.stats():
+                models.add_row(
+                    m["model"],
+                    str(m["calls"]),
+                    f"{m['errors']} ({m['error_rate']:.0%})",
+                    f"{m['p50']:.2f}s" if m["p50"] is not None else "-",
+                    f"{m['p95']:.2f}s" if m["p95"] is not None else "-",
+                    str(m["hedges_won"]),
+                    f"[yellow]cooling {m['cooling']:.0f}s[/yellow]" if m["cooling"] else "ok",
+                )
+
+        files = get_file_cache(self.cwd).stats()
+        summary = Text.assemble(
+            (f"{int(totals['turns'])} turns", "bold"),
+            f" in {totals['turn_seconds']:.1f}s  ·  ",
+            (f"{int(totals['llm_calls'])} LLM calls", "bold"),
+            f" {totals['llm_seconds']:.1f}s, {int(totals['llm_errors'])} failed  ·  ",
+            (f"{int(totals['tool_calls'])} tool calls", "bold"),
+            f" {totals['tool_seconds']:.1f}s, {int(totals['tool_errors'])} errors\n",
+            f"Tokens: {int(totals['input_tokens']):,} in · {int(totals['output_tokens']):,} out · "
+            f"cache {int(totals['cache_read_tokens']):,} read / "
+            f"{int(totals['cache_write_tokens']):,} written "
+            f"({self.cache_stats.hit_rate:.0%} hit rate)\n",
+            f"Results truncated to budget: {self.result_budget.truncated}  ·  "
+            f"file cache: {files['hits']:,} hits / {files['misses']:,} misses",
+            style="dim",
+        )
+        speculator = self.speculator
+        if speculator is not None and speculator.started:
+            summary.append(
+                f"\nTool calls started while streaming: {speculator.started} "
+                f"({speculator.used} used, {speculator.discarded} discarded)",
+                style="dim",
+            )
+        self.console.print(Panel(summary, title="[bold]Session[/bold]", border_style="dim"))
+        self.console.print(turns)
+        if tracer.tools:
+            self.console.print(tools)
+        if models.row_count:
+            self.console.print(models)
+        if tracer.export_path:
+            self.console.print(f"[dim]Traces exported to {tracer.export_path}[/dim]")
+        self.console.print()
+
     # ------------------------------------------------------------------
     # Utilities
     # ------------------------------------------------------------------
@@ -275,3 +743,4 @@ class CodingAgent:
                 for tc in message.tool_calls
             ]
         return d
+
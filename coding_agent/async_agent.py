@@ -0,0 +1,183 @@
+"""
+Asynchronous agent loop for hosting many conversations in one process.
+
+``AsyncCodingAgent`` keeps the behaviour and display of ``CodingAgent`` but
+never blocks the event loop: LLM calls go through the transport's async
+methods (``litellm.acompletion`` by default),
+shell commands run as asyncio subprocesses, and user input is read on a
+worker thread.  Hundreds of sessions can therefore share a single loop.
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from agent import EXIT_COMMANDS, STREAM_RENDER_INTERVAL, CodingAgent
+from output_capture import OutputCallback
+from streaming import StreamAccumulator
+from tools import execute_tool_async
+
+
+class AsyncCodingAgent(CodingAgent):
+    # ------------------------------------------------------------------
+    # Public entry points
+    # ------------------------------------------------------------------
+
+    async def run(self) -> None:  # type: ignore[override]
+        """Start the interactive REPL on the running event loop."""
+        self._print_welcome()
+        while True:
+            try:
+                user_input = await asyncio.to_thread(self._get_user_input)
+                if not user_input.strip():
+                    continue
+
+                cmd = user_input.strip().lower()
+                if cmd in EXIT_COMMANDS:
+                    self._print_goodbye()
+                    break
+                if self._handle_command(cmd):
+                    continue
+
+                await self.send(user_input)
+
+            except KeyboardInterrupt:
+                self.console.print("\n\n[dim]Interrupted. Type 'exit' to quit.[/dim]\n")
+            except EOFError:
+                self._print_goodbye()
+                break
+
+    async def send(self, user_input: str) -> Optional[str]:
+        """Add a user message, run the agent loop, and return the final answer."""
+        self._add_messages({"role": "user", "content": user_input})
+        return await self._run_agent_loop()
+
+    # ------------------------------------------------------------------
+    # Agent loop
+    # ------------------------------------------------------------------
+
+    async def _run_agent_loop(self, max_iterations: int = 50) -> Optional[str]:  # type: ignore[override]
+        """Async counterpart of ``CodingAgent._run_agent_loop``."""
+        with self.tracer.turn() as turn:
+            for _ in range(max_iterations):
+                self._compact_context()
+                try:
+                    message, finish_reason = await self._complete()
+                except Exception as exc:
+                    self.console.print(f"\n[bold red]LLM error:[/bold red] {exc}\n")
+                    return None
+
+                self._add_messages(self._serialise_message(message))
+
+                if finish_reason != "tool_calls" or not message.tool_calls:
+                    if message.content:
+                        self._display_response(message.content)
+                    return message.content
+
+                if message.content:
+                    self._display_thinking(message.content)
+
+                self._add_messages(*await self._execute_tool_calls(message.tool_calls))
+
+            self.console.print("[yellow]Warning: reached maximum tool-call iterations.[/yellow]")
+            turn.set("agent.turn.max_iterations_reached", True)
+            return None
+
+    # ------------------------------------------------------------------
+    # LLM calls
+    # ------------------------------------------------------------------
+
+    async def _complete(self) -> Tuple[Any, Optional[str]]:  # type: ignore[override]
+        request = self._build_request()
+        with self._llm_span(request) as span:
+            if self.stream:
+                message, finish_reason = await self._complete_streaming(request)
+            else:
+                with self.console.status(
+                    "[bold blue]◉  Thinking…[/bold blue]", spinner="dots", spinner_style="bold blue"
+                ):
+                    response = await self.transport.acomplete(request)
+                self._record_usage(getattr(response, "usage", None))
+                choice = response.choices[0]
+                message, finish_reason = choice.message, choice.finish_reason
+            span.set("gen_ai.response.finish_reasons", [finish_reason or "unknown"])
+            span.set("llm.tool_calls", len(message.tool_calls or []))
+        return message, finish_reason
+
+    async def _complete_streaming(  # type: ignore[override]
+        self, request: Dict[str, Any]
+    ) -> Tuple[Any, Optional[str]]:
+        acc = StreamAccumulator()
+        span = self.tracer.current()
+        last_render = 0.0
+        if self.speculator is not None:
+            self.speculator.reset()
+        with self._stream_live() as live:
+            async for chunk in self.transport.astream(request):
+                if span is not None and not span.events:
+                    span.event("first_token")
+                text = acc.add_chunk(chunk)
+                if self.speculator is not None:
+                    self.speculator.observe(acc)
+                now = time.monotonic()
+                if text and now - last_render >= STREAM_RENDER_INTERVAL:
+                    live.update(self._render_stream_preview(acc.content))
+                    last_render = now
+        self._record_usage(acc.usage)
+        return acc.build_message(), acc.finish_reason
+
+    # ------------------------------------------------------------------
+    # Tool execution
+    # ------------------------------------------------------------------
+
+    async def _execute_tool_calls(  # type: ignore[override]
+        self, tool_calls: List[Any]
+    ) -> List[Dict[str, Any]]:
+        """Gather each read-only batch concurrently; other calls run in order."""
+        calls = self._parse_tool_calls(tool_calls)
+        speculated = self.speculator.claim(calls) if self.speculator is not None else {}
+        results: List[str] = []
+        for batch in self._batch_tool_calls(calls):
+            if len(batch) == 1 and batch[0][0] not in speculated:
+                _, name, args = batch[0]
+                self._display_tool_call(name, args)
+                if name == "execute_bash":
+                    with self._live_tail() as on_output:
+                        result = await self._run_tool(name, args, on_output)
+                else:
+                    result = await self._run_tool(name, args)
+                self._display_tool_result(result)
+                results.append(result)
+                continue
+            batch_results = await asyncio.gather(
+                *(
+                    speculated.get(call_id) or self._run_tool(name, args)
+                    for call_id, name, args in batch
+                )
+            )
+            for (_, name, args), result in zip(batch, batch_results):
+                self._display_tool_call(name, args)
+                self._display_tool_result(result)
+                results.append(result)
+        return self._tool_messages(calls, results)
+
+    async def _run_tool(  # type: ignore[override]
+        self,
+        name: str,
+        args: Dict[str, Any],
+        on_output: Optional[OutputCallback] = None,
+        speculative: bool = False,
+    ) -> str:
+        with self._tool_span(name, speculative) as span:
+            try:
+                result = await execute_tool_async(
+                    name, args, self.cwd, self.shell, on_output, self.scratch
+                )
+            except Exception as exc:
+                result = f"Error: {exc}"
+            span.record_tool_result(result)
+        return result
+
+    def _start_speculative(self, name: str, args: Dict[str, Any]) -> Any:
+        # A task on the running loop; the stream being read is on the same loop
+        return asyncio.ensure_future(self._run_tool(name, args, speculative=True))
@@ -0,0 +1,37 @@
+"""
+Atomic file replacement shared by the journal, symbol index, tracer and
+``edit_file``.
+
+The data is written to a temp file beside the target, synced, and renamed
+over it, so a reader (or the next session after a crash) sees the old file
+or the new one, never a half-written mix.
+"""
+
+import os
+import shutil
+import tempfile
+from typing import Optional
+
+
+def atomic_write(
+    path: str, data: bytes, prefix: str = ".tmp-", copy_mode_from: Optional[str] = None
+) -> None:
+    """
+    Replace *path* with *data*; its directory must exist.  The new file has
+    the permission bits of *copy_mode_from* if given, else ``mkstemp``'s 0600.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=prefix)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if copy_mode_from is not None:
+            shutil.copymode(copy_mode_from, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
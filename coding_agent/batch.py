@@ -0,0 +1,230 @@
+"""
+Headless batch mode: run many tasks across a pool of agent processes.
+
+Tasks come from a JSONL file, one object per line:
+
+    {"id": "fix-42", "prompt": "Fix the failing test in tests/test_io.py",
+     "cwd": "repos/io", "model": "gpt-4o", "max_iterations": 30}
+
+Only ``prompt`` is required; ``cwd`` and ``model`` default to the command
+line's, ``id`` to ``task-<line>``.  Each task gets a fresh ``CodingAgent``
+in one of ``workers`` spawned processes, so tasks share no history, shell
+or interpreter state with whatever ran alongside them.  The per-provider
+request and token budgets (``ratelimit.RateLimits``) in the transport
+options are shared by the whole pool, so workers back off together.
+
+Each finished task is written as one JSONL record with its status, final
+answer and metrics (time, tokens, tool calls) as soon as it completes.
+"""
+
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Any, Dict, List, Optional, TextIO
+
+from transport import create_transport
+
+# Worker processes used when --workers is not given
+DEFAULT_WORKERS = 4
+
+# Agent loop iterations per task unless the task sets max_iterations
+DEFAULT_MAX_ITERATIONS = 50
+
+# Keys a task line may carry
+TASK_KEYS = {"id", "prompt", "cwd", "model", "max_iterations"}
+
+
+class BatchError(Exception):
+    pass
+
+
+# ---------------------------------------------------------------------------
+# Tasks
+# ---------------------------------------------------------------------------
+
+def load_tasks(path: str, cwd: str, model: str) -> List[Dict[str, Any]]:
+    """Parse and validate a tasks file, filling in defaults."""
+    tasks: List[Dict[str, Any]] = []
+    seen = set()
+    try:
+        f = open(path, encoding="utf-8")
+    except OSError as e:
+        raise BatchError(f"cannot read tasks file: {e}") from e
+    with f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                task = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise BatchError(f"{path}:{line_no}: invalid JSON: {e}") from e
+            if not isinstance(task, dict) or not isinstance(task.get("prompt"), str):
+                raise BatchError(f"{path}:{line_no}: a task needs a string 'prompt'")
+            unknown = set(task) - TASK_KEYS
+            if unknown:
+                raise BatchError(f"{path}:{line_no}: unknown keys: {', '.join(sorted(unknown))}")
+            task_id = str(task.get("id") or f"task-{line_no}")
+            if task_id in seen:
+                raise BatchError(f"{path}:{line_no}: duplicate task id '{task_id}'")
+            seen.add(task_id)
+            tasks.append(
+                {
+                    "id": task_id,
+                    "prompt": task["prompt"],
+                    "cwd": os.path.abspath(task.get("cwd") or cwd),
+                    "model": task.get("model") or model,
+                    "max_iterations": int(task.get("max_iterations") or DEFAULT_MAX_ITERATIONS),
+                }
+            )
+    return tasks
+
+
+# ---------------------------------------------------------------------------
+# Worker process
+# ---------------------------------------------------------------------------
+
+# Set once per worker by _init_worker
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(
+    agent_options: Dict[str, Any],
+    transport_options: Dict[str, Any],
+    journal: bool,
+) -> None:
+    from lazy_imports import preload_litellm
+
+    # Workers are spawned fresh: start the slow import before the first task arrives
+    preload_litellm()
+    _worker.update(
+        agent_options=agent_options,
+        transport_options=transport_options,
+        journal=journal,
+    )
+
+
+def run_task(task: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one task to completion in this worker; never raises."""
+    from rich.console import Console
+
+    from agent import CodingAgent
+
+    started = time.time()
+    record: Dict[str, Any] = {
+        "id": task["id"],
+        "model": task["model"],
+        "cwd": task["cwd"],
+        "worker": os.getpid(),
+        "started": round(started, 3),
+    }
+    agent = None
+    transport = None
+    try:
+        if not os.path.isdir(task["cwd"]):
+            raise BatchError(f"'{task['cwd']}' is not a directory")
+        transport = create_transport(**_worker["transport_options"])
+        journal = None
+        if _worker["journal"]:
+            from journal import SessionJournal
+
+            journal = SessionJournal.create(task["model"], task["cwd"])
+            record["session"] = journal.id
+        agent = CodingAgent(
+            model=task["model"],
+            cwd=task["cwd"],
+            # Nobody watches a batch run; the journal keeps the conversation
+            console=Console(file=io.StringIO(), width=120),
+            journal=journal,
+            transport=transport,
+            **_worker["agent_options"],
+        )
+        agent._add_messages({"role": "user", "content": task["prompt"]})
+        answer = agent._run_agent_loop(max_iterations=task["max_iterations"])
+        record.update(agent.turn_outcome())
+        record["answer"] = answer
+    except Exception as exc:
+        record["status"] = "error"
+        record["error"] = f"{type(exc).__name__}: {exc}"
+    finally:
+        if agent is not None:
+            agent.close()
+        if transport is not None:
+            transport.close()
+    record["seconds"] = round(time.time() - started, 3)
+    return record
+
+
+# ---------------------------------------------------------------------------
+# Scheduler
+# ---------------------------------------------------------------------------
+
+def run_batch(
+    tasks: List[Dict[str, Any]],
+    output: TextIO,
+    workers: int = DEFAULT_WORKERS,
+    agent_options: Optional[Dict[str, Any]] = None,
+    transport_options: Optional[Dict[str, Any]] = None,
+    journal: bool = True,
+    progress: TextIO = sys.stderr,
+) -> Dict[str, Any]:
+    """
+    Run *tasks* on a pool of *workers* processes, writing one JSONL record
+    per task to *output* as each finishes.  Returns the batch summary.
+    """
+    # spawn, not fork: the parent may hold threads (the litellm preload) and locks
+    context = multiprocessing.get_context("spawn")
+    transport_options = dict(transport_options or {})
+    if transport_options.get("limits") is not None:
+        # Allocate every task's provider bucket here, so the workers inherit shared ones
+        transport_options["limits"].share(task["model"] for task in tasks)
+    started = time.time()
+    counts: Dict[str, int] = {}
+    tokens = 0
+    pool = ProcessPoolExecutor(
+        max_workers=max(1, min(workers, len(tasks) or 1)),
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(agent_options or {}, transport_options, journal),
+    )
+    pending: Dict[Future, Dict[str, Any]] = {}
+    try:
+        for task in tasks:
+            pending[pool.submit(run_task, task)] = task
+        done_count = 0
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                task = pending.pop(future)
+                try:
+                    record = future.result()
+                except Exception as exc:
+                    # The worker died (killed, out of memory) rather than the task failing
+                    record = {"id": task["id"], "status": "error", "error": f"worker failed: {exc}"}
+                done_count += 1
+                counts[record["status"]] = counts.get(record["status"], 0) + 1
+                metrics = record.get("metrics") or {}
+                tokens += metrics.get("input_tokens", 0) + metrics.get("output_tokens", 0)
+                output.write(json.dumps(record, ensure_ascii=False) + "\n")
+                output.flush()
+                print(
+                    f"[{done_count}/{len(tasks)}] {record['id']}: {record['status']}"
+                    f" ({record.get('seconds', 0):.1f}s)",
+                    file=progress,
+                )
+    except KeyboardInterrupt:
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+
+    elapsed = time.time() - started
+    return {
+        "tasks": len(tasks),
+        "statuses": counts,
+        "seconds": round(elapsed, 3),
+        "tasks_per_minute": round(len(tasks) / elapsed * 60, 2) if elapsed else 0.0,
+        "tokens": tokens,
+    }
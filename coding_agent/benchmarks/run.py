@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the agent loop and tools, reported as JSON.
+
+Each repository size runs in its own process against a fresh synthetic
+repo (see ``synthetic_repo.py``) and reports:
+
+    tools       per-tool latency: the cold first call and p50/p90/p99 of the
+                warm calls after it, in milliseconds
+    agent_loop  per-iteration overhead of ``CodingAgent._run_agent_loop``
+                driven by a scripted mock model (time not spent in the model
+                or in tools), and bytes of history resent to the model
+    peak_rss_mb the worker's peak resident set size
+
+Usage:
+    python benchmarks/run.py
+    python benchmarks/run.py --sizes 1000,10000,100000 --output bench.json
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+# The agent modules import each other as top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+# Keep the throwaway repos' symbol indexes out of ~/.cache
+os.environ.setdefault("CODING_AGENT_SYMBOLS", os.path.join(tempfile.gettempdir(), "bench-symbols"))
+
+from synthetic_repo import RARE_WORDS, build_repo  # noqa: E402
+
+DEFAULT_SIZES = "1000,10000"
+
+# Warm calls timed per tool, after the cold one
+DEFAULT_RUNS = 20
+
+# Agent loop iterations (one model call + one tool call each)
+DEFAULT_ITERATIONS = 50
+
+
+# ---------------------------------------------------------------------------
+# Measurement helpers
+# ---------------------------------------------------------------------------
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    """p50/p90/p99/mean/max of *samples* (seconds), in milliseconds."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)] * 1000
+
+    return {
+        "p50_ms": round(pick(0.50), 3),
+        "p90_ms": round(pick(0.90), 3),
+        "p99_ms": round(pick(0.99), 3),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def time_calls(fn: Callable[[], Any], runs: int) -> Dict[str, Any]:
+    start = time.perf_counter()
+    fn()
+    cold = time.perf_counter() - start
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return {"cold_ms": round(cold * 1000, 3), "runs": runs, **percentiles(samples)}
+
+
+def peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return round(rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024, 1)
+
+
+# ---------------------------------------------------------------------------
+# Benchmarks
+# ---------------------------------------------------------------------------
+
+def bench_tools(root: str, paths: List[str], runs: int) -> Dict[str, Dict[str, Any]]:
+    from tools import (
+        create_directory,
+        edit_file,
+        execute_bash,
+        find_symbol,
+        grep_search,
+        list_directory,
+        read_file,
+        read_symbol,
+        repo_map,
+        search_files,
+        write_file,
+    )
+
+    sample = os.path.relpath(paths[len(paths) // 2], root)
+    listing_dir = os.path.dirname(sample)
+    scratch = "scratch/notes.txt"
+    write_file(scratch, "alpha\n" * 200, root)
+    toggle = ["alpha", "omega"]
+
+    def edit() -> None:
+        old, new = toggle
+        edit_file(scratch, [{"old_string": old, "new_string": new, "replace_all": True}], None, root)
+        toggle.reverse()
+
+    cases: Dict[str, Callable[[], Any]] = {
+        "read_file": lambda: read_file(sample, root),
+        "read_file_range": lambda: read_file(sample, root, offset=5, limit=10),
+        "write_file": lambda: write_file("scratch/out.txt", "x = 1\n" * 100, root),
+        "edit_file": edit,
+        "create_directory": lambda: create_directory("scratch/a/b", root),
+        "list_directory": lambda: list_directory(listing_dir, root),
+        "search_files": lambda: search_files("*_7.py", ".", root),
+        "grep_search_rare": lambda: grep_search(f"def {RARE_WORDS[1]}_hook", ".", True, root),
+        "grep_search_common": lambda: grep_search("def process_user_cache", ".", True, root),
+        "grep_search_regex": lambda: grep_search(r"class \w+Order\d+:", ".", True, root),
+        "repo_map": lambda: repo_map(listing_dir, root),
+        "find_symbol": lambda: find_symbol(f"{RARE_WORDS[1]}_hook", ".", root),
+        "read_symbol": lambda: read_symbol("__init__", sample, root),
+        "execute_bash": lambda: execute_bash("true", root),
+    }
+    return {name: time_calls(fn, runs) for name, fn in cases.items()}
+
+
+def bench_agent_loop(root: str, paths: List[str], iterations: int) -> Dict[str, Any]:
+    from rich.console import Console
+
+    from agent import CodingAgent
+    from journal import SessionJournal
+    from transport import ScriptedTransport, Transport
+
+    sample = os.path.relpath(paths[len(paths) // 3], root)
+    steps = [
+        {"content": "Reading.", "tool_calls": [{"name": "read_file", "arguments": {"path": sample}}]},
+        {"tool_calls": [{"name": "grep_search", "arguments": {"pattern": f"{RARE_WORDS[0]}_hook"}}]},
+        {"tool_calls": [{"name": "list_directory", "arguments": {"path": os.path.dirname(sample)}}]},
+        {"tool_calls": [{"name": "execute_bash", "arguments": {"command": "echo ok"}}]},
+    ]
+
+    class Measuring(Transport):
+        """Time each model call and count the history bytes it carries."""
+
+        def __init__(self, inner: Transport):
+            self.inner = inner
+            self.calls: List[Dict[str, float]] = []
+
+        def complete(self, request: Dict[str, Any]) -> Any:
+            start = time.perf_counter()
+            response = self.inner.complete(request)
+            self.calls.append(
+                {
+                    "start": start,
+                    "end": time.perf_counter(),
+                    "bytes": len(json.dumps(request["messages"], default=str)),
+                }
+            )
+            return response
+
+    transport = Measuring(ScriptedTransport(steps, loop=True))
+    sessions = tempfile.mkdtemp(prefix="bench-sessions-")
+    agent = CodingAgent(
+        cwd=root,
+        console=Console(file=io.StringIO(), width=120),
+        transport=transport,
+        journal=SessionJournal.create("mock", root, root=sessions),
+    )
+    tool_times: List[float] = []
+    run_tool = agent._run_tool
+
+    def timed_tool(*args: Any, **kwargs: Any) -> str:
+        start = time.perf_counter()
+        try:
+            return run_tool(*args, **kwargs)
+        finally:
+            tool_times.append(time.perf_counter() - start)
+
+    agent._run_tool = timed_tool  # type: ignore[method-assign]
+    agent.messages.append({"role": "user", "content": "Explore the repository."})
+    start = time.perf_counter()
+    agent._run_agent_loop(max_iterations=iterations)
+    total = time.perf_counter() - start
+    shutil.rmtree(sessions, ignore_errors=True)
+
+    calls = transport.calls
+    # Between one model call returning and the next starting, minus tool time
+    overhead = [
+        calls[i + 1]["start"] - calls[i]["end"] - tool_times[i]
+        for i in range(min(len(calls) - 1, len(tool_times)))
+    ]
+    resent = [c["bytes"] for c in calls]
+    return {
+        "iterations": len(calls),
+        "total_ms": round(total * 1000, 3),
+        "tool_ms": round(sum(tool_times) * 1000, 3),
+        "model_ms": round(sum(c["end"] - c["start"] for c in calls) * 1000, 3),
+        "overhead_per_iteration": percentiles(overhead),
+        "history_bytes_resent": sum(resent),
+        "final_history_bytes": resent[-1] if resent else 0,
+    }
+
+
+def run_size(files: int, runs: int, iterations: int, workdir: str, keep: bool) -> Dict[str, Any]:
+    root = tempfile.mkdtemp(prefix=f"bench-{files}-", dir=workdir)
+    try:
+        start = time.perf_counter()
+        paths = build_repo(root, files)
+        setup = time.perf_counter() - start
+        result = {
+            "files": files,
+            "setup_s": round(setup, 3),
+            "tools": bench_tools(root, paths, runs),
+            "agent_loop": bench_agent_loop(root, paths, iterations),
+        }
+        result["peak_rss_mb"] = peak_rss_mb()
+        return result
+    finally:
+        if not keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmark the coding agent's loop and tools")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated repo sizes in files")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="warm calls per tool")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS, help="agent loop iterations")
+    parser.add_argument("--output", metavar="FILE", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--workdir", default=None, help="where synthetic repos are created")
+    parser.add_argument("--keep", action="store_true", help="keep the synthetic repos")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    return parser
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    if args.worker is not None:
+        # One size per process, so peak RSS and warm caches do not leak across sizes
+        result = run_size(args.worker, args.runs, args.iterations, args.workdir, args.keep)
+        json.dump(result, sys.stdout)
+        return
+
+    results = []
+    for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+        print(f"benchmarking {size:,} files…", file=sys.stderr)
+        cmd = [
+            sys.executable, os.path.abspath(__file__), "--worker", str(size),
+            "--runs", str(args.runs), "--iterations", str(args.iterations),
+        ]
+        if args.workdir:
+            cmd += ["--workdir", args.workdir]
+        if args.keep:
+            cmd.append("--keep")
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(proc.stderr, file=sys.stderr)
+            sys.exit(proc.returncode)
+        results.append(json.loads(proc.stdout))
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
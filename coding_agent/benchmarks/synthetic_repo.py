@@ -0,0 +1,95 @@
+"""
+Deterministic synthetic repositories for the benchmarks.
+
+``build_repo(root, files)`` writes *files* small Python modules spread over
+a few levels of packages, plus a ``.gitignore`` and some ignored build
+output, so tree walks, ignore handling and the grep index all see a
+realistic layout.  The same size and seed always produce the same tree.
+"""
+
+import os
+import random
+from typing import List
+
+# Modules per leaf directory and leaf directories per package
+FILES_PER_DIR = 25
+DIRS_PER_PACKAGE = 20
+
+# Words used for identifiers; a few are rare so searches have selective targets
+COMMON_WORDS = [
+    "user", "order", "item", "cache", "client", "request", "response", "config",
+    "session", "record", "value", "index", "buffer", "stream", "token", "event",
+]
+RARE_WORDS = ["quasar", "zeppelin", "marmalade", "obelisk"]
+
+# One file in this many mentions a rare word
+RARE_EVERY = 97
+
+# Files written under the ignored build directory
+IGNORED_FILES = 50
+
+MODULE_TEMPLATE = '''"""Module {name}: synthetic benchmark fixture."""
+
+import os
+from typing import Dict, List, Optional
+
+
+class {cls}:
+    """Handles {a} and {b} records."""
+
+    def __init__(self, {a}_id: int, {b}: Optional[str] = None):
+        self.{a}_id = {a}_id
+        self.{b} = {b}
+        self._{c}_cache: Dict[str, int] = {{}}
+
+    def load_{a}(self, path: str) -> List[str]:
+        with open(os.path.join(path, "{a}.txt")) as f:
+            return [line.strip() for line in f]
+
+    def update_{b}(self, value: str) -> None:
+        # TODO: validate {b} before storing
+        self.{b} = value
+
+
+def process_{a}_{c}(items: List[int]) -> int:
+    total = 0
+    for item in items:
+        total += item * {n}
+    return total
+{extra}'''
+
+
+def build_repo(root: str, files: int, seed: int = 0) -> List[str]:
+    """Create a synthetic repo with *files* modules under *root*; returns their paths."""
+    rng = random.Random(seed)
+    paths: List[str] = []
+    for i in range(files):
+        leaf = i // FILES_PER_DIR
+        package = leaf // DIRS_PER_PACKAGE
+        directory = os.path.join(
+            root, "src", f"pkg_{package:03d}", f"mod_{leaf % DIRS_PER_PACKAGE:02d}"
+        )
+        if i % FILES_PER_DIR == 0:
+            os.makedirs(directory, exist_ok=True)
+        a, b, c = rng.sample(COMMON_WORDS, 3)
+        extra = ""
+        if i % RARE_EVERY == 0:
+            extra = f"\n\ndef {RARE_WORDS[i % len(RARE_WORDS)]}_hook() -> None:\n    pass\n"
+        path = os.path.join(directory, f"{a}_{c}_{i}.py")
+        source = MODULE_TEMPLATE.format(
+            name=i, cls=f"{a.title()}{b.title()}{i}", a=a, b=b, c=c, n=rng.randint(2, 99), extra=extra
+        )
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(source)
+        paths.append(path)
+
+    with open(os.path.join(root, ".gitignore"), "w", encoding="utf-8") as f:
+        f.write("build_out/\n*.log\n")
+    ignored = os.path.join(root, "build_out")
+    os.makedirs(ignored, exist_ok=True)
+    for i in range(IGNORED_FILES):
+        with open(os.path.join(ignored, f"artifact_{i}.py"), "w", encoding="utf-8") as f:
+            f.write("quasar = 'ignored build output'\n")
+    with open(os.path.join(root, "README.md"), "w", encoding="utf-8") as f:
+        f.write(f"# Synthetic repo\n\n{files} modules.\n")
+    return paths
@@ -0,0 +1,274 @@
+"""
+In-process trigram index that narrows the files ``grep_search`` must scan.
+
+Each indexed file gets a trigram signature: a bitmap with one bit set per
+(hashed) trigram drawn from the ASCII word runs in its bytes.  A regex
+query is reduced to the trigrams any match must contain; only files whose
+signature has all of those bits are opened and verified with ``re``.
+Signatures are a few KB per file regardless of file size, which keeps the
+index small on large monorepos, and they are rebuilt only for files whose
+size or mtime has changed since the last query.  The set of files comes
+from the workspace ``FileTree``, so ``.gitignore``d paths are never indexed.
+"""
+
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from file_tree import FileTree, get_file_tree
+
+try:  # Python 3.11+
+    from re import _parser as sre_parse  # type: ignore[attr-defined]
+except ImportError:  # pragma: no cover - older interpreters
+    import sre_parse  # type: ignore[no-redef]
+
+# Files above this size are not given a signature and are always scanned
+MAX_INDEX_BYTES = 4 * 1024 * 1024
+
+# Leading bytes inspected for NULs; binary files are skipped like grep -I
+BINARY_SNIFF_BYTES = 8192
+
+# Signature size bounds, in bits
+MIN_SIGNATURE_BITS = 1 << 9
+MAX_SIGNATURE_BITS = 1 << 18
+
+# Maps ASCII word bytes to lower case and everything else to a space, so
+# bytes.translate + split extracts word runs at C speed.
+_WORD_TABLE = bytes(
+    c + 32 if 65 <= c <= 90 else c if (48 <= c <= 57 or 97 <= c <= 122 or c == 95) else 32
+    for c in range(256)
+)
+
+
+def _trigrams(data: bytes) -> Set[bytes]:
+    """Lower-cased trigrams of every ASCII word run of 3+ bytes in *data*."""
+    words = {w for w in set(data.translate(_WORD_TABLE).split()) if len(w) > 2}
+    return {w[i : i + 3] for w in words for i in range(len(w) - 2)}
+
+
+def _signature(grams: Iterable[bytes], bits: int) -> int:
+    buf = bytearray(bits // 8)
+    mask = bits - 1
+    for gram in grams:
+        h = hash(gram) & mask
+        buf[h >> 3] |= 1 << (h & 7)
+    return int.from_bytes(buf, "little")
+
+
+def _signature_bits(distinct: int) -> int:
+    bits = MIN_SIGNATURE_BITS
+    while bits < distinct * 8 and bits < MAX_SIGNATURE_BITS:
+        bits <<= 1
+    return bits
+
+
+# ---------------------------------------------------------------------------
+# Regex analysis
+# ---------------------------------------------------------------------------
+
+def required_literals(pattern: str) -> List[str]:
+    """
+    Literal substrings every match of *pattern* must contain.
+
+    Conservative: anything the analysis does not understand (classes,
+    alternation, optional parts) simply ends the current literal run, so
+    the result may be empty but is never wrong.
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception:
+        # compile_pattern matches an invalid regex literally
+        return [pattern]
+    runs: List[str] = []
+    current = _collect(list(parsed), runs)
+    if current:
+        runs.append(current)
+    return runs
+
+
+def _collect(items: list, runs: List[str], current: str = "") -> str:
+    for op, arg in items:
+        name = str(op)
+        if name == "LITERAL":
+            current += chr(arg)
+            continue
+        if name == "SUBPATTERN":
+            # (group, add_flags, del_flags, pattern) on 3.6+
+            current = _collect(list(arg[-1]), runs, current)
+            continue
+        if current:
+            runs.append(current)
+        current = ""
+        if name in ("MAX_REPEAT", "MIN_REPEAT", "POSSESSIVE_REPEAT"):
+            low, _high, sub = arg
+            if low >= 1:
+                tail = _collect(list(sub), runs)
+                if tail:
+                    runs.append(tail)
+        elif name == "ATOMIC_GROUP":
+            tail = _collect(list(arg), runs)
+            if tail:
+                runs.append(tail)
+    return current
+
+
+# ---------------------------------------------------------------------------
+# Index
+# ---------------------------------------------------------------------------
+
+class CodeIndex:
+    """Trigram signatures for the non-ignored text files in a file tree."""
+
+    def __init__(self, tree: FileTree):
+        self.tree = tree
+        self.root = tree.root
+        # abs path -> (size, mtime_ns, signature bits, signature); bits == 0
+        # marks a file too large to index (always a candidate) and bits == -1
+        # a binary or unreadable file (never a candidate)
+        self._files: Dict[str, Tuple[int, int, int, int]] = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def refresh(self, paths: Optional[Iterable[Tuple[str, os.stat_result]]] = None) -> int:
+        """Re-index new or changed files and forget deleted ones; returns files re-indexed."""
+        with self._refresh_lock:
+            return self._refresh(paths)
+
+    def _refresh(self, paths: Optional[Iterable[Tuple[str, os.stat_result]]]) -> int:
+        seen: Set[str] = set()
+        updated = 0
+        for path, st in paths if paths is not None else self._walk():
+            seen.add(path)
+            entry = self._files.get(path)
+            if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+                continue
+            record = self._index_file(path, st)
+            with self._lock:
+                self._files[path] = record
+            updated += 1
+        with self._lock:
+            for gone in [p for p in self._files if p not in seen]:
+                del self._files[gone]
+        return updated
+
+    def _walk(self) -> Iterable[Tuple[str, os.stat_result]]:
+        for path in self.tree.files(self.root):
+            # grep_search has always been limited to names with an extension
+            if "." not in os.path.basename(path):
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            yield path, st
+
+    @staticmethod
+    def _index_file(path: str, st: os.stat_result) -> Tuple[int, int, int, int]:
+        try:
+            with open(path, "rb") as f:
+                head = f.read(BINARY_SNIFF_BYTES)
+                if b"\x00" in head:
+                    return (st.st_size, st.st_mtime_ns, -1, 0)
+                if st.st_size > MAX_INDEX_BYTES:
+                    return (st.st_size, st.st_mtime_ns, 0, 0)
+                data = head + f.read()
+        except OSError:
+            return (st.st_size, st.st_mtime_ns, -1, 0)
+        grams = _trigrams(data)
+        bits = _signature_bits(len(grams))
+        return (st.st_size, st.st_mtime_ns, bits, _signature(grams, bits))
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def candidates(self, pattern: str, under: str, recursive: bool = True) -> List[str]:
+        """Indexed files below *under* that may contain a match for *pattern*."""
+        grams: Set[bytes] = set()
+        for literal in required_literals(pattern):
+            grams |= _trigrams(literal.encode("utf-8"))
+
+        under = os.path.abspath(under)
+        prefix = under.rstrip(os.sep) + os.sep
+        masks: Dict[int, int] = {}
+        with self._lock:
+            files = list(self._files.items())
+
+        result = []
+        for path, (_size, _mtime, bits, sig) in files:
+            if bits < 0 or not path.startswith(prefix):
+                continue
+            if not recursive and os.path.dirname(path) != under:
+                continue
+            if bits and grams:
+                mask = masks.get(bits)
+                if mask is None:
+                    mask = masks[bits] = _signature(grams, bits)
+                if sig & mask != mask:
+                    continue
+            result.append(path)
+        return sorted(result)
+
+    def search(
+        self, pattern: str, under: str, recursive: bool = True, cwd: str = "."
+    ) -> List[str]:
+        """All matching lines as ``path:line:text`` with paths relative to *cwd*."""
+        self.refresh()
+        regex = compile_pattern(pattern)
+        lines: List[str] = []
+        for path in self.candidates(pattern, under, recursive):
+            lines.extend(search_file(regex, path, cwd))
+        return lines
+
+
+def compile_pattern(pattern: str) -> "re.Pattern[str]":
+    """Compile *pattern* as a Python regex, falling back to a literal match."""
+    try:
+        # MULTILINE so ^ and $ anchor to lines, as they do for grep
+        return re.compile(pattern, re.MULTILINE)
+    except re.error:
+        return re.compile(re.escape(pattern))
+
+
+def search_file(regex: "re.Pattern[str]", path: str, cwd: str) -> List[str]:
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            text = f.read()
+    except OSError:
+        return []
+    if "\x00" in text[:BINARY_SNIFF_BYTES]:
+        return []
+    rel = os.path.relpath(path, cwd)
+    out: List[str] = []
+    line_no = 1
+    scanned = 0
+    last_line = -1
+    for match in regex.finditer(text):
+        start = text.rfind("\n", 0, match.start()) + 1
+        if start == last_line:
+            continue
+        line_no += text.count("\n", scanned, start)
+        scanned = start
+        last_line = start
+        end = text.find("\n", start)
+        out.append(f"{rel}:{line_no}:{text[start:end if end >= 0 else len(text)]}")
+    return out
+
+
+_indexes: Dict[str, CodeIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_code_index(cwd: str) -> CodeIndex:
+    """The shared index for the workspace rooted at *cwd*."""
+    root = os.path.abspath(cwd)
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = CodeIndex(get_file_tree(root))
+        return index
@@ -0,0 +1,162 @@
+"""
+Token-aware management of the conversation history.
+
+Every LLM call resends the full history, so old tool output is paid for on
+each iteration.  ``ContextManager`` keeps a running token count per message
+and, once the history exceeds its budget, compacts the oldest tool results
+(and bulky ``write_file`` arguments) into short stubs.  Messages are edited
+in place and never removed, so every tool call keeps its matching tool
+message.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from lazy_imports import load_litellm
+
+# Default history budget in tokens (0 disables compaction)
+DEFAULT_CONTEXT_BUDGET = 120_000
+
+# Compaction stops once the history is back under this fraction of the
+# budget, so it does not have to run again on the very next iteration.
+COMPACTION_TARGET = 0.75
+
+# Tool results from the most recent assistant turns are never compacted
+KEEP_RECENT_TURNS = 2
+
+# Lines of the original output kept at the top of a compacted stub
+STUB_HEAD_LINES = 3
+
+# Compacting anything shorter than this saves too little to be worth it
+MIN_COMPACT_CHARS = 400
+
+
+class CompactionReport:
+    def __init__(self, before: int, after: int, compacted: int):
+        self.before = before
+        self.after = after
+        self.compacted = compacted
+
+    @property
+    def saved(self) -> int:
+        return self.before - self.after
+
+
+class ContextManager:
+    """Count history tokens and compact old tool output over budget."""
+
+    def __init__(
+        self,
+        model: str,
+        budget: int = DEFAULT_CONTEXT_BUDGET,
+        keep_recent_turns: int = KEEP_RECENT_TURNS,
+    ):
+        self.model = model
+        self.budget = budget
+        self.keep_recent_turns = keep_recent_turns
+        # id(message) -> (content fingerprint, token count)
+        self._counts: Dict[int, Tuple[Any, int]] = {}
+
+    # ------------------------------------------------------------------
+    # Token counting
+    # ------------------------------------------------------------------
+
+    def count(self, message: Dict[str, Any]) -> int:
+        """Token count of one message, cached until the message changes."""
+        # Compaction swaps in new strings, so comparing the content and
+        # argument strings (identity-fast in CPython) detects any change.
+        key = (
+            message.get("content"),
+            tuple(tc["function"]["arguments"] for tc in message.get("tool_calls") or []),
+        )
+        cached = self._counts.get(id(message))
+        if cached and cached[0] == key:
+            return cached[1]
+        try:
+            tokens = load_litellm().token_counter(model=self.model, messages=[message])
+        except Exception:
+            # Unknown tokenizer: fall back to the usual ~4 chars per token
+            tokens = len(json.dumps(message)) // 4
+        self._counts[id(message)] = (key, tokens)
+        return tokens
+
+    def total(self, messages: List[Dict[str, Any]]) -> int:
+        if len(self._counts) > 2 * len(messages):
+            # Forget messages dropped from the history (e.g. by /clear)
+            live = {id(m) for m in messages}
+            self._counts = {k: v for k, v in self._counts.items() if k in live}
+        return sum(self.count(m) for m in messages)
+
+    # ------------------------------------------------------------------
+    # Compaction
+    # ------------------------------------------------------------------
+
+    def compact(self, messages: List[Dict[str, Any]]) -> Optional[CompactionReport]:
+        """
+        Shrink old tool output in *messages* if the history is over budget.
+
+        Returns a report of the tokens saved, or None if nothing was done.
+        """
+        if self.budget <= 0:
+            return None
+        before = self.total(messages)
+        if before <= self.budget:
+            return None
+
+        target = int(self.budget * COMPACTION_TARGET)
+        total = before
+        compacted = 0
+        for message in messages[: self._protected_start(messages)]:
+            if total <= target:
+                break
+            old = self.count(message)
+            if self._compact_message(message):
+                compacted += 1
+                total += self.count(message) - old
+
+        if not compacted:
+            return None
+        return CompactionReport(before, total, compacted)
+
+    def _protected_start(self, messages: List[Dict[str, Any]]) -> int:
+        """Index of the first message belonging to the recent, untouchable turns."""
+        seen = 0
+        for i in range(len(messages) - 1, -1, -1):
+            if messages[i].get("role") == "assistant" and messages[i].get("tool_calls"):
+                seen += 1
+                if seen >= self.keep_recent_turns:
+                    return i
+        return 0
+
+    @staticmethod
+    def _compact_message(message: Dict[str, Any]) -> bool:
+        """Replace bulky content with a stub in place; returns True if changed."""
+        if message.get("role") == "tool":
+            content = message.get("content") or ""
+            if len(content) < MIN_COMPACT_CHARS or content.startswith("[compacted"):
+                return False
+            lines = content.splitlines()
+            head = "\n".join(lines[:STUB_HEAD_LINES])
+            message["content"] = (
+                f"[compacted {message.get('name', 'tool')} result: "
+                f"{len(lines)} lines, {len(content)} chars; re-run the tool to see it again]\n"
+                f"{head}\n…"
+            )
+            return True
+
+        changed = False
+        for tc in message.get("tool_calls") or []:
+            function = tc["function"]
+            if function["name"] != "write_file" or len(function["arguments"]) < MIN_COMPACT_CHARS:
+                continue
+            try:
+                args = json.loads(function["arguments"])
+            except json.JSONDecodeError:
+                continue
+            content = args.get("content")
+            if not isinstance(content, str) or content.startswith("[compacted"):
+                continue
+            args["content"] = f"[compacted: {len(content.splitlines())} lines written]"
+            function["arguments"] = json.dumps(args)
+            changed = True
+        return changed
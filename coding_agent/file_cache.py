@@ -0,0 +1,182 @@
+"""
+mtime-validated file content cache used by ``read_file``.
+
+Agents reread the same handful of files many times per session.  Each
+workspace gets a ``FileCache`` that keeps decoded file contents keyed by
+path and validated against ``(size, mtime_ns)`` from a single ``stat``
+call, so an unchanged file is never reopened or decoded twice.  Memory is
+bounded with LRU eviction.  Ranged reads of large files use a ``LineIndex``
+over an mmap instead, cached under the same validation key.
+"""
+
+import bisect
+import mmap
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# Upper bound on cached file contents per workspace
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Files larger than this fraction of the cache are read but never cached
+MAX_ENTRY_FRACTION = 0.25
+
+# Granularity of the line-offset index: one checkpoint per block
+LINE_INDEX_BLOCK = 1024 * 1024
+
+# Line indexes kept per workspace
+MAX_LINE_INDEXES = 32
+
+
+class LineIndex:
+    """
+    Sparse line-offset index over a memory-mapped file.
+
+    One checkpoint per ``LINE_INDEX_BLOCK`` bytes records how many newlines
+    precede the block, counted one block-sized slice at a time.  Locating a line
+    bisects the checkpoints and scans at most one block, so random access
+    into a huge file never rescans it from the start.
+    """
+
+    def __init__(self, mm: "mmap.mmap"):
+        self.size = len(mm)
+        self.block_starts = array("Q")
+        self.lines_before = array("Q")
+        newlines = 0
+        for start in range(0, self.size, LINE_INDEX_BLOCK):
+            self.block_starts.append(start)
+            self.lines_before.append(newlines)
+            newlines += mm[start : start + LINE_INDEX_BLOCK].count(b"\n")
+        self.newlines = newlines
+        ends_with_newline = self.size > 0 and mm[self.size - 1 : self.size] == b"\n"
+        self.total_lines = newlines + (0 if ends_with_newline or self.size == 0 else 1)
+
+    def line_start(self, mm: "mmap.mmap", line: int) -> int:
+        """Byte offset where 0-based *line* starts (file size if past the end)."""
+        if line <= 0:
+            return 0
+        if line > self.newlines:
+            return self.size
+        # Last block with fewer than `line` newlines before it holds the target
+        block = bisect.bisect_left(self.lines_before, line) - 1
+        pos = self.block_starts[block]
+        for _ in range(line - self.lines_before[block]):
+            pos = mm.find(b"\n", pos) + 1
+        return pos
+
+
+class FileCache:
+    """LRU cache of file contents keyed by path, validated by size and mtime."""
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._bytes = 0
+        # path -> (size, mtime_ns, text)
+        self._entries: "OrderedDict[str, Tuple[int, int, str]]" = OrderedDict()
+        # (path, size, mtime_ns) -> LineIndex
+        self._line_indexes: "OrderedDict[Tuple[str, int, int], LineIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def read(self, path: str) -> str:
+        """Return the text of *path*, from cache when size and mtime match."""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            text = f.read()
+        if st.st_size <= self.max_bytes * MAX_ENTRY_FRACTION:
+            self._store(path, st.st_size, st.st_mtime_ns, text)
+        return text
+
+    def _store(self, path: str, size: int, mtime_ns: int, text: str) -> None:
+        with self._lock:
+            self._drop(path)
+            self._entries[path] = (size, mtime_ns, text)
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, path: str) -> None:
+        entry = self._entries.pop(path, None)
+        if entry:
+            self._bytes -= entry[0]
+
+    def line_index(self, path: str, st: os.stat_result, mm: "mmap.mmap") -> LineIndex:
+        """The line index for *mm*, reused while the file's size and mtime hold."""
+        key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+        with self._lock:
+            index = self._line_indexes.get(key)
+            if index is not None:
+                self._line_indexes.move_to_end(key)
+                return index
+        index = LineIndex(mm)
+        with self._lock:
+            self._line_indexes[key] = index
+            while len(self._line_indexes) > MAX_LINE_INDEXES:
+                self._line_indexes.popitem(last=False)
+        return index
+
+    def invalidate(self, path: str) -> None:
+        """Forget *path* and, if it is a directory, everything beneath it."""
+        path = os.path.abspath(path)
+        prefix = path.rstrip(os.sep) + os.sep
+        with self._lock:
+            for cached in [p for p in self._entries if p == path or p.startswith(prefix)]:
+                self._drop(cached)
+
+    def revalidate(self) -> int:
+        """Stat every entry and drop the stale ones; returns how many were dropped."""
+        with self._lock:
+            snapshot = [(p, e[0], e[1]) for p, e in self._entries.items()]
+        stale = []
+        for path, size, mtime_ns in snapshot:
+            try:
+                st = os.stat(path)
+            except OSError:
+                stale.append(path)
+                continue
+            if st.st_size != size or st.st_mtime_ns != mtime_ns:
+                stale.append(path)
+        with self._lock:
+            for path in stale:
+                self._drop(path)
+        return len(stale)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+
+_caches: Dict[str, FileCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_file_cache(cwd: str) -> FileCache:
+    """The shared cache for the workspace rooted at *cwd*."""
+    root = os.path.abspath(cwd)
+    with _caches_lock:
+        cache = _caches.get(root)
+        if cache is None:
+            cache = _caches[root] = FileCache()
+        return cache
+
+
+def peek_file_cache(cwd: str) -> Optional[FileCache]:
+    """The workspace's cache if one has been created, without creating it."""
+    return _caches.get(os.path.abspath(cwd))
@@ -0,0 +1,277 @@
+"""
+Cached, gitignore-aware snapshot of a workspace's file tree.
+
+``search_files``, ``list_directory`` and the grep index all need directory
+listings.  ``FileTree`` keeps the listing of every directory it has seen,
+keyed by the directory's ``mtime_ns``; a later query re-stats each directory
+and rescans only those whose mtime moved (an entry was added, removed or
+renamed).  Repeated queries therefore cost one ``stat`` per directory
+instead of a full crawl, and directories excluded by ``.gitignore`` (or the
+built-in skip list) are never descended into at all.
+"""
+
+import os
+import re
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Directories always skipped, with or without a .gitignore
+DEFAULT_SKIP_DIRS = {".git", "node_modules", "__pycache__", ".venv", "venv", "env", "dist", "build"}
+
+# (compiled pattern, negated, directory-only)
+Rule = Tuple["re.Pattern[str]", bool, bool]
+
+
+# ---------------------------------------------------------------------------
+# .gitignore parsing
+# ---------------------------------------------------------------------------
+
+def parse_gitignore(text: str) -> List[Rule]:
+    """Compile the patterns of one .gitignore file, in file order."""
+    rules: List[Rule] = []
+    for line in text.splitlines():
+        if not line.strip() or line.startswith("#"):
+            continue
+        line = line.rstrip()
+        negated = line.startswith("!")
+        if negated:
+            line = line[1:]
+        elif line.startswith("\\"):
+            line = line[1:]
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            continue
+        # A slash anywhere but the end anchors the pattern to this directory
+        anchored = "/" in line
+        body = _glob_to_regex(line.lstrip("/"))
+        prefix = "" if anchored else "(?:.*/)?"
+        rules.append((re.compile(f"^{prefix}{body}$"), negated, dir_only))
+    return rules
+
+
+def _glob_to_regex(pattern: str) -> str:
+    out: List[str] = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i) and (i == 0 or pattern[i - 1] == "/"):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[":
+            end = pattern.find("]", i + 2)
+            if end < 0:
+                out.append(re.escape(c))
+                i += 1
+                continue
+            cls = pattern[i + 1 : end]
+            if cls.startswith("!"):
+                cls = "^" + cls[1:]
+            out.append("[" + cls.replace("\\", "\\\\") + "]")
+            i = end + 1
+        elif c == "\\" and i + 1 < n:
+            out.append(re.escape(pattern[i + 1]))
+            i += 2
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return "".join(out)
+
+
+# ---------------------------------------------------------------------------
+# Snapshot
+# ---------------------------------------------------------------------------
+
+class DirListing:
+    """One directory's entries as of its recorded mtime."""
+
+    __slots__ = ("mtime_ns", "dirs", "files", "rules", "gitignore_stamp")
+
+    def __init__(self, mtime_ns: int, dirs: List[str], files: List[str]):
+        self.mtime_ns = mtime_ns
+        self.dirs = dirs
+        self.files = files
+        self.rules: List[Rule] = []
+        self.gitignore_stamp: Optional[Tuple[int, int]] = None
+
+
+class FileTree:
+    """Incrementally refreshed listing of every directory under *root*."""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self._dirs: Dict[str, DirListing] = {}
+        self._lock = threading.Lock()
+        self._root_rules = self._load_exclude_file()
+
+    def _load_exclude_file(self) -> List[Rule]:
+        try:
+            with open(os.path.join(self.root, ".git", "info", "exclude"), encoding="utf-8") as f:
+                return parse_gitignore(f.read())
+        except OSError:
+            return []
+
+    # ------------------------------------------------------------------
+    # Listings
+    # ------------------------------------------------------------------
+
+    def listing(self, path: str) -> Optional[DirListing]:
+        """The current listing of *path*, rescanned only if its mtime moved."""
+        return self._listing(os.path.abspath(path))
+
+    def _listing(self, path: str) -> Optional[DirListing]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            with self._lock:
+                self._dirs.pop(path, None)
+            return None
+        with self._lock:
+            cached = self._dirs.get(path)
+        if cached is None or cached.mtime_ns != st.st_mtime_ns:
+            cached = self._scan(path, st.st_mtime_ns, cached)
+        self._refresh_gitignore(path, cached)
+        return cached
+
+    def _scan(self, path: str, mtime_ns: int, previous: Optional[DirListing]) -> DirListing:
+        dirs: List[str] = []
+        files: List[str] = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        continue
+                    (dirs if is_dir else files).append(entry.name)
+        except OSError:
+            pass
+        dirs.sort()
+        files.sort()
+        listing = DirListing(mtime_ns, dirs, files)
+        if previous is not None:
+            listing.rules = previous.rules
+            listing.gitignore_stamp = previous.gitignore_stamp
+        with self._lock:
+            self._dirs[path] = listing
+        return listing
+
+    @staticmethod
+    def _refresh_gitignore(path: str, listing: DirListing) -> None:
+        if ".gitignore" not in listing.files:
+            listing.rules, listing.gitignore_stamp = [], None
+            return
+        gitignore = os.path.join(path, ".gitignore")
+        try:
+            st = os.stat(gitignore)
+            stamp = (st.st_size, st.st_mtime_ns)
+            if stamp != listing.gitignore_stamp:
+                with open(gitignore, encoding="utf-8", errors="replace") as f:
+                    listing.rules = parse_gitignore(f.read())
+                listing.gitignore_stamp = stamp
+        except OSError:
+            listing.rules, listing.gitignore_stamp = [], None
+
+    def invalidate(self, path: str) -> None:
+        """Force the directory containing *path* (and *path* itself) to rescan."""
+        path = os.path.abspath(path)
+        with self._lock:
+            for p in (path, os.path.dirname(path)):
+                self._dirs.pop(p, None)
+
+    # ------------------------------------------------------------------
+    # Traversal
+    # ------------------------------------------------------------------
+
+    def walk(self, top: str) -> Iterator[Tuple[str, List[str], List[str]]]:
+        """
+        Like ``os.walk(top)``, minus ignored entries, served from the snapshot.
+
+        Yields ``(dirpath, subdirs, files)`` top-down with sorted names.
+        """
+        top = os.path.abspath(top)
+        stack = [(top, self._rule_chain(top))]
+        while stack:
+            dirpath, chain = stack.pop()
+            listing = self._listing(dirpath)
+            if listing is None:
+                continue
+            if listing.rules:
+                chain = chain + [(dirpath, listing.rules)]
+            subdirs = [d for d in listing.dirs if d not in DEFAULT_SKIP_DIRS and not d.startswith(".")]
+            files = listing.files
+            if chain:
+                prefix = dirpath + os.sep
+                subdirs = [d for d in subdirs if not self._ignored(prefix + d, True, chain)]
+                files = [f for f in files if not self._ignored(prefix + f, False, chain)]
+            yield dirpath, subdirs, files
+            for d in reversed(subdirs):
+                stack.append((dirpath + os.sep + d, chain))
+
+    def files(self, top: str) -> Iterator[str]:
+        """Absolute paths of every non-ignored file under *top*."""
+        for dirpath, _, files in self.walk(top):
+            prefix = dirpath + os.sep
+            for name in files:
+                yield prefix + name
+
+    def _rule_chain(self, top: str) -> List[Tuple[str, List[Rule]]]:
+        """Ignore rules from the root down to (not including) *top*."""
+        chain: List[Tuple[str, List[Rule]]] = []
+        if self._root_rules:
+            chain.append((self.root, self._root_rules))
+        rel = os.path.relpath(top, self.root)
+        if rel == "." or rel.startswith(".."):
+            return chain
+        current = self.root
+        for part in [""] + rel.split(os.sep)[:-1]:
+            current = os.path.join(current, part) if part else current
+            listing = self.listing(current)
+            if listing is not None and listing.rules:
+                chain.append((current, listing.rules))
+        return chain
+
+    @staticmethod
+    def _ignored(path: str, is_dir: bool, chain: List[Tuple[str, List[Rule]]]) -> bool:
+        # Deeper .gitignore files and later lines win, so search backwards
+        for base, rules in reversed(chain):
+            # Every path in the walk lies below each base in its chain
+            rel = path[len(base) + 1 :].replace(os.sep, "/")
+            for pattern, negated, dir_only in reversed(rules):
+                if dir_only and not is_dir:
+                    continue
+                if pattern.match(rel):
+                    return not negated
+        return False
+
+
+_trees: Dict[str, FileTree] = {}
+_trees_lock = threading.Lock()
+
+
+def get_file_tree(cwd: str) -> FileTree:
+    """The shared tree for the workspace rooted at *cwd*."""
+    root = os.path.abspath(cwd)
+    with _trees_lock:
+        tree = _trees.get(root)
+        if tree is None:
+            tree = _trees[root] = FileTree(root)
+        return tree
+
+
+def tree_for(path: str, cwd: str) -> FileTree:
+    """The workspace tree if *path* lies inside *cwd*, else a throwaway one."""
+    root = os.path.abspath(cwd)
+    target = os.path.abspath(path)
+    if target == root or target.startswith(root.rstrip(os.sep) + os.sep):
+        return get_file_tree(cwd)
+    return FileTree(target)
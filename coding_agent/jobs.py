@@ -0,0 +1,207 @@
+"""
+Background jobs for commands that outlive a single tool call.
+
+``execute_bash`` blocks the agent loop until the command exits and kills it
+at the timeout, which rules out dev servers, watch modes and long test
+suites.  A ``JobManager`` starts such commands detached, with stdout and
+stderr appended to a log file, and lets the agent poll their status and
+read new output incrementally while it keeps working.
+"""
+
+import atexit
+import os
+import signal
+import subprocess
+import threading
+import time
+import weakref
+from typing import Dict, List, Optional
+
+from scratch import ScratchDir
+
+# Jobs that may be running at once per workspace
+MAX_RUNNING_JOBS = 16
+
+# Most output returned by one job_output call; older unread bytes are skipped
+MAX_JOB_OUTPUT_BYTES = 32 * 1024
+
+# Seconds kill_job waits after SIGTERM before sending SIGKILL
+KILL_GRACE_SECONDS = 3.0
+
+
+class Job:
+    """One detached command and its log file."""
+
+    def __init__(self, job_id: str, command: str, cwd: str, log_path: str, proc: subprocess.Popen):
+        self.id = job_id
+        self.command = command
+        self.cwd = cwd
+        self.log_path = log_path
+        self.proc = proc
+        self.started = time.time()
+        self.ended: Optional[float] = None
+        self.killed = False
+        # Byte offset up to which job_output has returned the log
+        self.read_offset = 0
+
+    def poll(self) -> bool:
+        """Whether the job is still running, noting when it ended."""
+        if self.ended is None and self.proc.poll() is not None:
+            self.ended = time.time()
+        return self.ended is None
+
+    @property
+    def running(self) -> bool:
+        return self.poll()
+
+    @property
+    def log_size(self) -> int:
+        try:
+            return os.path.getsize(self.log_path)
+        except OSError:
+            return 0
+
+    def describe(self) -> str:
+        elapsed = (self.ended or time.time()) - self.started
+        if self.running:
+            state = "running"
+        elif self.killed:
+            state = f"killed (exit code {self.proc.returncode})"
+        else:
+            state = f"exited with code {self.proc.returncode}"
+        unread = self.log_size - self.read_offset
+        return (
+            f"{self.id}  {state}  {elapsed:.1f}s  pid {self.proc.pid}  "
+            f"{unread:,} unread bytes  $ {self.command}"
+        )
+
+
+class JobManager:
+    """The background jobs started from one workspace."""
+
+    def __init__(self, cwd: str):
+        self.cwd = os.path.abspath(cwd)
+        self._jobs: Dict[str, Job] = {}
+        self._counter = 0
+        self._lock = threading.Lock()
+        # Job logs; removed with the manager at exit
+        self._logs = ScratchDir("jobs")
+        _live.add(self)
+
+    def start(self, command: str, cwd: Optional[str] = None) -> Job:
+        """Launch *command* detached; raises ``RuntimeError`` at the job limit."""
+        with self._lock:
+            running = sum(1 for job in self._jobs.values() if job.running)
+            if running >= MAX_RUNNING_JOBS:
+                raise RuntimeError(f"{running} jobs already running; kill one first")
+            self._counter += 1
+            job_id = f"job-{self._counter}"
+            log_path = os.path.join(self._logs.path, f"{job_id}.log")
+            with open(log_path, "wb") as log:
+                proc = subprocess.Popen(
+                    command,
+                    shell=True,
+                    cwd=cwd or self.cwd,
+                    stdin=subprocess.DEVNULL,
+                    stdout=log,
+                    stderr=subprocess.STDOUT,
+                    # Own process group, so kill_job reaches every child
+                    start_new_session=True,
+                )
+            job = self._jobs[job_id] = Job(job_id, command, cwd or self.cwd, log_path, proc)
+            return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id.strip())
+
+    def jobs(self) -> List[Job]:
+        return list(self._jobs.values())
+
+    def read(self, job: Job, offset: Optional[int] = None) -> str:
+        """
+        Output of *job* from *offset* (default: where the last read stopped).
+
+        At most ``MAX_JOB_OUTPUT_BYTES`` are returned; if more is unread, the
+        newest bytes win and the skipped range is reported so it can be
+        fetched with an explicit offset.
+        """
+        # Check first: once a job has exited, its log is complete
+        running = job.running
+        with self._lock:
+            size = job.log_size
+            start = job.read_offset if offset is None else max(0, min(offset, size))
+            skipped = max(size - start - MAX_JOB_OUTPUT_BYTES, 0) if offset is None else 0
+            end = min(start + skipped + MAX_JOB_OUTPUT_BYTES, size)
+            try:
+                with open(job.log_path, "rb") as f:
+                    f.seek(start + skipped)
+                    data = f.read(end - start - skipped)
+            except OSError as e:
+                return f"Error reading output of {job.id}: {e}"
+            job.read_offset = max(job.read_offset, end)
+
+        text = data.decode("utf-8", errors="replace")
+        lines = []
+        if skipped:
+            lines.append(
+                f"[... skipped {skipped:,} bytes (offset {start:,}-{start + skipped:,}); "
+                f"pass offset to read them ...]"
+            )
+        lines.append(text.rstrip("\n") if text else "(no new output)")
+        state = "running" if running else f"exit code {job.proc.returncode}"
+        more = f"; {size - end:,} more bytes" if end < size else ""
+        lines.append(
+            f"[{job.id}: bytes {start + skipped:,}-{end:,} of {size:,}{more} · {state} · "
+            f"log {job.log_path}]"
+        )
+        return "\n".join(lines)
+
+    def kill(self, job: Job) -> None:
+        """SIGTERM the job's process group, then SIGKILL it after a grace period."""
+        if not job.running:
+            return
+        job.killed = True
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            try:
+                os.killpg(job.proc.pid, sig)
+            except OSError:
+                break
+            try:
+                job.proc.wait(timeout=KILL_GRACE_SECONDS)
+                break
+            except subprocess.TimeoutExpired:
+                continue
+        job.poll()
+
+    def shutdown(self) -> None:
+        """Kill every job still running and delete the logs (called at interpreter exit)."""
+        for job in self.jobs():
+            if job.running:
+                try:
+                    os.killpg(job.proc.pid, signal.SIGKILL)
+                except OSError:
+                    pass
+        self._logs.close()
+
+
+# Managers not yet garbage collected, shut down at exit
+_live: "weakref.WeakSet[JobManager]" = weakref.WeakSet()
+
+_managers: Dict[str, JobManager] = {}
+_managers_lock = threading.Lock()
+
+
+@atexit.register
+def _shutdown_all() -> None:
+    for manager in list(_live):
+        manager.shutdown()
+
+
+def get_job_manager(cwd: str) -> JobManager:
+    """The shared job manager for the workspace rooted at *cwd*."""
+    root = os.path.abspath(cwd)
+    with _managers_lock:
+        manager = _managers.get(root)
+        if manager is None:
+            manager = _managers[root] = JobManager(root)
+        return manager
@@ -0,0 +1,262 @@
+"""
+Append-only session journal, so a conversation survives exit and crashes.
+
+Each session is a directory under ``SESSIONS_DIR``:
+
+    journal.jsonl   one JSON record per line: the session header, every
+                    message as it is added to the history, and a marker
+                    for each /clear
+    index.json      checkpoint: a journal byte offset and the live
+                    conversation's records up to it, rewritten every
+                    ``CHECKPOINT_EVERY`` records, at each /clear and on close
+    blobs/          message contents over ``BLOB_MIN_CHARS``, stored once
+                    per SHA-256 so bulky tool output stays out of the journal
+
+Resuming takes the conversation from the checkpoint and parses only the
+journal tail after its offset, however long the transcript grows.  A torn final line (the
+process died mid-write) is ignored, and tool calls left without results by
+a crash get a stub result so the history stays valid for the provider.
+"""
+
+import hashlib
+import json
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from atomic_io import atomic_write
+
+# Where sessions are kept; override with $CODING_AGENT_SESSIONS
+SESSIONS_DIR = os.environ.get("CODING_AGENT_SESSIONS") or os.path.join(
+    os.path.expanduser("~"), ".cache", "coding-agent", "sessions"
+)
+
+# Message contents at least this long are written to blobs/ instead of inline
+BLOB_MIN_CHARS = 2048
+
+# Records appended between checkpoints; a resume parses at most this many
+CHECKPOINT_EVERY = 50
+
+# Result given to tool calls that never finished because the session died
+INTERRUPTED_RESULT = (
+    "Error: the session ended before this tool call finished; re-run it if still needed."
+)
+
+
+class JournalError(Exception):
+    pass
+
+
+class SessionJournal:
+    """Append-only record of one session's history."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.id = os.path.basename(path)
+        self.journal_path = os.path.join(path, "journal.jsonl")
+        self.index_path = os.path.join(path, "index.json")
+        self.blob_dir = os.path.join(path, "blobs")
+        self.header: Dict[str, Any] = {}
+        self._file = None
+        # Message records of the live conversation, as journaled (blobs by
+        # digest); None until created or loaded, and no checkpoint before then
+        self._live: Optional[List[Dict[str, Any]]] = None
+        self._since_checkpoint = 0
+
+    # ------------------------------------------------------------------
+    # Opening
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def create(cls, model: str, cwd: str, root: str = SESSIONS_DIR) -> "SessionJournal":
+        """Start a new session directory and write its header."""
+        session_id = time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:6]
+        journal = cls(os.path.join(root, session_id))
+        os.makedirs(journal.blob_dir, exist_ok=True)
+        journal.header = {
+            "type": "session",
+            "id": session_id,
+            "model": model,
+            "cwd": cwd,
+            "created": time.time(),
+        }
+        journal._write(journal.header)
+        journal._live = []
+        journal.checkpoint()
+        return journal
+
+    @classmethod
+    def open(cls, session: str, root: str = SESSIONS_DIR) -> "SessionJournal":
+        """Open an existing session by id, path, or ``last`` for the newest one."""
+        if session == "last":
+            sessions = list_sessions(root)
+            if not sessions:
+                raise JournalError(f"no sessions in {root}")
+            session = sessions[-1]
+        path = session if os.path.isdir(session) else os.path.join(root, session)
+        journal = cls(path)
+        if not os.path.isfile(journal.journal_path):
+            raise JournalError(f"no session '{session}' in {root}")
+        with open(journal.journal_path, "rb") as f:
+            first = f.readline()
+        try:
+            journal.header = json.loads(first)
+        except json.JSONDecodeError as e:
+            raise JournalError(f"session '{session}' has a corrupt header: {e}") from e
+        return journal
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+
+    def append(self, message: Dict[str, Any]) -> None:
+        """Record one message added to the history."""
+        record: Dict[str, Any] = {"type": "message", "message": message}
+        content = message.get("content")
+        if isinstance(content, str) and len(content) >= BLOB_MIN_CHARS:
+            record["message"] = dict(message, content=None)
+            record["blob"] = self._store_blob(content)
+        self._write(record)
+        if self._live is not None:
+            self._live.append(record)
+            self._since_checkpoint += 1
+            if self._since_checkpoint >= CHECKPOINT_EVERY:
+                self.checkpoint()
+
+    def clear(self) -> None:
+        """Record a /clear; a resume starts after the last one."""
+        self._write({"type": "clear", "time": time.time()})
+        self._live = []
+        self.checkpoint()
+
+    def checkpoint(self) -> None:
+        """Save the live conversation and the journal offset it reaches."""
+        if self._live is None:
+            return
+        index = {"offset": self._size(), "records": self._live}
+        atomic_write(self.index_path, json.dumps(index, ensure_ascii=False).encode("utf-8"))
+        self._since_checkpoint = 0
+
+    def close(self) -> None:
+        if self._since_checkpoint:
+            self.checkpoint()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        if self._file is None:
+            self._file = open(self.journal_path, "a", encoding="utf-8")
+            if self._size() and not self._ends_with_newline():
+                # Terminate a torn line so the next record parses on its own
+                self._file.write("\n")
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        # One flush per record: a crash loses at most the line being written
+        self._file.flush()
+
+    def _store_blob(self, content: str) -> str:
+        data = content.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = os.path.join(self.blob_dir, digest)
+        if not os.path.exists(path):
+            atomic_write(path, data)
+        return digest
+
+    def _ends_with_newline(self) -> bool:
+        with open(self.journal_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def _size(self) -> int:
+        if self._file is not None:
+            self._file.flush()
+        try:
+            return os.path.getsize(self.journal_path)
+        except OSError:
+            return 0
+
+    # ------------------------------------------------------------------
+    # Reading
+    # ------------------------------------------------------------------
+
+    def load(self) -> List[Dict[str, Any]]:
+        """The live conversation: every message since the last /clear."""
+        offset, records = self._checkpoint()
+        tail = 0
+        with open(self.journal_path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-write
+                    continue
+                kind = record.get("type")
+                if kind == "clear":
+                    records = []
+                elif kind == "message":
+                    records.append(record)
+                tail += 1
+        self._live = records
+        self._since_checkpoint = tail
+        return repair_history([self._inflate(record) for record in records])
+
+    def _checkpoint(self) -> Tuple[int, List[Dict[str, Any]]]:
+        """The saved ``(offset, records)``, or ``(0, [])`` to scan the whole journal."""
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                index = json.load(f)
+            offset, records = int(index["offset"]), list(index["records"])
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            # No usable checkpoint: scan from the top (clear records still apply)
+            return 0, []
+        if not 0 <= offset <= os.path.getsize(self.journal_path):
+            return 0, []
+        return offset, records
+
+    def _inflate(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        message = record["message"]
+        digest = record.get("blob")
+        if digest:
+            try:
+                with open(os.path.join(self.blob_dir, digest), "rb") as f:
+                    content = f.read().decode("utf-8")
+            except OSError:
+                content = "[content lost: blob missing from the session journal]"
+            message = dict(message, content=content)
+        return message
+
+
+def repair_history(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Give tool calls a crash left unanswered a stub result, in place order."""
+    repaired: List[Dict[str, Any]] = []
+    pending: Dict[str, str] = {}
+    for message in messages:
+        if message.get("role") != "tool" and pending:
+            repaired.extend(_stub_results(pending))
+            pending = {}
+        if message.get("role") == "assistant":
+            for call in message.get("tool_calls") or []:
+                pending[call["id"]] = call["function"]["name"]
+        elif message.get("role") == "tool":
+            pending.pop(message.get("tool_call_id"), None)
+        repaired.append(message)
+    repaired.extend(_stub_results(pending))
+    return repaired
+
+
+def _stub_results(pending: Dict[str, str]) -> List[Dict[str, Any]]:
+    return [
+        {"role": "tool", "tool_call_id": call_id, "name": name, "content": INTERRUPTED_RESULT}
+        for call_id, name in pending.items()
+    ]
+
+
+def list_sessions(root: str = SESSIONS_DIR) -> List[str]:
+    """Session ids under *root*, oldest first."""
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return []
+    return sorted(n for n in names if os.path.isfile(os.path.join(root, n, "journal.jsonl")))
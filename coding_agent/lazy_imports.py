@@ -0,0 +1,97 @@
+"""
+Deferred loading of heavy dependencies, to keep CLI startup fast.
+
+Importing ``litellm`` takes seconds, and nothing needs it until the first
+model call or token count.  Modules get it from ``load_litellm()`` instead
+of importing it at the top, and ``main`` calls ``preload_litellm()`` so the
+import runs on a background thread while the welcome banner is shown and
+the user types.  A call that arrives before the preload finishes simply
+waits for it.
+
+``StartupProfile`` times the startup phases for ``--startup-profile``.
+"""
+
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+
+_litellm: Any = None
+_litellm_lock = threading.Lock()
+
+# Seconds spent importing litellm, and spent waiting on another thread's import
+timings: Dict[str, float] = {}
+
+
+def load_litellm() -> Any:
+    """The ``litellm`` module, imported and configured on first use."""
+    global _litellm
+    if _litellm is not None:
+        return _litellm
+    waited = time.perf_counter()
+    with _litellm_lock:
+        if _litellm is None:
+            start = time.perf_counter()
+            import litellm
+
+            # Suppress litellm's verbose success messages
+            litellm.suppress_debug_info = True
+            timings["litellm_import"] = time.perf_counter() - start
+            _litellm = litellm
+        elif threading.current_thread().name != "preload-litellm":
+            timings["litellm_wait"] = time.perf_counter() - waited
+    return _litellm
+
+
+def preload_litellm() -> threading.Thread:
+    """Start importing litellm on a daemon thread; returns the thread."""
+
+    def preload() -> None:
+        try:
+            load_litellm()
+        except Exception:
+            # Surfaces again, with a traceback, at the first real use
+            pass
+
+    thread = threading.Thread(target=preload, name="preload-litellm", daemon=True)
+    thread.start()
+    return thread
+
+
+class StartupProfile:
+    """Wall time of each startup phase, reported by ``--startup-profile``."""
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.phases: List[Tuple[str, float]] = []
+        self.ready: Optional[float] = None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def mark_ready(self) -> None:
+        """Record the moment the agent could take input."""
+        self.ready = time.perf_counter() - self.start
+
+    def report(self, preload: Optional[threading.Thread] = None, file: TextIO = sys.stderr) -> None:
+        """Print the phases; waits for *preload* so litellm's cost is included."""
+        lines = ["Startup profile (ms)"]
+        for name, seconds in self.phases:
+            lines.append(f"  {name:<28}{seconds * 1000:>9.1f}")
+        if self.ready is not None:
+            lines.append(f"  {'ready for input':<28}{self.ready * 1000:>9.1f}  since main.py started")
+        if preload is not None:
+            preload.join()
+            imported = timings.get("litellm_import")
+            if imported is None:
+                lines.append("  litellm (background)        failed to import")
+            else:
+                lines.append(f"  {'litellm (background)':<28}{imported * 1000:>9.1f}  off the critical path")
+        lines.append("  per-module detail: python -X importtime main.py ...")
+        print("\n".join(lines), file=file)
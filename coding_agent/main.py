@@ -6,11 +6,22 @@ Usage:
     python main.py
     python main.py --model gpt-4o
     python main.py --model gemini/gemini-1.5-pro --cwd /path/to/project
+    python main.py --stream
+    python main.py --persistent-shell
+    python main.py --resume last
+    python main.py --record runs/session1
+    python main.py --replay runs/session1 --replay-latency recorded
+    python main.py --trace-export traces.json
+    python main.py --startup-profile
+    python main.py --batch tasks.jsonl --workers 8 --rate-limit 120 --batch-output results.jsonl
+    python main.py serve --port 8765 --max-sessions 16
 """
 
 import argparse
+import importlib.util
 import os
 import sys
+from typing import Any, Dict, List, Optional, Tuple
 
 
 EXAMPLES = """
@@ -36,6 +47,14 @@ def build_parser() -> argparse.ArgumentParser:
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog=EXAMPLES,
     )
+    parser.add_argument(
+        "command",
+        nargs="?",
+        choices=("chat", "serve"),
+        default="chat",
+        help="'chat' for the interactive REPL (default), 'serve' for the local "
+        "HTTP/WebSocket server",
+    )
     parser.add_argument(
         "--model",
         default="claude-3-5-sonnet-20241022",
@@ -48,16 +67,371 @@ def build_parser() -> argparse.ArgumentParser:
         metavar="DIR",
         help="working directory for the agent (default: current directory)",
     )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="stream responses and render text as it arrives",
+    )
+    parser.add_argument(
+        "--context-budget",
+        type=int,
+        default=120_000,
+        metavar="TOKENS",
+        help="compact old tool results once the history exceeds this many tokens "
+        "(default: 120000, 0 disables)",
+    )
+    parser.add_argument(
+        "--tool-budget",
+        action="append",
+        default=[],
+        metavar="[TOOL=]TOKENS",
+        help="cap tool results at this many tokens before they enter the history; "
+        "TOOL=TOKENS sets one tool's budget, a bare TOKENS the budget of tools without "
+        "their own (default 8000); 0 means no cap. May be repeated",
+    )
+    parser.add_argument(
+        "--prompt-cache",
+        action="store_true",
+        help="mark the system prompt, tool schemas and history with provider "
+        "cache breakpoints (Anthropic cache_control)",
+    )
+    parser.add_argument(
+        "--no-speculate",
+        dest="speculate",
+        action="store_false",
+        help="with --stream, do not start read-only tool calls before the response "
+        "has finished streaming",
+    )
+    parser.add_argument(
+        "--persistent-shell",
+        action="store_true",
+        help="run execute_bash commands in one long-lived bash session, so cd, "
+        "exports and activated virtualenvs carry over between commands",
+    )
+    parser.add_argument(
+        "--resume",
+        metavar="SESSION",
+        help="continue a journaled session by id (or 'last' for the most recent), "
+        "in its directory and on its model unless --cwd or --model is given",
+    )
+    parser.add_argument(
+        "--no-journal",
+        action="store_true",
+        help="do not record this session to the on-disk journal",
+    )
+    replay = parser.add_mutually_exclusive_group()
+    replay.add_argument(
+        "--record",
+        metavar="DIR",
+        help="save every model response to DIR, keyed by a hash of the request",
+    )
+    replay.add_argument(
+        "--replay",
+        metavar="DIR",
+        help="serve model responses from a --record directory instead of the provider",
+    )
+    replay.add_argument(
+        "--mock-script",
+        metavar="FILE",
+        help="use a scripted mock model that plays back the turns listed in a JSON file",
+    )
+    parser.add_argument(
+        "--replay-latency",
+        default=None,
+        metavar="SECONDS|recorded",
+        help="with --replay, delay each response by SECONDS or by its recorded duration",
+    )
+    parser.add_argument(
+        "--trace-export",
+        metavar="FILE",
+        help="write spans for every turn, LLM call and tool run to FILE as "
+        "OpenTelemetry (OTLP/JSON) traces, updated after each turn",
+    )
+    parser.add_argument(
+        "--startup-profile",
+        action="store_true",
+        help="print how long each startup phase and the litellm import took",
+    )
+    parser.add_argument(
+        "--async",
+        dest="use_async",
+        action="store_true",
+        help="run the asyncio agent loop (non-blocking LLM calls and shell commands)",
+    )
+    routing = parser.add_argument_group("model routing")
+    routing.add_argument(
+        "--fallback-model",
+        action="append",
+        default=[],
+        metavar="MODEL",
+        help="model to retry a request on when the main model errors or times out "
+        "(repeatable; tried in order)",
+    )
+    routing.add_argument(
+        "--hedge",
+        action="store_true",
+        help="when the model is slower than its usual p95, also send the request to "
+        "the first fallback and use whichever answers first",
+    )
+    routing.add_argument(
+        "--hedge-after",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="with --hedge, send the duplicate after SECONDS instead of the rolling p95",
+    )
+    routing.add_argument(
+        "--route",
+        choices=["order", "latency"],
+        default="order",
+        help="try models in the order given, or fastest (rolling median) first "
+        "(default: order)",
+    )
+    limits = parser.add_argument_group("rate limits and retries")
+    limits.add_argument(
+        "--rate-limit",
+        action="append",
+        default=[],
+        metavar="[PROVIDER=]RPM",
+        help="cap model requests per minute, for every provider or just PROVIDER "
+        "(e.g. anthropic=50); shared by all sessions and batch workers (repeatable)",
+    )
+    limits.add_argument(
+        "--token-limit",
+        action="append",
+        default=[],
+        metavar="[PROVIDER=]TPM",
+        help="cap prompt + completion tokens per minute, like --rate-limit (repeatable)",
+    )
+    limits.add_argument(
+        "--max-retries",
+        type=int,
+        default=4,
+        metavar="N",
+        help="retry a model call failing with a 429, 5xx or timeout up to N times, "
+        "with jittered exponential backoff or as Retry-After asks (default: 4)",
+    )
+    batch = parser.add_argument_group("batch mode")
+    batch.add_argument(
+        "--batch",
+        metavar="TASKS",
+        help="run the tasks in a JSONL file non-interactively (one object per line with "
+        "'prompt' and optionally 'id', 'cwd', 'model', 'max_iterations')",
+    )
+    batch.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        metavar="N",
+        help="agent processes running tasks concurrently (default: 4)",
+    )
+    batch.add_argument(
+        "--batch-output",
+        metavar="FILE",
+        help="write one JSONL result record per task to FILE (default: stdout)",
+    )
+    server = parser.add_argument_group("server mode (serve)")
+    server.add_argument("--host", default="127.0.0.1", help="interface to listen on (default: 127.0.0.1)")
+    server.add_argument("--port", type=int, default=8765, help="port to listen on (default: 8765)")
+    server.add_argument(
+        "--max-sessions",
+        type=int,
+        default=32,
+        metavar="N",
+        help="sessions held at once; the least recently used idle one is evicted "
+        "to make room (default: 32)",
+    )
+    server.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=1800,
+        metavar="SECONDS",
+        help="close sessions idle for this long (default: 1800)",
+    )
+    server.add_argument(
+        "--auth-token",
+        default=os.environ.get("CODING_AGENT_TOKEN"),
+        metavar="TOKEN",
+        help="token clients send as 'Authorization: Bearer TOKEN' "
+        "(default: $CODING_AGENT_TOKEN, else a random token printed at startup)",
+    )
     return parser
 
 
-def check_dependencies() -> None:
-    missing = []
-    for pkg in ("litellm", "rich"):
+def parse_tool_budgets(
+    parser: argparse.ArgumentParser, values: List[str]
+) -> Tuple[Optional[int], Dict[str, int]]:
+    """Split ``--tool-budget`` values into the default and per-tool budgets."""
+    default: Optional[int] = None
+    per_tool: Dict[str, int] = {}
+    for value in values:
+        tool, _, tokens = value.rpartition("=")
+        try:
+            budget = int(tokens)
+        except ValueError:
+            parser.error(f"--tool-budget: expected TOKENS or TOOL=TOKENS, got {value!r}")
+        if tool:
+            per_tool[tool] = budget
+        else:
+            default = budget
+    return default, per_tool
+
+
+def parse_limits(parser: argparse.ArgumentParser, flag: str, values: List[str]) -> Dict[str, float]:
+    """Split ``--rate-limit`` / ``--token-limit`` values by provider (``""`` for the default)."""
+    limits: Dict[str, float] = {}
+    for value in values:
+        provider, _, amount = value.rpartition("=")
+        try:
+            limit = float(amount)
+        except ValueError:
+            limit = 0.0
+        if limit <= 0:
+            parser.error(f"{flag}: expected a positive [PROVIDER=]LIMIT, got {value!r}")
+        limits[provider] = limit
+    return limits
+
+
+def build_transport(parser: argparse.ArgumentParser, args: argparse.Namespace) -> Any:
+    """The transport selected by --record / --replay / --mock-script and the routing flags, if any."""
+    options = transport_options(parser, args)
+    from transport import create_transport
+
+    return create_transport(**options)
+
+
+def transport_options(parser: argparse.ArgumentParser, args: argparse.Namespace) -> Dict[str, Any]:
+    """Validated ``create_transport`` keyword arguments from the command line."""
+    latency: Any = args.replay_latency
+    if latency is not None and latency != "recorded":
         try:
-            __import__(pkg)
-        except ImportError:
-            missing.append(pkg)
+            latency = float(latency)
+        except ValueError:
+            parser.error("--replay-latency: expected SECONDS or 'recorded'")
+    if args.replay and not os.path.isdir(args.replay):
+        parser.error(f"--replay: '{args.replay}' is not a directory")
+    if args.hedge and not args.fallback_model:
+        parser.error("--hedge needs at least one --fallback-model to hedge with")
+    if args.hedge_after is not None and (not args.hedge or args.hedge_after < 0):
+        parser.error("--hedge-after needs --hedge and a delay of 0 or more seconds")
+    if args.max_retries < 0:
+        parser.error("--max-retries must be 0 or more")
+    from ratelimit import RateLimits
+
+    limits = RateLimits(
+        rpm=parse_limits(parser, "--rate-limit", args.rate_limit),
+        tpm=parse_limits(parser, "--token-limit", args.token_limit),
+        models=[args.model] + args.fallback_model,
+    )
+    return {
+        "record": args.record,
+        "replay": args.replay,
+        "mock_script": args.mock_script,
+        "replay_latency": latency,
+        "fallback_models": args.fallback_model,
+        "hedge": args.hedge,
+        "hedge_after": args.hedge_after,
+        "route": args.route,
+        "limits": limits,
+        "max_retries": args.max_retries,
+    }
+
+
+def run_batch_mode(
+    parser: argparse.ArgumentParser,
+    args: argparse.Namespace,
+    cwd: str,
+    default_budget: Optional[int],
+    tool_budgets: Dict[str, int],
+) -> None:
+    """Run ``--batch`` tasks and exit non-zero if any did not succeed."""
+    import json
+
+    from batch import BatchError, load_tasks, run_batch
+
+    if args.resume or args.use_async:
+        parser.error("--batch cannot be combined with --resume or --async")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    try:
+        tasks = load_tasks(args.batch, cwd, args.model)
+    except BatchError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    agent_options: Dict[str, Any] = dict(
+        context_budget=args.context_budget,
+        prompt_cache=args.prompt_cache,
+        persistent_shell=args.persistent_shell,
+        speculate=args.speculate,
+        tool_budgets=tool_budgets,
+    )
+    if default_budget is not None:
+        agent_options["result_budget"] = default_budget
+
+    output = open(args.batch_output, "w", encoding="utf-8") if args.batch_output else sys.stdout
+    try:
+        summary = run_batch(
+            tasks,
+            output,
+            workers=args.workers,
+            agent_options=agent_options,
+            transport_options=transport_options(parser, args),
+            journal=not args.no_journal,
+        )
+    except KeyboardInterrupt:
+        print("\nInterrupted; unfinished tasks were not run.", file=sys.stderr)
+        sys.exit(130)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(json.dumps(summary), file=sys.stderr)
+    sys.exit(0 if summary["statuses"].get("ok", 0) == len(tasks) else 1)
+
+
+def run_server(
+    parser: argparse.ArgumentParser,
+    args: argparse.Namespace,
+    cwd: str,
+    default_budget: Optional[int],
+    tool_budgets: Dict[str, int],
+) -> None:
+    """Host sessions over HTTP/WebSocket until interrupted."""
+    if args.resume or args.batch:
+        parser.error("serve cannot be combined with --resume or --batch")
+    if args.max_sessions < 1:
+        parser.error("--max-sessions must be at least 1")
+    if importlib.util.find_spec("aiohttp") is None:
+        print("serve needs aiohttp.  Run:  pip install -r requirements.txt")
+        sys.exit(1)
+    from lazy_imports import preload_litellm
+    from server import SessionPool, serve
+
+    # Every session shares this one import, and litellm's HTTP clients with it
+    preload_litellm()
+    agent_options: Dict[str, Any] = dict(
+        context_budget=args.context_budget,
+        prompt_cache=args.prompt_cache,
+        persistent_shell=args.persistent_shell,
+        speculate=args.speculate,
+        tool_budgets=tool_budgets,
+    )
+    if default_budget is not None:
+        agent_options["result_budget"] = default_budget
+    pool = SessionPool(
+        agent_options,
+        transport_options(parser, args),
+        journal=not args.no_journal,
+        max_sessions=args.max_sessions,
+        idle_timeout=args.idle_timeout,
+        root=cwd,
+    )
+    serve(pool, cwd, args.model, host=args.host, port=args.port, token=args.auth_token)
+
+
+def check_dependencies() -> None:
+    # find_spec locates a package without importing it (litellm alone takes seconds)
+    missing = [pkg for pkg in ("litellm", "rich") if importlib.util.find_spec(pkg) is None]
     if missing:
         print(f"Missing dependencies: {', '.join(missing)}")
         print("Run:  pip install -r requirements.txt")
@@ -65,10 +439,30 @@ def check_dependencies() -> None:
 
 
 def main() -> None:
-    parser = build_parser()
-    args = parser.parse_args()
+    from lazy_imports import StartupProfile, preload_litellm
+
+    profile = StartupProfile()
+    with profile.phase("parse arguments"):
+        parser = build_parser()
+        args = parser.parse_args()
 
-    check_dependencies()
+    with profile.phase("check dependencies"):
+        check_dependencies()
+
+    journal = None
+    if args.resume:
+        from journal import JournalError, SessionJournal
+
+        try:
+            journal = SessionJournal.open(args.resume)
+        except JournalError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        # Pick up where and on what the session ran unless given explicitly
+        if args.cwd == parser.get_default("cwd") and journal.header.get("cwd"):
+            args.cwd = journal.header["cwd"]
+        if args.model == parser.get_default("model") and journal.header.get("model"):
+            args.model = journal.header["model"]
 
     # Validate working directory
     cwd = os.path.abspath(args.cwd)
@@ -76,10 +470,64 @@ def main() -> None:
         print(f"Error: '{cwd}' is not a directory.")
         sys.exit(1)
 
-    from agent import CodingAgent
+    default_budget, tool_budgets = parse_tool_budgets(parser, args.tool_budget)
+
+    if args.command == "serve":
+        run_server(parser, args, cwd, default_budget, tool_budgets)
+        return
+    if args.batch:
+        run_batch_mode(parser, args, cwd, default_budget, tool_budgets)
+
+    with profile.phase("open session journal"):
+        if journal is None and not args.no_journal:
+            from journal import SessionJournal
+
+            journal = SessionJournal.create(args.model, cwd)
+
+    with profile.phase("build transport"):
+        transport = build_transport(parser, args)
+
+    agent_kwargs = dict(
+        model=args.model,
+        cwd=cwd,
+        stream=args.stream,
+        context_budget=args.context_budget,
+        prompt_cache=args.prompt_cache,
+        persistent_shell=args.persistent_shell,
+        speculate=args.speculate,
+        tool_budgets=tool_budgets,
+        journal=journal,
+        transport=transport,
+        trace_export=args.trace_export,
+    )
+    if default_budget is not None:
+        agent_kwargs["result_budget"] = default_budget
+
+    with profile.phase("import agent (rich, tools)"):
+        if args.use_async:
+            from async_agent import AsyncCodingAgent as agent_class
+        else:
+            from agent import CodingAgent as agent_class
+
+    with profile.phase("create agent"):
+        agent = agent_class(**agent_kwargs)
+    profile.mark_ready()
+    # Import litellm while the banner shows and the user types the first prompt;
+    # started only now so it does not compete with the imports above
+    preload = preload_litellm()
+    if args.startup_profile:
+        profile.report(preload)
+
+    try:
+        if args.use_async:
+            import asyncio
 
-    agent = CodingAgent(model=args.model, cwd=cwd)
-    agent.run()
+            asyncio.run(agent.run())
+        else:
+            agent.run()
+    finally:
+        if transport is not None:
+            transport.close()
 
 
 if __name__ == "__main__":
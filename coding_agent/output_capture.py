@@ -0,0 +1,194 @@
+"""
+Bounded, streaming capture of command output.
+
+``BoundedCapture`` keeps the first and last few KB of a stream in memory
+and counts everything in between, so a build that prints hundreds of MB
+costs a fixed amount of RAM and a fixed slice of the conversation.  Once a
+stream outgrows its budget the complete output is spilled to a file in a
+``ScratchDir`` (the agent's own, or a process-wide one), whose path is quoted in the rendered result so the model can page through
+it with ``read_file`` offset/limit.
+"""
+
+import asyncio
+import codecs
+import os
+import selectors
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, IO, Optional
+
+from scratch import ScratchDir, default_scratch
+
+# Bytes of each stream (stdout, stderr) kept for the model
+DEFAULT_OUTPUT_BUDGET = 64 * 1024
+
+# Share of the budget given to the start of the output; the rest keeps the
+# end, where errors and summaries usually are
+HEAD_FRACTION = 0.25
+
+# How far a head/tail cut may move to land on a line boundary
+LINE_SNAP_BYTES = 512
+
+# Receives each decoded chunk as it arrives (used for the live console tail)
+OutputCallback = Callable[[str], None]
+
+
+class BoundedCapture:
+    """Head + tail of one output stream within a byte budget."""
+
+    def __init__(
+        self,
+        budget: int = DEFAULT_OUTPUT_BUDGET,
+        label: str = "stdout",
+        scratch: Optional[ScratchDir] = None,
+    ):
+        self.label = label
+        self.scratch = scratch
+        self.head_budget = int(budget * HEAD_FRACTION)
+        self.tail_budget = budget - self.head_budget
+        self.head = bytearray()
+        self._tail: Deque[bytes] = deque()
+        self._tail_bytes = 0
+        self.total = 0
+        self.spill_path: Optional[str] = None
+        self._spill: Optional[IO[bytes]] = None
+
+    def write(self, data: bytes) -> None:
+        if not data:
+            return
+        self.total += len(data)
+        if self._spill is not None:
+            self._spill.write(data)
+        elif self.total > self.head_budget + self.tail_budget:
+            self._start_spill(data)
+
+        room = self.head_budget - len(self.head)
+        if room > 0:
+            self.head += data[:room]
+            data = data[room:]
+            if not data:
+                return
+        self._tail.append(data)
+        self._tail_bytes += len(data)
+        while self._tail_bytes - len(self._tail[0]) >= self.tail_budget:
+            self._tail_bytes -= len(self._tail.popleft())
+
+    def _start_spill(self, data: bytes) -> None:
+        # Nothing has been dropped yet: head + tail still hold every byte
+        # written before *data*, so the file starts out complete.
+        scratch = self.scratch or default_scratch()
+        self.spill_path = scratch.new_file(f"{self.label}.log")
+        self._spill = open(self.spill_path, "wb")
+        self._spill.write(self.head)
+        for chunk in self._tail:
+            self._spill.write(chunk)
+        self._spill.write(data)
+
+    def close(self) -> None:
+        if self._spill is not None:
+            self._spill.close()
+
+    @property
+    def dropped(self) -> int:
+        return max(self.total - len(self.head) - self._tail_bytes, 0)
+
+    def text(self) -> str:
+        """The kept output, with a marker where bytes were dropped."""
+        self.close()
+        tail = b"".join(self._tail)
+        if not self.dropped:
+            return (bytes(self.head) + tail).decode("utf-8", errors="replace")
+        # Trim the ring's overshoot, then snap both cuts to line boundaries
+        tail = tail[-self.tail_budget :]
+        head = bytes(self.head)
+        cut = head.rfind(b"\n", len(head) - LINE_SNAP_BYTES)
+        if cut >= 0:
+            head = head[: cut + 1]
+        cut = tail.find(b"\n", 0, LINE_SNAP_BYTES)
+        if cut >= 0:
+            tail = tail[cut + 1 :]
+        dropped = self.total - len(head) - len(tail)
+        where = f"; full output in {self.spill_path}" if self.spill_path else ""
+        marker = (
+            f"\n[... {dropped:,} bytes of {self.label} dropped ({self.total:,} total){where} "
+            f"— page it with read_file offset/limit ...]\n"
+        )
+        return head.decode("utf-8", errors="replace") + marker + tail.decode("utf-8", errors="replace")
+
+
+def pump(
+    streams: Dict[int, BoundedCapture],
+    timeout: float,
+    on_output: Optional[OutputCallback] = None,
+    marker: Optional[bytes] = None,
+) -> Optional[Dict[int, bytes]]:
+    """
+    Copy the file descriptors in *streams* into their captures.
+
+    Reads until every stream hits EOF or, when *marker* is given, a line
+    starting with it; the marker line is not captured.  Returns each
+    stream's marker line (empty at EOF), or None if *timeout* ran out.
+    """
+    decoders = {fd: codecs.getincrementaldecoder("utf-8")(errors="replace") for fd in streams}
+    pending = {fd: b"" for fd in streams}
+    trailers: Dict[int, bytes] = {}
+    # A marker split across reads must not reach the capture half-written
+    hold = len(marker) + 1 if marker else 0
+    sel = selectors.DefaultSelector()
+    for fd in streams:
+        sel.register(fd, selectors.EVENT_READ)
+    deadline = time.monotonic() + timeout
+    try:
+        while len(trailers) < len(streams):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                for fd, held in pending.items():
+                    if fd not in trailers:
+                        streams[fd].write(held)
+                return None
+            for key, _ in sel.select(remaining):
+                fd = key.fd
+                chunk = os.read(fd, 65536)
+                data = pending[fd] + chunk
+                if not chunk:
+                    # EOF: whatever was held back is ordinary output
+                    keep, trailers[fd] = data, b""
+                    sel.unregister(fd)
+                elif marker is not None:
+                    at = data.find(b"\n" + marker)
+                    if at >= 0 and data.find(b"\n", at + 1) >= 0:
+                        keep, trailers[fd] = data[:at], data[at + 1 :]
+                        sel.unregister(fd)
+                    else:
+                        cut = at if at >= 0 else max(len(data) - hold, 0)
+                        keep, pending[fd] = data[:cut], data[cut:]
+                else:
+                    keep = data
+                streams[fd].write(keep)
+                if on_output is not None and keep:
+                    text = decoders[fd].decode(keep)
+                    if text:
+                        on_output(text)
+    finally:
+        sel.close()
+    return trailers
+
+
+async def pump_async(
+    reader: Optional["asyncio.StreamReader"],
+    capture: BoundedCapture,
+    on_output: Optional[OutputCallback] = None,
+) -> None:
+    """Copy an asyncio subprocess pipe into *capture* until EOF."""
+    if reader is None:
+        return
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    while True:
+        chunk = await reader.read(65536)
+        if not chunk:
+            return
+        capture.write(chunk)
+        if on_output is not None:
+            text = decoder.decode(chunk)
+            if text:
+                on_output(text)
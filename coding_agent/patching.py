@@ -0,0 +1,135 @@
+"""
+In-memory application of exact-match edits and unified diffs.
+
+Both helpers take the current file text and return the new text, raising
+``PatchError`` without side effects if any part of the change does not
+apply, so callers can write the result atomically or not at all.
+"""
+
+import io
+import re
+from typing import Any, Dict, List, Tuple
+
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+# How far (in lines) a hunk may have drifted from its stated position
+MAX_HUNK_DRIFT = 200
+
+
+class PatchError(ValueError):
+    pass
+
+
+def apply_edits(text: str, edits: List[Dict[str, Any]]) -> Tuple[str, int]:
+    """
+    Apply ``{"old_string", "new_string", "replace_all"}`` edits in order.
+
+    Each ``old_string`` must occur exactly once unless ``replace_all`` is
+    set.  Returns the new text and the number of replacements made.
+    """
+    replacements = 0
+    for i, edit in enumerate(edits, 1):
+        old = edit.get("old_string", "")
+        new = edit.get("new_string", "")
+        if not old:
+            raise PatchError(f"edit {i}: old_string is empty")
+        if old == new:
+            raise PatchError(f"edit {i}: old_string and new_string are identical")
+        count = text.count(old)
+        if count == 0:
+            raise PatchError(f"edit {i}: old_string not found")
+        if count > 1 and not edit.get("replace_all"):
+            raise PatchError(
+                f"edit {i}: old_string matches {count} times; add context or set replace_all"
+            )
+        text = text.replace(old, new)
+        replacements += count
+    return text, replacements
+
+
+def apply_unified_diff(text: str, diff: str) -> Tuple[str, int]:
+    """
+    Apply a single-file unified diff to *text*.
+
+    Hunks are matched on their context and removed lines; a hunk that has
+    drifted from its stated line number is located by searching outward.
+    Returns the new text and the number of hunks applied.
+    """
+    lines = _split_lines(text)
+    hunks = _parse_hunks(diff)
+    if not hunks:
+        raise PatchError("patch contains no hunks")
+
+    shift = 0
+    for n, (start, old, new) in enumerate(hunks, 1):
+        at = _locate(lines, old, max(start - 1 + shift, 0))
+        if at < 0:
+            raise PatchError(f"hunk {n} (line {start}) does not match the file")
+        lines[at : at + len(old)] = new
+        shift += len(new) - len(old)
+    return "".join(lines), len(hunks)
+
+
+def _parse_hunks(diff: str) -> List[Tuple[int, List[str], List[str]]]:
+    hunks: List[Tuple[int, List[str], List[str]]] = []
+    old: List[str] = []
+    new: List[str] = []
+    last: List[List[str]] = []
+    start = 0
+    in_hunk = False
+    for raw in _split_lines(diff):
+        header = HUNK_HEADER.match(raw)
+        if header:
+            if in_hunk:
+                hunks.append((start, old, new))
+            # A pure insertion ("-5,0") goes after line 5 rather than at it
+            start = int(header.group(1)) + (1 if header.group(2) == "0" else 0)
+            old, new = [], []
+            in_hunk = True
+            continue
+        if not in_hunk:
+            continue
+        if raw.startswith("\\"):
+            # "\ No newline at end of file" applies to the line just above it
+            for side in last:
+                side[-1] = side[-1].rstrip("\n")
+            continue
+        body = raw[1:] if raw[:1] in (" ", "-", "+") else raw
+        if not body.endswith("\n"):
+            body += "\n"
+        if raw.startswith("-"):
+            last = [old]
+        elif raw.startswith("+"):
+            last = [new]
+        else:
+            last = [old, new]
+        for side in last:
+            side.append(body)
+    if in_hunk:
+        hunks.append((start, old, new))
+    return hunks
+
+
+def _split_lines(text: str) -> List[str]:
+    # Line numbers count "\n" only; splitlines() would also break at \f, \x1c-\x1e, \x85...
+    return io.StringIO(text).readlines()
+
+
+def _locate(lines: List[str], old: List[str], guess: int) -> int:
+    """Index where *old* occurs in *lines*, searching outward from *guess*."""
+    if not old:
+        return min(guess, len(lines))
+    for delta in range(MAX_HUNK_DRIFT + 1):
+        for at in (guess - delta, guess + delta) if delta else (guess,):
+            if 0 <= at <= len(lines) - len(old) and _matches(lines, old, at):
+                return at
+    return -1
+
+
+def _matches(lines: List[str], old: List[str], at: int) -> bool:
+    for i, expected in enumerate(old):
+        actual = lines[at + i]
+        # Tolerate a missing final newline in either the file or the diff
+        if actual != expected and actual.rstrip("\n") != expected.rstrip("\n"):
+            return False
+    return True
@@ -0,0 +1,102 @@
+"""
+Provider prompt caching for the stable prefix of every request.
+
+The system prompt and tool schemas never change, and the history only grows
+at the end, so each request shares a long prefix with the previous one.
+``add_cache_breakpoints`` marks that prefix with Anthropic-style
+``cache_control`` blocks, which litellm passes through to providers that
+support them.  ``CacheStats`` totals the cache hit/miss counts reported in
+``response.usage``.
+"""
+
+import copy
+from typing import Any, Dict, List, Optional
+
+EPHEMERAL = {"type": "ephemeral"}
+
+
+def add_cache_breakpoints(request: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Return a copy of *request* with cache breakpoints on the system prompt,
+    the last tool definition, and the newest message with text content.
+
+    That is three of the four breakpoints Anthropic allows.  The history
+    breakpoint rolls forward every call; the provider finds the previous
+    call's prefix by looking back from it.  Messages are copied, never
+    mutated, so the agent's history keeps plain string content.
+    """
+    request = dict(request)
+    messages: List[Dict[str, Any]] = list(request["messages"])
+
+    if messages and messages[0].get("role") == "system":
+        messages[0] = _with_cached_content(messages[0])
+
+    for i in range(len(messages) - 1, 0, -1):
+        if messages[i].get("content"):
+            messages[i] = _with_cached_content(messages[i])
+            break
+    request["messages"] = messages
+
+    tools = request.get("tools")
+    if tools:
+        tools = list(tools)
+        tools[-1] = copy.deepcopy(tools[-1])
+        tools[-1]["cache_control"] = dict(EPHEMERAL)
+        request["tools"] = tools
+    return request
+
+
+def _with_cached_content(message: Dict[str, Any]) -> Dict[str, Any]:
+    message = dict(message)
+    content = message["content"]
+    if isinstance(content, str):
+        message["content"] = [{"type": "text", "text": content, "cache_control": dict(EPHEMERAL)}]
+    else:
+        blocks = copy.deepcopy(content)
+        blocks[-1]["cache_control"] = dict(EPHEMERAL)
+        message["content"] = blocks
+    return message
+
+
+class CacheStats:
+    """Running totals of prompt-cache activity across LLM calls."""
+
+    def __init__(self) -> None:
+        self.read_tokens = 0
+        self.write_tokens = 0
+        self.uncached_tokens = 0
+
+    def record(self, usage: Any) -> Optional[Dict[str, int]]:
+        """Add one response's usage; returns that call's breakdown, if reported."""
+        if usage is None:
+            return None
+        read, written = cache_tokens(usage)
+        prompt = _get(usage, "prompt_tokens") or 0
+        # OpenAI-style prompt_tokens already include cached tokens; Anthropic
+        # reports cache reads/writes separately and litellm folds them in.
+        uncached = max(prompt - read - written, 0)
+        self.read_tokens += read
+        self.write_tokens += written
+        self.uncached_tokens += uncached
+        return {"read": read, "written": written, "uncached": uncached}
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.read_tokens + self.write_tokens + self.uncached_tokens
+        return self.read_tokens / total if total else 0.0
+
+
+def cache_tokens(usage: Any) -> "tuple[int, int]":
+    """(cache read, cache write) prompt tokens from a litellm ``Usage`` object."""
+    read = _get(usage, "cache_read_input_tokens") or 0
+    if not read:
+        details = _get(usage, "prompt_tokens_details")
+        read = (_get(details, "cached_tokens") if details is not None else 0) or 0
+    written = _get(usage, "cache_creation_input_tokens") or 0
+    return int(read), int(written)
+
+
+def _get(obj: Any, name: str) -> Any:
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
@@ -0,0 +1,467 @@
+"""
+Client-side rate limits and retries for model calls.
+
+``RetryingTransport`` sits in front of another transport and makes every
+request wait its turn against per-provider budgets before it is sent:
+
+* Budgets are token buckets for requests per minute and tokens per minute.
+  A request reserves one request and an estimate of its prompt tokens up
+  front and is charged the actual usage once the response arrives, so a
+  caller that would overdraw the bucket waits exactly as long as the
+  refill needs instead of polling.
+* The buckets live in shared memory (``RateLimits``), so every agent in a
+  process -- or in a whole ``--batch`` pool, whose workers inherit them --
+  draws on the same budget.
+* A 429 or 5xx is retried with exponential backoff and full jitter, or
+  after the ``Retry-After`` the provider asked for.  A 429 also pauses the
+  provider's bucket for that long, so the other agents sharing it back off
+  together instead of each discovering the limit with a failed request of
+  its own.
+* Behind a ``ModelRouter`` that still has another model to try, nothing is
+  retried and no budget is waited on for longer than ``FALLBACK_MAX_WAIT``:
+  the failure goes back to the router, which fails over at once.  Retries
+  are for the last model standing.
+
+A stream is only retried until its first chunk arrives; after that a
+failure surfaces to the agent as before.
+"""
+
+import asyncio
+import json
+import multiprocessing
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from tracing import current_span
+from transport import LiteLLMTransport, Transport, aclose_stream, close_stream, has_fallback
+
+# Retries after the first attempt unless --max-retries says otherwise
+DEFAULT_MAX_RETRIES = 4
+
+# Backoff before retry n is uniform in [0, min(RETRY_MAX, RETRY_BASE * 2**n)] seconds
+RETRY_BASE = 1.0
+RETRY_MAX = 60.0
+
+# Longest Retry-After honoured; a provider asking for more is treated as down
+RETRY_AFTER_MAX = 300.0
+
+# Longest wait for a budget (or a provider's pause) while a fallback model is ready
+FALLBACK_MAX_WAIT = 5.0
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits, server errors
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+# Exception class names (litellm / openai / httpx) worth retrying when no status is attached
+RETRY_ERRORS = {
+    "RateLimitError",
+    "Timeout",
+    "APITimeoutError",
+    "APIConnectionError",
+    "ServiceUnavailableError",
+    "InternalServerError",
+    "TimeoutError",
+    "ConnectionError",
+}
+
+# Rough prompt size used to reserve tokens before the provider reports usage
+CHARS_PER_TOKEN = 4
+
+# Model name prefixes of providers addressed without a "provider/" prefix
+PROVIDER_PREFIXES = (
+    ("claude", "anthropic"),
+    ("gpt", "openai"),
+    ("o1", "openai"),
+    ("o3", "openai"),
+    ("o4", "openai"),
+    ("text-embedding", "openai"),
+    ("gemini", "gemini"),
+    ("command", "cohere"),
+    ("mistral", "mistral"),
+)
+
+# Slots in a bucket's shared array
+_REQUESTS, _TOKENS, _UPDATED, _BLOCKED = range(4)
+
+
+class BudgetExhaustedError(Exception):
+    """The provider's budget is not free soon enough, and another model can take the call."""
+
+
+def provider_of(model: str) -> str:
+    """The provider a litellm model string is sent to, as far as budgets are concerned."""
+    if "/" in model:
+        return model.split("/", 1)[0]
+    for prefix, provider in PROVIDER_PREFIXES:
+        if model.startswith(prefix):
+            return provider
+    return model
+
+
+# ---------------------------------------------------------------------------
+# Budgets
+# ---------------------------------------------------------------------------
+
+class ProviderBucket:
+    """
+    Request and token buckets for one provider, in shared memory.
+
+    Each holds up to a minute's allowance and refills continuously.  Levels
+    may go negative: that is debt the next caller waits out.
+    """
+
+    def __init__(self, rpm: Optional[float], tpm: Optional[float], state: Any):
+        self.rpm = rpm
+        self.tpm = tpm
+        # multiprocessing.Array("d", 4): requests, tokens, last refill, paused until
+        self.state = state
+
+    def _refill(self, now: float) -> None:
+        elapsed = max(now - self.state[_UPDATED], 0.0)
+        if self.rpm:
+            self.state[_REQUESTS] = min(self.state[_REQUESTS] + elapsed * self.rpm / 60, self.rpm)
+        if self.tpm:
+            self.state[_TOKENS] = min(self.state[_TOKENS] + elapsed * self.tpm / 60, self.tpm)
+        self.state[_UPDATED] = now
+
+    def reserve(self, tokens: int) -> float:
+        """Take one request and *tokens* from the budget; returns seconds to wait first."""
+        now = time.time()
+        with self.state.get_lock():
+            self._refill(now)
+            wait = self.state[_BLOCKED] - now
+            if self.rpm:
+                self.state[_REQUESTS] -= 1
+                wait = max(wait, -self.state[_REQUESTS] * 60 / self.rpm)
+            if self.tpm:
+                self.state[_TOKENS] -= tokens
+                wait = max(wait, -self.state[_TOKENS] * 60 / self.tpm)
+        return max(wait, 0.0)
+
+    def release(self, tokens: int) -> None:
+        """Give back a reservation that will not be sent."""
+        with self.state.get_lock():
+            if self.rpm:
+                self.state[_REQUESTS] += 1
+            if self.tpm:
+                self.state[_TOKENS] += tokens
+
+    def settle(self, tokens: int) -> None:
+        """Charge *tokens* more (or refund, if negative) once real usage is known."""
+        if self.tpm and tokens:
+            with self.state.get_lock():
+                self.state[_TOKENS] -= tokens
+
+    def pause(self, seconds: float) -> None:
+        """Hold every caller of this provider back for *seconds* (after a 429)."""
+        with self.state.get_lock():
+            self.state[_BLOCKED] = max(self.state[_BLOCKED], time.time() + seconds)
+
+    def paused_for(self) -> float:
+        return max(self.state[_BLOCKED] - time.time(), 0.0)
+
+
+class RateLimits:
+    """
+    Per-provider buckets shared by every transport created with this object.
+
+    *rpm* and *tpm* map a provider name to its limit; the ``""`` entry is
+    the limit for any other provider.  Buckets for the providers of
+    *models* are allocated up front so that processes spawned with this
+    object share them; buckets for providers first seen later are local to
+    the process that saw them.
+    """
+
+    def __init__(
+        self,
+        rpm: Optional[Dict[str, float]] = None,
+        tpm: Optional[Dict[str, float]] = None,
+        models: Iterable[str] = (),
+    ):
+        self.rpm = dict(rpm or {})
+        self.tpm = dict(tpm or {})
+        self.buckets: Dict[str, ProviderBucket] = {}
+        self.share(models)
+
+    def share(self, models: Iterable[str]) -> None:
+        """Allocate the buckets for *models* now, before any worker is spawned."""
+        for model in models:
+            self.bucket(model)
+
+    def bucket(self, model: str) -> ProviderBucket:
+        provider = provider_of(model)
+        bucket = self.buckets.get(provider)
+        if bucket is None:
+            rpm = self.rpm.get(provider, self.rpm.get(""))
+            tpm = self.tpm.get(provider, self.tpm.get(""))
+            # Buckets start full; the refill clock starts now.  Spawn context, as
+            # batch workers are spawned and cannot inherit a fork context's lock
+            state = multiprocessing.get_context("spawn").Array(
+                "d", [rpm or 0.0, tpm or 0.0, time.time(), 0.0]
+            )
+            bucket = self.buckets.setdefault(provider, ProviderBucket(rpm, tpm, state))
+        return bucket
+
+
+# ---------------------------------------------------------------------------
+# Classifying failures
+# ---------------------------------------------------------------------------
+
+def is_retryable(exc: BaseException) -> bool:
+    status = getattr(exc, "status_code", None)
+    if isinstance(status, int):
+        return status in RETRY_STATUSES
+    return any(cls.__name__ in RETRY_ERRORS for cls in type(exc).__mro__)
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    return getattr(exc, "status_code", None) == 429 or type(exc).__name__ == "RateLimitError"
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds the provider asked us to wait (``Retry-After`` / ``retry-after-ms``), if any."""
+    headers = getattr(exc, "litellm_response_headers", None)
+    if headers is None:
+        headers = getattr(getattr(exc, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        lookup = {str(k).lower(): str(v) for k, v in headers.items()}
+    except AttributeError:
+        return None
+    if "retry-after-ms" in lookup:
+        try:
+            return max(float(lookup["retry-after-ms"]) / 1000, 0.0)
+        except ValueError:
+            pass
+    value = lookup.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_tokens(request: Dict[str, Any]) -> int:
+    """Prompt tokens to reserve for *request* before its usage is known."""
+    size = len(json.dumps(request.get("messages", []), default=str))
+    size += len(json.dumps(request.get("tools", []), default=str))
+    return size // CHARS_PER_TOKEN + 1
+
+
+# ---------------------------------------------------------------------------
+# Transport
+# ---------------------------------------------------------------------------
+
+class RetryingTransport(Transport):
+    """Wait for the provider's budget before each call to *inner*, and retry transient failures."""
+
+    def __init__(
+        self,
+        inner: Optional[Transport] = None,
+        limits: Optional[RateLimits] = None,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+    ):
+        self.inner = inner or LiteLLMTransport()
+        self.limits = limits or RateLimits()
+        self.max_retries = max_retries
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+
+    def _admit(self, bucket: ProviderBucket, tokens: int) -> float:
+        """Seconds to wait before sending: the budget's, or the provider's pause."""
+        delay = max(bucket.reserve(tokens), bucket.paused_for())
+        if delay > FALLBACK_MAX_WAIT and has_fallback():
+            bucket.release(tokens)
+            raise BudgetExhaustedError(f"rate limit budget frees up in {delay:.1f}s")
+        return delay
+
+    def _backoff(
+        self, bucket: ProviderBucket, tokens: int, attempt: int, exc: BaseException
+    ) -> Optional[float]:
+        """Seconds before retry *attempt*, or None if *exc* should be raised."""
+        # The failed attempt still counts as a request, but used no tokens
+        bucket.settle(-tokens)
+        if not is_retryable(exc):
+            return None
+        asked = retry_after(exc)
+        if asked is not None:
+            # A little jitter so the agents that were told the same time do not return together
+            delay = asked + random.uniform(0, RETRY_BASE)
+        else:
+            delay = random.uniform(0, min(RETRY_MAX, RETRY_BASE * 2 ** (attempt - 1)))
+        if is_rate_limited(exc):
+            # Even when this caller fails over, the others sharing the bucket should wait
+            bucket.pause(min(delay, RETRY_AFTER_MAX))
+        if attempt > self.max_retries or has_fallback():
+            return None
+        if asked is not None and asked > RETRY_AFTER_MAX:
+            return None
+        return delay
+
+    @staticmethod
+    def _note(attempt: int, waited: float) -> None:
+        span = current_span()
+        if span is not None:
+            span.set("llm.retries", attempt)
+            span.set("llm.queued_seconds", round(waited, 3))
+
+    @staticmethod
+    def _usage_tokens(usage: Any) -> Optional[int]:
+        if usage is None:
+            return None
+        get = usage.get if isinstance(usage, dict) else lambda k: getattr(usage, k, None)
+        return int(get("prompt_tokens") or 0) + int(get("completion_tokens") or 0)
+
+    def _settle(self, bucket: ProviderBucket, reserved: int, usage: Any) -> None:
+        used = self._usage_tokens(usage)
+        if used is not None:
+            bucket.settle(used - reserved)
+
+    def close(self) -> None:
+        self.inner.close()
+
+    # ------------------------------------------------------------------
+    # Entry points
+    # ------------------------------------------------------------------
+
+    def complete(self, request: Dict[str, Any]) -> Any:
+        bucket = self.limits.bucket(request["model"])
+        tokens = estimate_tokens(request)
+        waited = 0.0
+        attempt = 0
+        while True:
+            delay = self._admit(bucket, tokens)
+            time.sleep(delay)
+            waited += delay
+            try:
+                response = self.inner.complete(request)
+            except Exception as exc:
+                attempt += 1
+                delay = self._backoff(bucket, tokens, attempt, exc)
+                if delay is None:
+                    self._note(attempt - 1, waited)
+                    raise
+                time.sleep(delay)
+                waited += delay
+                continue
+            self._note(attempt, waited)
+            self._settle(bucket, tokens, getattr(response, "usage", None))
+            return response
+
+    def stream(self, request: Dict[str, Any]) -> Iterator[Any]:
+        bucket = self.limits.bucket(request["model"])
+        tokens = estimate_tokens(request)
+        first, chunks = self._open_stream(request, bucket, tokens)
+        return self._metered(bucket, tokens, first, chunks)
+
+    def _open_stream(
+        self, request: Dict[str, Any], bucket: ProviderBucket, tokens: int
+    ) -> Tuple[List[Any], Iterator[Any]]:
+        waited = 0.0
+        attempt = 0
+        while True:
+            delay = self._admit(bucket, tokens)
+            time.sleep(delay)
+            waited += delay
+            try:
+                chunks = iter(self.inner.stream(request))
+                first = [next(chunks)]
+            except StopIteration:
+                first = []
+            except Exception as exc:
+                attempt += 1
+                delay = self._backoff(bucket, tokens, attempt, exc)
+                if delay is None:
+                    self._note(attempt - 1, waited)
+                    raise
+                time.sleep(delay)
+                waited += delay
+                continue
+            self._note(attempt, waited)
+            return first, chunks
+
+    def _metered(
+        self, bucket: ProviderBucket, tokens: int, first: List[Any], chunks: Iterator[Any]
+    ) -> Iterator[Any]:
+        usage = None
+        try:
+            for chunk in first:
+                usage = getattr(chunk, "usage", None) or usage
+                yield chunk
+            for chunk in chunks:
+                usage = getattr(chunk, "usage", None) or usage
+                yield chunk
+        finally:
+            self._settle(bucket, tokens, usage)
+            # Closed early (a hedge's loser, an abandoned turn): hang up on the provider too
+            close_stream(chunks)
+
+    async def acomplete(self, request: Dict[str, Any]) -> Any:
+        bucket = self.limits.bucket(request["model"])
+        tokens = estimate_tokens(request)
+        waited = 0.0
+        attempt = 0
+        while True:
+            delay = self._admit(bucket, tokens)
+            await asyncio.sleep(delay)
+            waited += delay
+            try:
+                response = await self.inner.acomplete(request)
+            except Exception as exc:
+                attempt += 1
+                delay = self._backoff(bucket, tokens, attempt, exc)
+                if delay is None:
+                    self._note(attempt - 1, waited)
+                    raise
+                await asyncio.sleep(delay)
+                waited += delay
+                continue
+            self._note(attempt, waited)
+            self._settle(bucket, tokens, getattr(response, "usage", None))
+            return response
+
+    async def astream(self, request: Dict[str, Any]) -> AsyncIterator[Any]:
+        bucket = self.limits.bucket(request["model"])
+        tokens = estimate_tokens(request)
+        waited = 0.0
+        attempt = 0
+        while True:
+            delay = self._admit(bucket, tokens)
+            await asyncio.sleep(delay)
+            waited += delay
+            chunks = self.inner.astream(request).__aiter__()
+            try:
+                first = [await chunks.__anext__()]
+            except StopAsyncIteration:
+                first = []
+            except Exception as exc:
+                attempt += 1
+                delay = self._backoff(bucket, tokens, attempt, exc)
+                if delay is None:
+                    self._note(attempt - 1, waited)
+                    raise
+                await asyncio.sleep(delay)
+                waited += delay
+                continue
+            break
+        self._note(attempt, waited)
+        usage = None
+        try:
+            for chunk in first:
+                usage = getattr(chunk, "usage", None) or usage
+                yield chunk
+            async for chunk in chunks:
+                usage = getattr(chunk, "usage", None) or usage
+                yield chunk
+        finally:
+            self._settle(bucket, tokens, usage)
+            await aclose_stream(chunks)
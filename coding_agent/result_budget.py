@@ -0,0 +1,224 @@
+"""
+Per-tool size budgets applied to tool results before they enter history.
+
+A tool result is resent with every later LLM call, so one huge listing or
+log taxes the rest of the session.  ``ResultBudget`` caps each result at a
+per-tool token budget when it is appended, shrinking it in a way that suits
+the tool (head and tail of command output, the first files of a grep, a
+summary of a directory listing) and marking the cut.  The untruncated
+result is saved to a file whose path is in the marker, so the model can
+page through it with ``read_file`` if it needs the rest.
+"""
+
+import os
+import re
+from collections import Counter, OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from scratch import ScratchDir
+
+# Rough characters per token; exact counts are not worth a tokenizer call here
+CHARS_PER_TOKEN = 4
+
+# Budget in tokens for tools without an entry in TOOL_RESULT_BUDGETS
+DEFAULT_RESULT_BUDGET = 8_000
+
+# Per-tool budgets in tokens; 0 leaves that tool's results untouched
+TOOL_RESULT_BUDGETS: Dict[str, int] = {
+    "read_file": 16_000,
+    "execute_bash": 6_000,
+    "job_output": 6_000,
+    "grep_search": 4_000,
+    "search_files": 3_000,
+    "list_directory": 3_000,
+}
+
+# Share of the budget given to the start of head+tail output
+HEAD_SHARE = 0.3
+
+# A line of read_file's hex dump of a binary byte_range: "<offset>  <bytes>"
+HEX_DUMP_LINE = re.compile(r"[0-9a-f]{8}  [0-9a-f]{2}")
+
+Shrinker = Callable[[str, int, Dict[str, Any], str], str]
+
+
+class ResultBudget:
+    """Apply per-tool budgets to results and spill the originals to disk."""
+
+    def __init__(
+        self,
+        default_tokens: int = DEFAULT_RESULT_BUDGET,
+        overrides: Optional[Dict[str, int]] = None,
+        scratch: Optional[ScratchDir] = None,
+    ):
+        self.default_tokens = default_tokens
+        self.budgets = dict(TOOL_RESULT_BUDGETS)
+        self.budgets.update(overrides or {})
+        self.truncated = 0
+        # Where untruncated results go; the agent passes its own, removed on close
+        self.scratch = scratch or ScratchDir("results")
+
+    def budget_for(self, name: str) -> int:
+        """Budget in tokens for *name*'s results (0 means unlimited)."""
+        return self.budgets.get(name, self.default_tokens)
+
+    def apply(self, name: str, args: Dict[str, Any], result: str) -> str:
+        """*result* if it fits *name*'s budget, else a shrunken copy with a marker."""
+        budget = self.budget_for(name)
+        max_chars = budget * CHARS_PER_TOKEN
+        if budget <= 0 or len(result) <= max_chars:
+            return result
+        path = self._spill(name, result)
+        # Errors (a timed-out command with its output, say) are not in the tool's
+        # usual format; head + tail keeps the message and the last output
+        shrink = _head_tail if result.startswith("Error") else _SHRINKERS.get(name, _head_tail)
+        self.truncated += 1
+        return shrink(result, max_chars, args, path)
+
+    def _spill(self, name: str, result: str) -> str:
+        path = self.scratch.new_file(f"{name}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(result)
+        return path
+
+
+# ---------------------------------------------------------------------------
+# Shrinkers: (result, max_chars, tool args, spill path) -> shrunken result
+# ---------------------------------------------------------------------------
+
+def _fit_lines(lines: List[str], max_chars: int) -> List[str]:
+    """The leading *lines* whose total length stays within *max_chars*."""
+    kept: List[str] = []
+    used = 0
+    for line in lines:
+        used += len(line) + 1
+        if used > max_chars:
+            break
+        kept.append(line)
+    return kept
+
+
+def _marker(what: str, path: str) -> str:
+    return f"[... {what}; full result in {path} (page it with read_file offset/limit) ...]"
+
+
+def _head_tail(result: str, max_chars: int, args: Dict[str, Any], path: str) -> str:
+    """First and last lines, with the middle dropped (command output, logs)."""
+    lines = result.split("\n")
+    head = _fit_lines(lines, int(max_chars * HEAD_SHARE))
+    tail = _fit_lines(lines[len(head) :][::-1], max_chars - sum(len(l) + 1 for l in head))[::-1]
+    if not head and not tail:
+        # One enormous line: cut it by characters instead
+        half = max_chars // 2
+        marker = _marker(f"{len(result) - 2 * half:,} chars omitted", path)
+        return "\n".join([result[:half], marker, result[-half:]])
+    omitted = len(lines) - len(head) - len(tail)
+    return "\n".join(head + [_marker(f"{omitted:,} of {len(lines):,} lines omitted", path)] + tail)
+
+
+def _read_file(result: str, max_chars: int, args: Dict[str, Any], path: str) -> str:
+    """Leading lines only, and where to resume with offset (or byte_range)."""
+    lines = result.split("\n")
+    kept = _fit_lines(lines, max_chars)
+    if not kept:
+        return _head_tail(result, max_chars, args, path)
+    byte_range = args.get("byte_range")
+    if byte_range:
+        resume = _resume_byte(kept, lines[len(kept)], int(byte_range[0]))
+        hint = f"byte_range=[{resume}, {int(byte_range[1])}]"
+    else:
+        hint = f"offset={int(args.get('offset') or 1) + len(kept)}"
+    note = f"showing {len(kept):,} of {len(lines):,} lines; continue with read_file {hint}"
+    return "\n".join(kept + [_marker(note, path)])
+
+
+def _resume_byte(kept: List[str], following: str, start: int) -> int:
+    """The file offset just past *kept*, the leading lines of a byte_range read from *start*."""
+    hex_dump = HEX_DUMP_LINE.match(kept[0]) and int(kept[0][:8], 16) == start
+    if hex_dump and HEX_DUMP_LINE.match(following):
+        # Hex dump: the first line left out carries its own offset
+        return int(following[:8], 16)
+    # Text: exact unless the range held invalid UTF-8, decoded as replacement characters
+    return start + sum(len(line.encode("utf-8")) + 1 for line in kept)
+
+
+def _grep(result: str, max_chars: int, args: Dict[str, Any], path: str) -> str:
+    """Matches from the first files in full, then per-file match counts."""
+    by_file: "OrderedDict[str, List[str]]" = OrderedDict()
+    trailer: List[str] = []
+    for line in result.split("\n"):
+        name, sep, _ = line.partition(":")
+        if sep and not line.startswith("..."):
+            by_file.setdefault(name, []).append(line)
+        else:
+            trailer.append(line)
+
+    files = list(by_file.items())
+    room = int(max_chars * 0.8)
+    kept: List[str] = []
+    shown = 0
+    for name, matches in files:
+        size = sum(len(m) + 1 for m in matches)
+        if size > room:
+            if not kept:
+                # A single file with more matches than fit: show its first ones
+                kept = _fit_lines(matches, room)
+                shown = 1
+            break
+        kept.extend(matches)
+        room -= size
+        shown += 1
+    used = sum(len(m) + 1 for m in kept)
+
+    rest = files[shown:]
+    summary = [f"{name} ({len(matches)} matches)" for name, matches in rest]
+    summary = _fit_lines(summary, max(max_chars - used, 0))
+    hidden = len(rest) - len(summary)
+    note = f"matches shown for {shown} of {len(files)} files; counts only for the rest"
+    if hidden:
+        note += f" ({hidden} files not listed)"
+    return "\n".join(kept + [_marker(note, path)] + summary + trailer)
+
+
+def _listing(result: str, max_chars: int, args: Dict[str, Any], path: str) -> str:
+    """Directories first, then files, then file counts by extension."""
+    lines = result.split("\n")
+    dirs = [l for l in lines if l.startswith("📁")]
+    files = [l for l in lines if not l.startswith("📁")]
+    kept = _fit_lines(dirs + files, int(max_chars * 0.8))
+    hidden = files[max(len(kept) - len(dirs), 0) :]
+    hidden_dirs = max(len(dirs) - len(kept), 0)
+    by_ext = Counter(_extension(l) for l in hidden)
+    counts = ", ".join(f"{ext}: {n}" for ext, n in by_ext.most_common(12))
+    what = f"{len(hidden):,} more files"
+    if hidden_dirs:
+        what += f" and {hidden_dirs:,} more directories"
+    if counts:
+        what += f" ({counts})"
+    return "\n".join(kept + [_marker(what, path)])
+
+
+def _extension(entry: str) -> str:
+    # "📄 name.ext (1.2KB)"
+    name = entry[2:].rsplit(" (", 1)[0].strip()
+    ext = os.path.splitext(name)[1]
+    return ext or "(none)"
+
+
+def _paths(result: str, max_chars: int, args: Dict[str, Any], path: str) -> str:
+    """Leading paths, then match counts by top-level directory."""
+    lines = result.split("\n")
+    kept = _fit_lines(lines, int(max_chars * 0.8))
+    by_dir = Counter(l.split("/", 1)[0] if "/" in l else "." for l in lines[len(kept) :])
+    counts = ", ".join(f"{d}/: {n}" for d, n in by_dir.most_common(12))
+    return "\n".join(kept + [_marker(f"{len(lines) - len(kept):,} more files ({counts})", path)])
+
+
+_SHRINKERS: Dict[str, Shrinker] = {
+    "read_file": _read_file,
+    "execute_bash": _head_tail,
+    "job_output": _head_tail,
+    "grep_search": _grep,
+    "list_directory": _listing,
+    "search_files": _paths,
+}
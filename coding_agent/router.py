@@ -0,0 +1,464 @@
+"""
+Model routing with failover and hedged requests.
+
+``ModelRouter`` is a transport that sits in front of another one and
+decides which model each request goes to: the one the agent asked for
+(``--model``, or a batch task's model) or one of the configured fallbacks.
+It keeps rolling latency and error figures per model:
+
+* Failover: when a call fails transiently (a 429, a 5xx, a timeout), the
+  same request is sent to the next model in line, so a provider outage
+  costs one turn some latency instead of aborting it.  Any other failure
+  (a bad request, an auth error, an overlong prompt) is raised at once:
+  another model would only fail the same way.  A model that keeps failing cools
+  down for a while (doubling each time) and is only tried as a last resort.
+  While another model is left, the retry layer below the router does not
+  retry or wait out a rate limit; only the last model is retried.
+* Hedging (opt-in): if the first model has not answered after its p95
+  latency, the request is also sent to the next model and whichever answer
+  arrives first is used.  For streams the race is to the first chunk;
+  after that the winner's stream is followed to the end and the loser's
+  is closed as soon as it has one.
+* Ordering: models are tried in the configured order, or by rolling
+  median latency with ``prefer="latency"`` when they are interchangeable.
+
+Which model served a call, how many were tried and whether the call was
+hedged are recorded on the current LLM span, and ``/stats`` shows the
+per-model figures.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from itertools import chain
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+from ratelimit import BudgetExhaustedError, is_retryable
+from tracing import current_span
+from transport import LiteLLMTransport, Transport, aclose_stream, close_stream, fallback_ready
+
+# Calls remembered per model for latency percentiles and error rate
+HEALTH_WINDOW = 50
+
+# Latency samples needed before a model's p95 is trusted as a hedge delay
+MIN_LATENCY_SAMPLES = 5
+
+# Hedge delay in seconds until the first model has enough samples
+DEFAULT_HEDGE_DELAY = 10.0
+
+# Cooldown after a failure, doubled for each further consecutive failure
+COOLDOWN_BASE = 5.0
+COOLDOWN_MAX = 300.0
+
+
+def should_fail_over(exc: BaseException) -> bool:
+    """Whether another model might succeed where one raised *exc*: transient failures only."""
+    return isinstance(exc, BudgetExhaustedError) or is_retryable(exc)
+
+
+class _Stream:
+    """A stream whose first chunk has been read already; ``close()`` closes the source."""
+
+    def __init__(self, first: List[Any], chunks: Iterator[Any]):
+        self._source = chunks
+        self._chunks = chain(first, chunks)
+
+    def __iter__(self) -> Iterator[Any]:
+        return self
+
+    def __next__(self) -> Any:
+        return next(self._chunks)
+
+    def close(self) -> None:
+        close_stream(self._source)
+
+
+def _close_unused(future: Future) -> None:
+    """Done-callback for a hedge's losing call: close its stream, if it opened one."""
+    if future.cancelled() or future.exception() is not None:
+        return
+    result = future.result()
+    if isinstance(result, _Stream):
+        result.close()
+
+
+async def _aclose_unused(result: Any) -> None:
+    """Close the stream of a hedge's losing async call, if it opened one."""
+    if isinstance(result, tuple):
+        await aclose_stream(result[1])
+
+
+class ModelHealth:
+    """Rolling latency and outcome figures for one model."""
+
+    def __init__(self, window: int = HEALTH_WINDOW):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.calls = 0
+        self.errors = 0
+        self.hedges_won = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.last_error: Optional[str] = None
+
+    def record(self, seconds: float, error: Optional[BaseException]) -> None:
+        self.calls += 1
+        self.outcomes.append(error is None)
+        if error is None:
+            self.latencies.append(seconds)
+            self.consecutive_failures = 0
+            self.cooldown_until = 0.0
+            return
+        self.errors += 1
+        self.consecutive_failures += 1
+        self.last_error = f"{type(error).__name__}: {error}"[:200]
+        cooldown = min(COOLDOWN_BASE * 2 ** (self.consecutive_failures - 1), COOLDOWN_MAX)
+        self.cooldown_until = time.monotonic() + cooldown
+
+    @property
+    def cooling(self) -> bool:
+        return time.monotonic() < self.cooldown_until
+
+    @property
+    def error_rate(self) -> float:
+        return 1 - sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class ModelRouter(Transport):
+    """Route each request to its own model or a fallback, failing over and hedging as configured."""
+
+    def __init__(
+        self,
+        fallbacks: List[str],
+        inner: Optional[Transport] = None,
+        hedge: bool = False,
+        hedge_after: Optional[float] = None,
+        prefer: str = "order",
+    ):
+        self.fallbacks = list(dict.fromkeys(fallbacks))
+        self.inner = inner or LiteLLMTransport()
+        self.hedge = hedge
+        # Fixed hedge delay in seconds; None uses the first model's rolling p95
+        self.hedge_after = hedge_after
+        self.prefer = prefer
+        # Filled in as models are first used, so /stats lists them in that order
+        self.health: Dict[str, ModelHealth] = {}
+        self._lock = threading.Lock()
+        # Hedged sync calls race on these threads; a losing call runs until it fails or
+        # its stream opens, and is closed then
+        self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hedge")
+
+    # ------------------------------------------------------------------
+    # Choosing models
+    # ------------------------------------------------------------------
+
+    def candidates(self, model: str) -> List[str]:
+        """*model* and the fallbacks in the order to try them: healthy first, cooling last."""
+        models = list(dict.fromkeys([model] + self.fallbacks))
+        with self._lock:
+            for m in models:
+                self.health.setdefault(m, ModelHealth())
+            healthy = [m for m in models if not self.health[m].cooling]
+            cooling = [m for m in models if self.health[m].cooling]
+            if self.prefer == "latency":
+                # Unmeasured models sort first so each gets measured
+                healthy.sort(key=lambda m: self.health[m].percentile(0.5) or 0.0)
+            cooling.sort(key=lambda m: self.health[m].cooldown_until)
+        return healthy + cooling
+
+    def hedge_delay(self, model: str) -> float:
+        if self.hedge_after is not None:
+            return self.hedge_after
+        with self._lock:
+            health = self.health[model]
+            if len(health.latencies) < MIN_LATENCY_SAMPLES:
+                return DEFAULT_HEDGE_DELAY
+            return health.percentile(0.95) or DEFAULT_HEDGE_DELAY
+
+    def _record(self, model: str, start: float, error: Optional[BaseException]) -> None:
+        with self._lock:
+            self.health[model].record(time.monotonic() - start, error)
+
+    def _fail(self, model: str, start: float, error: BaseException) -> None:
+        # A malformed request says nothing about the model; it must not cool it down
+        if should_fail_over(error):
+            self._record(model, start, error)
+
+    def _served(self, model: str, attempts: int, hedged: bool) -> None:
+        span = current_span()
+        if span is not None:
+            span.set("gen_ai.response.model", model)
+            span.set("router.attempts", attempts)
+            span.set("router.hedged", hedged)
+        if hedged:
+            with self._lock:
+                self.health[model].hedges_won += 1
+
+    # ------------------------------------------------------------------
+    # Single attempts (one model each)
+    # ------------------------------------------------------------------
+
+    def _complete_on(self, request: Dict[str, Any], model: str, spare: bool) -> Any:
+        start = time.monotonic()
+        try:
+            with fallback_ready(spare):
+                response = self.inner.complete(dict(request, model=model))
+        except Exception as exc:
+            self._fail(model, start, exc)
+            raise
+        self._record(model, start, None)
+        return response
+
+    def _stream_on(self, request: Dict[str, Any], model: str, spare: bool) -> _Stream:
+        """The stream from *model*, once its first chunk has arrived (its latency)."""
+        start = time.monotonic()
+        try:
+            with fallback_ready(spare):
+                chunks = iter(self.inner.stream(dict(request, model=model)))
+                first = [next(chunks)]
+        except StopIteration:
+            first = []
+        except Exception as exc:
+            self._fail(model, start, exc)
+            raise
+        self._record(model, start, None)
+        return _Stream(first, chunks)
+
+    async def _acomplete_on(self, request: Dict[str, Any], model: str, spare: bool) -> Any:
+        start = time.monotonic()
+        try:
+            with fallback_ready(spare):
+                response = await self.inner.acomplete(dict(request, model=model))
+        except Exception as exc:
+            self._fail(model, start, exc)
+            raise
+        self._record(model, start, None)
+        return response
+
+    async def _astream_on(
+        self, request: Dict[str, Any], model: str, spare: bool
+    ) -> Tuple[List[Any], AsyncIterator[Any]]:
+        start = time.monotonic()
+        chunks = self.inner.astream(dict(request, model=model)).__aiter__()
+        try:
+            with fallback_ready(spare):
+                first = [await chunks.__anext__()]
+        except StopAsyncIteration:
+            first = []
+        except Exception as exc:
+            self._fail(model, start, exc)
+            raise
+        self._record(model, start, None)
+        return first, chunks
+
+    # ------------------------------------------------------------------
+    # Transport entry points
+    # ------------------------------------------------------------------
+
+    def complete(self, request: Dict[str, Any]) -> Any:
+        return self._route(request, self._complete_on)
+
+    def stream(self, request: Dict[str, Any]) -> Iterator[Any]:
+        return self._route(request, self._stream_on)
+
+    async def acomplete(self, request: Dict[str, Any]) -> Any:
+        return await self._aroute(request, self._acomplete_on)
+
+    async def astream(self, request: Dict[str, Any]) -> AsyncIterator[Any]:
+        first, rest = await self._aroute(request, self._astream_on)
+        for chunk in first:
+            yield chunk
+        async for chunk in rest:
+            yield chunk
+
+    def _route(
+        self, request: Dict[str, Any], attempt: Callable[[Dict[str, Any], str, bool], Any]
+    ) -> Any:
+        candidates = self.candidates(request["model"])
+        tried: Set[str] = set()
+        errors: List[BaseException] = []
+        for i, model in enumerate(candidates):
+            if model in tried:
+                continue
+            backup = next((m for m in candidates[i + 1 :] if m not in tried), None)
+            if self.hedge and backup is not None and not tried:
+                tried.update((model, backup))
+                spare = any(m not in tried for m in candidates[i + 1 :])
+                try:
+                    result, winner = self._hedged(request, attempt, model, backup, spare)
+                except Exception as exc:
+                    if not should_fail_over(exc):
+                        raise
+                    errors.append(exc)
+                    continue
+                self._served(winner, len(tried), winner == backup)
+                return result
+            tried.add(model)
+            try:
+                # With a backup left, the layers below fail fast instead of retrying
+                result = attempt(request, model, backup is not None)
+            except Exception as exc:
+                if not should_fail_over(exc):
+                    raise
+                errors.append(exc)
+                continue
+            self._served(model, len(tried), False)
+            return result
+        # Every model failed transiently: surface the first model's error, the most telling one
+        raise errors[0]
+
+    def _hedged(
+        self,
+        request: Dict[str, Any],
+        attempt: Callable[[Dict[str, Any], str, bool], Any],
+        model: str,
+        backup: str,
+        spare: bool,
+    ) -> Tuple[Any, str]:
+        """
+        Race *model* against *backup*, started once *model* is slower than its
+        p95; *spare* says whether another model remains after *backup*.
+        """
+        futures: Dict[Future, str] = {self._executor.submit(attempt, request, model, True): model}
+        winner: Optional[Future] = None
+        try:
+            done, _ = wait(futures, timeout=self.hedge_delay(model))
+            error = next(iter(done)).exception() if done else None
+            if error is not None and not should_fail_over(error):
+                raise error
+            if not done or error is not None:
+                # Too slow, or already failed: bring in the backup
+                futures[self._executor.submit(attempt, request, backup, spare)] = backup
+            error = None
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    exc = future.exception()
+                    if exc is None:
+                        winner = future
+                        return future.result(), futures[future]
+                    if not should_fail_over(exc):
+                        raise exc
+                    error = error or exc
+            assert error is not None
+            raise error
+        finally:
+            for future in futures:
+                if future is not winner:
+                    future.cancel()
+                    future.add_done_callback(_close_unused)
+
+    async def _aroute(
+        self, request: Dict[str, Any], attempt: Callable[[Dict[str, Any], str, bool], Any]
+    ) -> Any:
+        candidates = self.candidates(request["model"])
+        tried: Set[str] = set()
+        errors: List[BaseException] = []
+        for i, model in enumerate(candidates):
+            if model in tried:
+                continue
+            backup = next((m for m in candidates[i + 1 :] if m not in tried), None)
+            if self.hedge and backup is not None and not tried:
+                tried.update((model, backup))
+                spare = any(m not in tried for m in candidates[i + 1 :])
+                try:
+                    result, winner = await self._ahedged(request, attempt, model, backup, spare)
+                except Exception as exc:
+                    if not should_fail_over(exc):
+                        raise
+                    errors.append(exc)
+                    continue
+                self._served(winner, len(tried), winner == backup)
+                return result
+            tried.add(model)
+            try:
+                # With a backup left, the layers below fail fast instead of retrying
+                result = await attempt(request, model, backup is not None)
+            except Exception as exc:
+                if not should_fail_over(exc):
+                    raise
+                errors.append(exc)
+                continue
+            self._served(model, len(tried), False)
+            return result
+        raise errors[0]
+
+    async def _ahedged(
+        self,
+        request: Dict[str, Any],
+        attempt: Callable[[Dict[str, Any], str, bool], Any],
+        model: str,
+        backup: str,
+        spare: bool,
+    ) -> Tuple[Any, str]:
+        tasks: Dict["asyncio.Task[Any]", str] = {
+            asyncio.ensure_future(attempt(request, model, True)): model
+        }
+        winner: Optional["asyncio.Task[Any]"] = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay(model))
+            error = next(iter(done)).exception() if done else None
+            if error is not None and not should_fail_over(error):
+                raise error
+            if not done or error is not None:
+                tasks[asyncio.ensure_future(attempt(request, backup, spare))] = backup
+            error = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    exc = task.exception()
+                    if exc is None:
+                        winner = task
+                        return task.result(), tasks[task]
+                    if not should_fail_over(exc):
+                        raise exc
+                    error = error or exc
+            assert error is not None
+            raise error
+        finally:
+            # Unlike threads, a losing call still waiting can actually be cancelled;
+            # one that finished alongside the winner has its stream closed
+            for task in tasks:
+                if task is winner:
+                    continue
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled() and task.exception() is None:
+                    await _aclose_unused(task.result())
+
+    def close(self) -> None:
+        """Stop the hedge threads, cancelling calls not yet started, and close *inner*."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.inner.close()
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Per-model figures for /stats, in the order models were first used."""
+        with self._lock:
+            return [
+                {
+                    "model": model,
+                    "calls": h.calls,
+                    "errors": h.errors,
+                    "error_rate": h.error_rate,
+                    "p50": h.percentile(0.5),
+                    "p95": h.percentile(0.95),
+                    "hedges_won": h.hedges_won,
+                    "cooling": max(h.cooldown_until - time.monotonic(), 0.0),
+                    "last_error": h.last_error,
+                }
+                for model, h in self.health.items()
+            ]
@@ -0,0 +1,76 @@
+"""
+Scratch directories for output spilled to disk.
+
+Command output that outgrows its capture budget, tool results cut down to
+their budget and background job logs are written to files whose paths the
+model is given, so it can page through them.  Each owner (an agent, a job
+manager) keeps its files in one ``ScratchDir``, created on first use and
+removed by ``close()`` -- or at interpreter exit for any still open -- so a
+long session does not leave hundreds of MB behind in the temp directory.
+"""
+
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+from typing import Optional, Set
+
+
+class ScratchDir:
+    """A temp directory made on first use; files in it are numbered in creation order."""
+
+    def __init__(self, label: str = "session"):
+        self.label = label
+        self._path: Optional[str] = None
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> str:
+        with self._lock:
+            if self._path is None:
+                self._path = tempfile.mkdtemp(prefix=f"agent-{self.label}-")
+                with _open_lock:
+                    _open.add(self)
+            return self._path
+
+    def new_file(self, name: str) -> str:
+        """A fresh path in the directory for a file called *name*."""
+        directory = self.path
+        with self._lock:
+            self._counter += 1
+            return os.path.join(directory, f"{self._counter:04d}-{name}")
+
+    def close(self) -> None:
+        """Delete the directory and everything in it."""
+        with self._lock:
+            path, self._path = self._path, None
+        with _open_lock:
+            _open.discard(self)
+        if path is not None:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+# Directories created and not yet closed, removed at exit
+_open: Set[ScratchDir] = set()
+_open_lock = threading.Lock()
+
+_default: Optional[ScratchDir] = None
+
+
+def default_scratch() -> ScratchDir:
+    """The process-wide directory for spills made outside any agent."""
+    global _default
+    with _open_lock:
+        if _default is None:
+            _default = ScratchDir("spill")
+        return _default
+
+
+@atexit.register
+def _remove_all() -> None:
+    with _open_lock:
+        remaining = list(_open)
+    for scratch in remaining:
+        scratch.close()
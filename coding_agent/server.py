@@ -0,0 +1,508 @@
+"""
+Local HTTP/WebSocket server hosting many agent sessions in one process.
+
+``python main.py serve`` keeps one long-lived process that an editor
+plugin (or any local client) talks to, instead of starting a terminal
+agent per user.  Every session is an ``AsyncCodingAgent`` on the same
+event loop, so they share what is expensive to warm up: imported modules
+(litellm above all), the per-workspace file trees, grep indexes and file
+caches, and litellm's HTTP connection pools.  They share one transport too,
+so the model router's failover and latency figures (and its hedge threads)
+serve every client instead of starting over with each session.
+
+Every request needs ``Authorization: Bearer TOKEN`` (or ``?token=`` on a
+WebSocket URL); the token is ``--auth-token`` / ``$CODING_AGENT_TOKEN``, or
+a random one printed at startup.  Sessions can run shell commands, so
+requests whose ``Host`` or ``Origin`` is not the server itself or a local
+address are refused as well (a web page open in the user's browser, even
+through DNS rebinding, cannot drive it), and a session's ``cwd`` must lie
+under the directory the server was started in.
+
+Endpoints (JSON bodies):
+
+    GET    /health                      server status and pool occupancy
+    GET    /sessions                    live sessions
+    POST   /sessions                    {"cwd", "model", "resume"} -> session
+    GET    /sessions/{id}               one session, with its totals
+    DELETE /sessions/{id}               close a session
+    POST   /sessions/{id}/messages      {"content"} -> NDJSON event stream
+    GET    /sessions/{id}/ws            WebSocket: send {"type": "message",
+                                        "content"} or {"type": "clear"},
+                                        receive the same events
+
+Events are JSON objects with a ``type``: ``text_delta`` (streamed answer
+text), ``thinking`` (prose before tool calls), ``tool_call``, ``output``
+(live command output), ``tool_result``, ``assistant`` (the final answer),
+then ``done`` with the turn's status and metrics.
+
+Sessions live in a bounded pool: a new session evicts the least recently
+used idle one when the pool is full, and sessions idle for longer than the
+idle timeout are closed.  Journaled sessions can be reopened after
+eviction with ``{"resume": id}``.
+"""
+
+import asyncio
+import hmac
+import io
+import json
+import os
+import secrets
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+from urllib.parse import urlsplit
+
+from aiohttp import WSMsgType, web
+from rich.console import Console
+
+from async_agent import AsyncCodingAgent
+from journal import JournalError, SessionJournal
+from output_capture import OutputCallback
+from transport import create_transport
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# Sessions held at once; creating one more evicts the least recently used idle one
+DEFAULT_MAX_SESSIONS = 32
+
+# Seconds a session may sit idle before it is closed
+DEFAULT_IDLE_TIMEOUT = 1800
+
+# Seconds between sweeps for idle sessions
+REAP_INTERVAL = 30
+
+# Host names always accepted in Host and Origin headers
+LOCAL_HOSTS = frozenset({"localhost", "127.0.0.1", "::1"})
+
+# Bind addresses meaning "every interface"; the Host check is skipped for them
+WILDCARD_HOSTS = frozenset({"", "0.0.0.0", "::"})
+
+Event = Dict[str, Any]
+
+
+class PoolFullError(Exception):
+    pass
+
+
+class SessionBusyError(Exception):
+    pass
+
+
+class OutsideRootError(Exception):
+    pass
+
+
+# ---------------------------------------------------------------------------
+# Agent that reports events instead of drawing a terminal UI
+# ---------------------------------------------------------------------------
+
+class ServerAgent(AsyncCodingAgent):
+    """``AsyncCodingAgent`` whose display hooks emit events to a listener."""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.listener: Optional[Callable[[Event], None]] = None
+        self._streamed = 0
+        self._tool: Optional[str] = None
+
+    def _emit(self, type: str, **fields: Any) -> None:
+        if self.listener is not None:
+            self.listener({"type": type, **fields})
+
+    def _stream_live(self) -> Any:
+        self._streamed = 0
+        return super()._stream_live()
+
+    def _render_stream_preview(self, text: str) -> Any:
+        self._emit("text_delta", text=text[self._streamed :])
+        self._streamed = len(text)
+        return ""
+
+    def _display_tool_call(self, name: str, args: Dict[str, Any]) -> None:
+        self._tool = name
+        self._emit("tool_call", name=name, arguments=args)
+
+    def _display_tool_result(self, result: str) -> None:
+        self._emit("tool_result", name=self._tool, content=result)
+
+    def _display_thinking(self, text: str) -> None:
+        self._flush_stream(text)
+        self._emit("thinking", text=text)
+
+    def _display_response(self, text: str) -> None:
+        self._flush_stream(text)
+        self._emit("assistant", text=text)
+
+    def _flush_stream(self, text: str) -> None:
+        # Previews are throttled, so the last few tokens may not have gone out yet
+        if self.stream and len(text) > self._streamed:
+            self._emit("text_delta", text=text[self._streamed :])
+        self._streamed = len(text)
+
+    @contextmanager
+    def _live_tail(self) -> Iterator[OutputCallback]:
+        yield lambda text: self._emit("output", text=text)
+
+
+# ---------------------------------------------------------------------------
+# Sessions and the pool
+# ---------------------------------------------------------------------------
+
+class Session:
+    """One conversation in the pool, running at most one turn at a time."""
+
+    def __init__(self, session_id: str, agent: ServerAgent):
+        self.id = session_id
+        self.agent = agent
+        self.created = time.time()
+        self.last_used = time.monotonic()
+        self.task: Optional["asyncio.Task[None]"] = None
+
+    @property
+    def busy(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    @property
+    def idle_seconds(self) -> float:
+        return 0.0 if self.busy else time.monotonic() - self.last_used
+
+    def send(self, content: str) -> AsyncIterator[Event]:
+        """
+        Start a turn and return its events, ending with ``done``.
+
+        The turn runs as its own task: a client that disconnects midway
+        stops receiving events, but the turn still finishes, so the history
+        never holds a tool call without its result.
+        """
+        if self.busy:
+            raise SessionBusyError(f"session {self.id} is already running a turn")
+        loop = asyncio.get_running_loop()
+        queue: "asyncio.Queue[Optional[Event]]" = asyncio.Queue()
+
+        def emit(event: Optional[Event]) -> None:
+            # Command output arrives from worker threads with --persistent-shell
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+        self.agent.listener = emit
+        self.task = loop.create_task(self._turn(content, emit))
+        return self._drain(queue)
+
+    async def _turn(self, content: str, emit: Callable[[Optional[Event]], None]) -> None:
+        try:
+            answer = await self.agent.send(content)
+            emit({"type": "done", "answer": answer, **self.agent.turn_outcome()})
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+            emit({"type": "done", "answer": None, "status": "error", "error": error})
+        finally:
+            self.last_used = time.monotonic()
+            emit(None)
+
+    @staticmethod
+    async def _drain(queue: "asyncio.Queue[Optional[Event]]") -> AsyncIterator[Event]:
+        while True:
+            event = await queue.get()
+            if event is None:
+                return
+            yield event
+
+    def clear(self) -> None:
+        if self.busy:
+            raise SessionBusyError(f"session {self.id} is running a turn")
+        self.agent._handle_command("/clear")
+        self.last_used = time.monotonic()
+
+    def describe(self) -> Dict[str, Any]:
+        totals = self.agent.tracer.totals
+        return {
+            "id": self.id,
+            "cwd": self.agent.cwd,
+            "model": self.agent.model,
+            "busy": self.busy,
+            "idle_seconds": round(self.idle_seconds, 1),
+            "messages": len(self.agent.messages),
+            "turns": int(totals["turns"]),
+            "input_tokens": int(totals["input_tokens"]),
+            "output_tokens": int(totals["output_tokens"]),
+        }
+
+    def close(self) -> None:
+        self.agent.listener = None
+        self.agent.close()
+
+
+class SessionPool:
+    """Bounded set of sessions with LRU eviction of idle ones."""
+
+    def __init__(
+        self,
+        agent_options: Dict[str, Any],
+        transport_options: Optional[Dict[str, Any]] = None,
+        journal: bool = True,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+        root: Optional[str] = None,
+    ):
+        self.agent_options = agent_options
+        # One for the whole server, so routing health and hedge delays build up across sessions
+        self.transport = create_transport(**(transport_options or {}))
+        self.journal = journal
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        # Sessions may only work in this directory and below it
+        self.root = os.path.realpath(root) if root else None
+        self.sessions: Dict[str, Session] = {}
+        self.evicted = 0
+
+    def create(self, cwd: str, model: str, resume: Optional[str] = None) -> Session:
+        """A new session (or a reopened journaled one) in the pool."""
+        if resume and resume in self.sessions:
+            return self.sessions[resume]
+        journal = None
+        if resume:
+            # An id in the sessions directory, never a path chosen by the client
+            if resume != os.path.basename(resume) or resume in (".", ".."):
+                raise JournalError(f"'{resume}' is not a session id")
+            journal = SessionJournal.open(resume)
+            cwd = journal.header.get("cwd") or cwd
+            model = journal.header.get("model") or model
+        if not os.path.isdir(cwd):
+            raise NotADirectoryError(f"'{cwd}' is not a directory")
+        if self.root is not None and not _within(os.path.realpath(cwd), self.root):
+            raise OutsideRootError(f"'{cwd}' is outside the server root {self.root}")
+
+        if len(self.sessions) >= self.max_sessions:
+            idle = [s for s in self.sessions.values() if not s.busy]
+            if not idle:
+                raise PoolFullError(f"all {self.max_sessions} sessions are busy")
+            self.close(min(idle, key=lambda s: s.last_used).id)
+            self.evicted += 1
+        if journal is None and self.journal:
+            journal = SessionJournal.create(model, cwd)
+
+        agent = ServerAgent(
+            model=model,
+            cwd=cwd,
+            stream=True,
+            console=Console(file=io.StringIO(), width=120),
+            journal=journal,
+            transport=self.transport,
+            **self.agent_options,
+        )
+        session = Session(journal.id if journal is not None else uuid.uuid4().hex[:12], agent)
+        self.sessions[session.id] = session
+        return session
+
+    def get(self, session_id: str) -> Session:
+        return self.sessions[session_id]
+
+    def close(self, session_id: str) -> None:
+        session = self.sessions.pop(session_id)
+        session.close()
+
+    def close_idle(self) -> List[str]:
+        """Close sessions idle for longer than the idle timeout."""
+        expired = [s.id for s in self.sessions.values() if s.idle_seconds > self.idle_timeout]
+        for session_id in expired:
+            self.close(session_id)
+        self.evicted += len(expired)
+        return expired
+
+    def close_all(self) -> None:
+        """Close every session and the shared transport; the pool is done after this."""
+        for session_id in list(self.sessions):
+            self.close(session_id)
+        if self.transport is not None:
+            self.transport.close()
+
+    async def reap(self) -> None:
+        while True:
+            await asyncio.sleep(REAP_INTERVAL)
+            self.close_idle()
+
+
+def _within(path: str, root: str) -> bool:
+    return os.path.commonpath([path, root]) == root
+
+
+# ---------------------------------------------------------------------------
+# HTTP / WebSocket API
+# ---------------------------------------------------------------------------
+
+def create_app(
+    pool: SessionPool, default_cwd: str, default_model: str, token: str, host: str = DEFAULT_HOST
+) -> web.Application:
+    """The aiohttp application serving *pool*; every request must carry *token*."""
+    if not token:
+        raise ValueError("the server needs a non-empty token")
+    allowed_hosts = LOCAL_HOSTS | {host.strip("[]")}
+
+    @web.middleware
+    async def authenticate(request: web.Request, handler: Callable[..., Any]) -> web.StreamResponse:
+        # A rebound DNS name still sends its own name as Host
+        if host not in WILDCARD_HOSTS and _hostname("//" + (request.host or "")) not in allowed_hosts:
+            return _error(403, "unexpected Host header")
+        # Browsers always send Origin on WebSocket handshakes and cross-site requests
+        origin = request.headers.get("Origin")
+        if origin is not None and _hostname(origin) not in allowed_hosts:
+            return _error(403, f"requests from origin {origin!r} are not allowed")
+        # Browsers cannot set headers on a WebSocket handshake, so ?token= works too
+        given = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        given = given or request.query.get("token", "")
+        if not hmac.compare_digest(given.encode("utf-8"), token.encode("utf-8")):
+            return _error(401, "missing or invalid token")
+        return await handler(request)
+
+    def lookup(request: web.Request) -> Session:
+        try:
+            return pool.get(request.match_info["id"])
+        except KeyError:
+            raise web.HTTPNotFound(
+                text=json.dumps({"error": "no such session"}), content_type="application/json"
+            )
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response(
+            {
+                "status": "ok",
+                "sessions": len(pool.sessions),
+                "busy": sum(s.busy for s in pool.sessions.values()),
+                "max_sessions": pool.max_sessions,
+                "evicted": pool.evicted,
+            }
+        )
+
+    async def list_sessions(request: web.Request) -> web.Response:
+        return web.json_response([s.describe() for s in pool.sessions.values()])
+
+    async def create_session(request: web.Request) -> web.Response:
+        body = await _json_body(request)
+        try:
+            session = pool.create(
+                os.path.abspath(body.get("cwd") or default_cwd),
+                body.get("model") or default_model,
+                body.get("resume"),
+            )
+        except PoolFullError as e:
+            return _error(503, str(e))
+        except OutsideRootError as e:
+            return _error(403, str(e))
+        except (JournalError, NotADirectoryError) as e:
+            return _error(400, str(e))
+        return web.json_response(session.describe(), status=201)
+
+    async def get_session(request: web.Request) -> web.Response:
+        return web.json_response(lookup(request).describe())
+
+    async def delete_session(request: web.Request) -> web.Response:
+        session = lookup(request)
+        if session.busy:
+            return _error(409, "session is running a turn")
+        pool.close(session.id)
+        return web.json_response({"closed": session.id})
+
+    async def post_message(request: web.Request) -> web.StreamResponse:
+        session = lookup(request)
+        content = (await _json_body(request)).get("content")
+        if not isinstance(content, str) or not content.strip():
+            return _error(400, "'content' must be a non-empty string")
+        try:
+            events = session.send(content)
+        except SessionBusyError as e:
+            return _error(409, str(e))
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        async for event in events:
+            try:
+                await response.write((json.dumps(event, default=str) + "\n").encode("utf-8"))
+            except ConnectionResetError:
+                # The turn carries on without this client
+                break
+        return response
+
+    async def websocket(request: web.Request) -> web.WebSocketResponse:
+        session = lookup(request)
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            try:
+                command = json.loads(msg.data)
+            except json.JSONDecodeError:
+                await ws.send_json({"type": "error", "error": "messages must be JSON"})
+                continue
+            try:
+                if command.get("type") == "clear":
+                    session.clear()
+                    await ws.send_json({"type": "cleared"})
+                elif command.get("type") == "message" and isinstance(command.get("content"), str):
+                    async for event in session.send(command["content"]):
+                        await ws.send_str(json.dumps(event, default=str))
+                else:
+                    await ws.send_json({"type": "error", "error": "expected a 'message' or 'clear'"})
+            except SessionBusyError as e:
+                await ws.send_json({"type": "error", "error": str(e)})
+            except ConnectionResetError:
+                # The turn carries on without this client
+                break
+        return ws
+
+    async def background(app: web.Application) -> AsyncIterator[None]:
+        reaper = asyncio.create_task(pool.reap())
+        yield
+        reaper.cancel()
+        pool.close_all()
+
+    app = web.Application(middlewares=[authenticate])
+    app.cleanup_ctx.append(background)
+    app.router.add_get("/health", health)
+    app.router.add_get("/sessions", list_sessions)
+    app.router.add_post("/sessions", create_session)
+    app.router.add_get("/sessions/{id}", get_session)
+    app.router.add_delete("/sessions/{id}", delete_session)
+    app.router.add_post("/sessions/{id}/messages", post_message)
+    app.router.add_get("/sessions/{id}/ws", websocket)
+    return app
+
+
+async def _json_body(request: web.Request) -> Dict[str, Any]:
+    if not request.can_read_body:
+        return {}
+    try:
+        body = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(
+            text=json.dumps({"error": "body must be JSON"}), content_type="application/json"
+        )
+    return body if isinstance(body, dict) else {}
+
+
+def _error(status: int, message: str) -> web.Response:
+    return web.json_response({"error": message}, status=status)
+
+
+def _hostname(url: str) -> Optional[str]:
+    try:
+        return urlsplit(url).hostname
+    except ValueError:
+        return None
+
+
+def serve(
+    pool: SessionPool,
+    default_cwd: str,
+    default_model: str,
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    token: Optional[str] = None,
+) -> None:
+    """Run the server until interrupted; without *token* a random one is generated and printed."""
+    if not token:
+        token = secrets.token_urlsafe(24)
+        print(f"Auth token (send as 'Authorization: Bearer TOKEN'): {token}")
+    app = create_app(pool, default_cwd, default_model, token, host=host)
+    print(f"Coding agent server on http://{host}:{port} (up to {pool.max_sessions} sessions; Ctrl+C to stop)")
+    web.run_app(app, host=host, port=port, print=None)
@@ -0,0 +1,148 @@
+"""
+Persistent bash session for ``execute_bash``.
+
+A fresh ``subprocess.run(..., shell=True)`` per call pays for shell start-up
+every time and forgets ``cd``, exported variables and activated virtualenvs.
+``ShellSession`` keeps one bash process alive per agent instead.  Each
+command is written to a script file and ``source``d, so it runs in the
+long-lived shell (keeping its state) while a syntax error stays confined to
+that one command; sentinel lines on stdout and stderr frame its output and
+carry its exit code.
+"""
+
+import atexit
+import os
+import shlex
+import signal
+import subprocess
+import threading
+import uuid
+import weakref
+from typing import Optional, Tuple
+
+from output_capture import DEFAULT_OUTPUT_BUDGET, BoundedCapture, OutputCallback, pump
+from scratch import ScratchDir
+
+DEFAULT_TIMEOUT = 120
+
+
+class ShellSession:
+    """One long-lived bash process; commands run one at a time."""
+
+    def __init__(self, cwd: str = "."):
+        self.cwd = os.path.abspath(cwd)
+        self._proc: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+        # Command scripts (each deleted once sourced); the directory goes on close
+        self._scripts = ScratchDir("shell")
+        _sessions.add(self)
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def _start(self) -> subprocess.Popen:
+        proc = subprocess.Popen(
+            ["bash", "--noprofile", "--norc"],
+            cwd=self.cwd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            # Own process group, so a timed-out command can be killed with
+            # everything it spawned
+            start_new_session=True,
+        )
+        self._proc = proc
+        return proc
+
+    def close(self) -> None:
+        """Kill the shell and everything it started; the next command starts a new one."""
+        proc, self._proc = self._proc, None
+        if proc is not None and proc.poll() is None:
+            try:
+                os.killpg(proc.pid, signal.SIGKILL)
+            except OSError:
+                pass
+            proc.wait()
+        self._scripts.close()
+
+    @property
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.poll() is None
+
+    # ------------------------------------------------------------------
+    # Commands
+    # ------------------------------------------------------------------
+
+    def run(
+        self,
+        command: str,
+        timeout: float = DEFAULT_TIMEOUT,
+        on_output: Optional[OutputCallback] = None,
+        budget: int = DEFAULT_OUTPUT_BUDGET,
+        scratch: Optional[ScratchDir] = None,
+    ) -> Tuple[str, str, Optional[int]]:
+        """
+        Run *command* in the session and return ``(stdout, stderr, exit_code)``.
+
+        Output is captured within *budget* bytes per stream (see
+        ``BoundedCapture``, spilling into *scratch*) and passed to
+        *on_output* as it arrives.  Raises
+        ``subprocess.TimeoutExpired`` (carrying the output so far) if the
+        command overruns; the session is then restarted in the last known
+        working directory, which is the only state that survives.
+        """
+        with self._lock:
+            proc = self._proc if self.alive else self._start()
+            token = uuid.uuid4().hex
+            marker = f"__AGENT_END_{token}__"
+            script = os.path.join(self._scripts.path, f"{token}.sh")
+            with open(script, "w", encoding="utf-8") as f:
+                f.write(command + "\n")
+            quoted = shlex.quote(script)
+            frame = (
+                f"source {quoted} </dev/null\n"
+                f"__agent_rc=$?; rm -f {quoted}\n"
+                f"printf '\\n%s %d %s\\n' {marker} \"$__agent_rc\" \"$PWD\"\n"
+                f"printf '\\n%s\\n' {marker} >&2\n"
+            )
+            try:
+                assert proc.stdin is not None
+                proc.stdin.write(frame.encode())
+                proc.stdin.flush()
+            except (BrokenPipeError, OSError):
+                self.close()
+                proc = self._start()
+                assert proc.stdin is not None
+                proc.stdin.write(frame.encode())
+                proc.stdin.flush()
+
+            assert proc.stdout is not None and proc.stderr is not None
+            out = BoundedCapture(budget, "stdout", scratch)
+            err = BoundedCapture(budget, "stderr", scratch)
+            streams = {proc.stdout.fileno(): out, proc.stderr.fileno(): err}
+            trailers = pump(streams, timeout, on_output, marker.encode())
+            if trailers is None:
+                self.close()
+                raise subprocess.TimeoutExpired(command, timeout, output=out.text(), stderr=err.text())
+
+            # "<marker> <exit code> <pwd>", or nothing if the shell went away
+            fields = trailers[proc.stdout.fileno()].rstrip(b"\n").split(b" ", 2)
+            exit_code: Optional[int] = None
+            if len(fields) == 3:
+                exit_code = int(fields[1])
+                self.cwd = fields[2].decode("utf-8", errors="replace") or self.cwd
+            else:
+                # The command ran `exit` (or killed the shell); start fresh next time
+                self.close()
+            return out.text(), err.text(), exit_code
+
+
+# Sessions not yet garbage collected; any still running a shell are closed at exit
+_sessions: "weakref.WeakSet[ShellSession]" = weakref.WeakSet()
+
+
+@atexit.register
+def _close_all() -> None:
+    for session in list(_sessions):
+        session.close()
@@ -0,0 +1,94 @@
+"""
+Speculative execution of read-only tool calls during streaming.
+
+A streamed assistant turn usually names its first tool call, with complete
+arguments, well before the model has finished generating.  ``Speculator``
+watches the stream and starts such a call as soon as its JSON arguments
+parse, so the tool's I/O overlaps with the rest of the generation.  When
+the turn ends the agent claims the runs whose name and arguments match
+the final message and uses their results as if it had started them then;
+anything else is discarded.
+
+Only an unbroken prefix of ``SPECULATIVE_TOOLS`` calls is started.  Once a
+call that writes or runs commands appears, nothing after it is run early,
+so a speculated read never observes the workspace before a write that the
+model ordered ahead of it.
+"""
+
+import json
+from typing import Any, Callable, Dict, List, Tuple
+
+from streaming import StreamAccumulator
+from tools import SPECULATIVE_TOOLS
+
+# (id, name, parsed arguments), as in agent.py
+ToolCall = Tuple[str, str, Dict[str, Any]]
+
+
+class Speculator:
+    """
+    Start tool calls early through *start* and hand their handles back.
+
+    *start(name, args)* returns a ``concurrent.futures.Future`` (threaded
+    agent) or an ``asyncio.Task`` (async agent); a discarded one is
+    cancelled, which stops it if it has not begun and otherwise lets it
+    finish unobserved -- harmless for a read.
+    """
+
+    def __init__(self, start: Callable[[str, Dict[str, Any]], Any]):
+        self.start = start
+        # call id -> (name, args, handle) for runs not yet claimed
+        self.running: Dict[str, Tuple[str, Dict[str, Any], Any]] = {}
+        # Set once the current stream has shown a call that cannot run early
+        self.blocked = False
+        # Session totals for /stats
+        self.started = 0
+        self.used = 0
+        self.discarded = 0
+
+    def reset(self) -> None:
+        """Discard whatever is still running; called before each new stream."""
+        for _, _, handle in self.running.values():
+            handle.cancel()
+            self.discarded += 1
+        self.running.clear()
+        self.blocked = False
+
+    def observe(self, acc: StreamAccumulator) -> None:
+        """Start every call in *acc* that has become runnable since the last chunk."""
+        if self.blocked or not acc.has_tool_calls:
+            return
+        for call in acc.partial_tool_calls():
+            if call["id"] in self.running:
+                continue
+            if call["name"] and call["name"] not in SPECULATIVE_TOOLS:
+                self.blocked = True
+                return
+            # A JSON object is complete once it parses; cheap test first
+            if not call["id"] or not call["name"] or not call["arguments"].rstrip().endswith("}"):
+                return
+            try:
+                args = json.loads(call["arguments"])
+            except json.JSONDecodeError:
+                return
+            if not isinstance(args, dict):
+                self.blocked = True
+                return
+            self.running[call["id"]] = (call["name"], args, self.start(call["name"], args))
+            self.started += 1
+
+    def claim(self, calls: List[ToolCall]) -> Dict[str, Any]:
+        """Handles of the runs matching the final *calls*, by call id; the rest are discarded."""
+        claimed: Dict[str, Any] = {}
+        for call_id, name, args in calls:
+            run = self.running.pop(call_id, None)
+            if run is None:
+                continue
+            if run[0] == name and run[1] == args:
+                claimed[call_id] = run[2]
+                self.used += 1
+            else:
+                run[2].cancel()
+                self.discarded += 1
+        self.reset()
+        return claimed
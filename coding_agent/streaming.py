@@ -0,0 +1,95 @@
+"""
+Reassembly of streamed litellm responses.
+
+Streaming chunks carry prose and tool calls as small deltas; the accumulator
+stitches them back into a message object with the same shape as a
+non-streamed ``response.choices[0].message`` so the rest of the agent can
+treat both paths identically.
+"""
+
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+
+class StreamAccumulator:
+    """Collect streamed deltas into a complete assistant message."""
+
+    def __init__(self) -> None:
+        self.role = "assistant"
+        self.content_parts: List[str] = []
+        self.finish_reason: Optional[str] = None
+        self.usage: Any = None
+        # index -> {"id", "name", "arguments"}
+        self._tool_calls: Dict[int, Dict[str, str]] = {}
+
+    @property
+    def content(self) -> str:
+        return "".join(self.content_parts)
+
+    @property
+    def has_tool_calls(self) -> bool:
+        return bool(self._tool_calls)
+
+    def partial_tool_calls(self) -> List[Dict[str, str]]:
+        """Tool calls received so far, in order; the last one's arguments may be unfinished."""
+        return [call for _, call in sorted(self._tool_calls.items())]
+
+    def add_chunk(self, chunk: Any) -> Optional[str]:
+        """Fold one chunk into the message; returns any new prose text."""
+        if getattr(chunk, "usage", None):
+            # Sent on the final chunk when stream_options.include_usage is set
+            self.usage = chunk.usage
+        if not getattr(chunk, "choices", None):
+            return None
+        choice = chunk.choices[0]
+        if getattr(choice, "finish_reason", None):
+            self.finish_reason = choice.finish_reason
+
+        delta = getattr(choice, "delta", None)
+        if delta is None:
+            return None
+        if getattr(delta, "role", None):
+            self.role = delta.role
+
+        for tc in getattr(delta, "tool_calls", None) or []:
+            self._add_tool_call_delta(tc)
+
+        text = getattr(delta, "content", None)
+        if text:
+            self.content_parts.append(text)
+            return text
+        return None
+
+    def _add_tool_call_delta(self, tc: Any) -> None:
+        index = getattr(tc, "index", None)
+        if index is None:
+            # Some providers send each call whole and unindexed; match by id.
+            index = next(
+                (i for i, call in self._tool_calls.items() if tc.id and call["id"] == tc.id),
+                len(self._tool_calls),
+            )
+        call = self._tool_calls.setdefault(index, {"id": "", "name": "", "arguments": ""})
+        if getattr(tc, "id", None):
+            call["id"] = tc.id
+        function = getattr(tc, "function", None)
+        if function is not None:
+            if getattr(function, "name", None):
+                call["name"] = function.name
+            if getattr(function, "arguments", None):
+                call["arguments"] += function.arguments
+
+    def build_message(self) -> Any:
+        """Return an object shaped like a litellm ``Message``."""
+        tool_calls = [
+            SimpleNamespace(
+                id=call["id"],
+                type="function",
+                function=SimpleNamespace(name=call["name"], arguments=call["arguments"] or "{}"),
+            )
+            for _, call in sorted(self._tool_calls.items())
+        ]
+        return SimpleNamespace(
+            role=self.role,
+            content=self.content or None,
+            tool_calls=tool_calls or None,
+        )
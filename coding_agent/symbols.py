@@ -0,0 +1,255 @@
+"""
+Symbol index of a workspace's Python code, built with ``ast``.
+
+For every non-ignored ``.py`` file in the workspace ``FileTree`` the index
+records its classes, functions and methods: qualified name, kind,
+signature, the first line of the docstring and the line span (decorators
+included).  It backs three tools that replace the usual
+``list_directory`` → ``grep_search`` → ``read_file`` round trips:
+
+* ``repo_map``     — an outline of the definitions under a path
+* ``find_symbol``  — where a name is defined, with its signature
+* ``read_symbol``  — the source of exactly one definition
+
+Entries are keyed by size and mtime, so a query re-parses only files that
+changed since the last one.  The index is saved under ``SYMBOLS_DIR`` on
+its first build and then at most once a minute while only a few files
+change, so a new session on the same workspace starts warm instead of
+parsing every file again.
+"""
+
+import ast
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from atomic_io import atomic_write
+from file_tree import FileTree, get_file_tree
+
+# Where indexes are kept, one file per workspace; override with $CODING_AGENT_SYMBOLS
+SYMBOLS_DIR = os.environ.get("CODING_AGENT_SYMBOLS") or os.path.join(
+    os.path.expanduser("~"), ".cache", "coding-agent", "symbols"
+)
+
+# Bumped whenever the saved format or what is extracted changes
+INDEX_VERSION = 1
+
+# Files above this size are listed without symbols rather than parsed
+MAX_PARSE_BYTES = 2 * 1024 * 1024
+
+# Longest signature and docstring line kept per symbol
+MAX_SIGNATURE_CHARS = 200
+MAX_DOC_CHARS = 100
+
+# A refresh re-parsing fewer files than this saves at most once per SAVE_INTERVAL
+# seconds; entries are validated by mtime on load, so an unsaved one only costs
+# the next session a re-parse of that file
+SAVE_BATCH = 50
+SAVE_INTERVAL = 60.0
+
+# Output caps for repo_map and find_symbol
+MAX_MAP_LINES = 400
+MAX_MATCHES = 50
+
+# (kind, qualified name, signature, first line, last line, docstring line)
+Symbol = Tuple[str, str, str, int, int, str]
+
+
+# ---------------------------------------------------------------------------
+# Extraction
+# ---------------------------------------------------------------------------
+
+def extract_symbols(source: str) -> List[Symbol]:
+    """Classes, functions and methods defined in *source*, in file order."""
+    symbols: List[Symbol] = []
+    _collect(ast.parse(source).body, "", False, symbols)
+    return symbols
+
+
+def _collect(body: List[ast.stmt], prefix: str, in_class: bool, out: List[Symbol]) -> None:
+    for node in body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            kind = "method" if in_class else "function"
+        elif isinstance(node, ast.ClassDef):
+            kind = "class"
+        else:
+            continue
+        name = prefix + node.name
+        start = min([d.lineno for d in node.decorator_list] + [node.lineno])
+        doc = (ast.get_docstring(node) or "").strip().split("\n", 1)[0][:MAX_DOC_CHARS]
+        signature = _signature(node)[:MAX_SIGNATURE_CHARS]
+        out.append((kind, name, signature, start, node.end_lineno or start, doc))
+        if isinstance(node, ast.ClassDef):
+            # Nested functions are implementation detail; nested classes and methods are not
+            _collect(node.body, name + ".", True, out)
+
+
+def _signature(node: Any) -> str:
+    if isinstance(node, ast.ClassDef):
+        bases = [ast.unparse(b) for b in node.bases] + [ast.unparse(k) for k in node.keywords]
+        return f"class {node.name}({', '.join(bases)})" if bases else f"class {node.name}"
+    prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+    signature = f"{prefix} {node.name}({ast.unparse(node.args)})"
+    if node.returns is not None:
+        signature += f" -> {ast.unparse(node.returns)}"
+    return signature
+
+
+# ---------------------------------------------------------------------------
+# Index
+# ---------------------------------------------------------------------------
+
+class SymbolIndex:
+    """Symbols of the non-ignored Python files in a file tree, optionally saved to disk."""
+
+    def __init__(self, tree: FileTree, cache_path: Optional[str] = None):
+        self.tree = tree
+        self.root = tree.root
+        self.cache_path = cache_path
+        # path relative to root -> {"size", "mtime_ns", "symbols", "error"}
+        self._files: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        # Never saved: the first refresh writes the index whatever its size
+        self._saved_at = float("-inf")
+        self._unsaved = 0
+        self._load()
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def refresh(self) -> int:
+        """Re-parse new or changed files and forget deleted ones; returns files re-parsed."""
+        # Every walked path starts with the root; slicing beats relpath on large trees
+        skip = len(self.root.rstrip(os.sep)) + 1
+        with self._refresh_lock:
+            seen: Set[str] = set()
+            updated = 0
+            for path, st in self._walk():
+                rel = path[skip:]
+                seen.add(rel)
+                entry = self._files.get(rel)
+                if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+                    continue
+                record = self._parse_file(path, st)
+                with self._lock:
+                    self._files[rel] = record
+                updated += 1
+            with self._lock:
+                gone = [p for p in self._files if p not in seen]
+                for rel in gone:
+                    del self._files[rel]
+            self._unsaved += updated + len(gone)
+            if self._unsaved >= SAVE_BATCH or (
+                self._unsaved and time.monotonic() - self._saved_at >= SAVE_INTERVAL
+            ):
+                self._save()
+            return updated
+
+    def _walk(self) -> Iterable[Tuple[str, os.stat_result]]:
+        for path in self.tree.files(self.root):
+            if not path.endswith(".py"):
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            yield path, st
+
+    @staticmethod
+    def _parse_file(path: str, st: os.stat_result) -> Dict[str, Any]:
+        record: Dict[str, Any] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "symbols": []}
+        if st.st_size > MAX_PARSE_BYTES:
+            record["error"] = "too large to index"
+            return record
+        try:
+            with open(path, "rb") as f:
+                record["symbols"] = extract_symbols(f.read().decode("utf-8", "replace"))
+        except SyntaxError as e:
+            record["error"] = f"syntax error at line {e.lineno}"
+        except (OSError, ValueError, RecursionError) as e:
+            record["error"] = f"not indexed: {type(e).__name__}"
+        return record
+
+    def _load(self) -> None:
+        if self.cache_path is None:
+            return
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != INDEX_VERSION or data.get("root") != self.root:
+            return
+        for entry in data.get("files", {}).values():
+            entry["symbols"] = [tuple(s) for s in entry["symbols"]]
+        self._files = data.get("files", {})
+        self._saved_at = time.monotonic()
+
+    def _save(self) -> None:
+        if self.cache_path is None:
+            return
+        with self._lock:
+            data = {"version": INDEX_VERSION, "root": self.root, "files": dict(self._files)}
+            payload = json.dumps(data, separators=(",", ":")).encode("utf-8")
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            atomic_write(self.cache_path, payload)
+        except OSError:
+            # A read-only home only costs the next session a cold start
+            pass
+        self._saved_at = time.monotonic()
+        self._unsaved = 0
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def files_under(self, under: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """``(relative path, entry)`` for indexed files at or below *under*, sorted by path."""
+        rel = os.path.relpath(os.path.abspath(under), self.root)
+        with self._lock:
+            files = list(self._files.items())
+        if rel != ".":
+            prefix = rel + os.sep
+            files = [(p, e) for p, e in files if p == rel or p.startswith(prefix)]
+        return sorted(files)
+
+    def lookup(self, name: str, under: Optional[str] = None) -> List[Tuple[str, Symbol]]:
+        """
+        Definitions matching *name*: its qualified name (``Class.method``),
+        its last component, or a dotted suffix of it.  Case-insensitive
+        substring matches are returned only when nothing matches exactly.
+        """
+        files = self.files_under(under or self.root)
+        exact: List[Tuple[str, Symbol]] = []
+        loose: List[Tuple[str, Symbol]] = []
+        needle = name.lower()
+        for path, entry in files:
+            for symbol in entry["symbols"]:
+                qualname = symbol[1]
+                if qualname == name or qualname.endswith("." + name):
+                    exact.append((path, symbol))
+                elif needle in qualname.lower():
+                    loose.append((path, symbol))
+        return exact or loose
+
+
+_indexes: Dict[str, SymbolIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_symbol_index(cwd: str) -> SymbolIndex:
+    """The shared, persisted index for the workspace rooted at *cwd*."""
+    root = os.path.abspath(cwd)
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            digest = hashlib.sha256(root.encode("utf-8")).hexdigest()[:16]
+            cache_path = os.path.join(SYMBOLS_DIR, f"{digest}.json")
+            index = _indexes[root] = SymbolIndex(get_file_tree(root), cache_path)
+        return index
@@ -0,0 +1,18 @@
+"""
+Test setup: the agent's modules import each other by bare name (``from
+tools import ...``), so the package directory goes on the path, and the
+on-disk caches are pointed at a throwaway directory before any of them is
+imported.
+"""
+
+import os
+import sys
+import tempfile
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PACKAGE_DIR)
+
+_cache_root = tempfile.mkdtemp(prefix="coding-agent-tests-")
+os.environ["CODING_AGENT_SESSIONS"] = os.path.join(_cache_root, "sessions")
+os.environ["CODING_AGENT_SYMBOLS"] = os.path.join(_cache_root, "symbols")
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
@@ -0,0 +1,98 @@
+"""Batch mode: tasks-file validation and a small run on mock workers."""
+
+import io
+import json
+import os
+
+import pytest
+
+from batch import DEFAULT_MAX_ITERATIONS, BatchError, load_tasks, run_batch
+
+
+def write_tasks(tmp_path, *lines):
+    path = tmp_path / "tasks.jsonl"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def test_defaults_filled_in(tmp_path):
+    path = write_tasks(
+        tmp_path,
+        json.dumps({"prompt": "one"}),
+        "",
+        json.dumps({"id": "two", "prompt": "two", "cwd": "sub", "model": "m2", "max_iterations": 3}),
+    )
+    first, second = load_tasks(path, str(tmp_path), "m1")
+    assert first == {
+        "id": "task-1",
+        "prompt": "one",
+        "cwd": str(tmp_path),
+        "model": "m1",
+        "max_iterations": DEFAULT_MAX_ITERATIONS,
+    }
+    assert second["id"] == "two"
+    assert second["cwd"] == os.path.abspath("sub")
+    assert second["model"] == "m2"
+    assert second["max_iterations"] == 3
+
+
+@pytest.mark.parametrize(
+    "line, message",
+    [
+        ("{not json", "invalid JSON"),
+        (json.dumps({"id": "x"}), "needs a string 'prompt'"),
+        (json.dumps(["prompt"]), "needs a string 'prompt'"),
+        (json.dumps({"prompt": "p", "tools": []}), "unknown keys: tools"),
+    ],
+)
+def test_invalid_lines_name_the_line(tmp_path, line, message):
+    path = write_tasks(tmp_path, json.dumps({"prompt": "ok"}), line)
+    with pytest.raises(BatchError, match=message) as info:
+        load_tasks(path, str(tmp_path), "m")
+    assert f"{path}:2:" in str(info.value)
+
+
+def test_duplicate_ids_rejected(tmp_path):
+    path = write_tasks(
+        tmp_path,
+        json.dumps({"id": "a", "prompt": "p"}),
+        json.dumps({"id": "a", "prompt": "q"}),
+    )
+    with pytest.raises(BatchError, match="duplicate task id 'a'"):
+        load_tasks(path, str(tmp_path), "m")
+
+
+def test_missing_file(tmp_path):
+    with pytest.raises(BatchError, match="cannot read tasks file"):
+        load_tasks(str(tmp_path / "nope.jsonl"), str(tmp_path), "m")
+
+
+def test_run_batch_writes_a_record_per_task(tmp_path):
+    script = tmp_path / "script.json"
+    script.write_text(json.dumps([{"content": "All done."}]), encoding="utf-8")
+    tasks = load_tasks(
+        write_tasks(
+            tmp_path,
+            json.dumps({"id": "good", "prompt": "hello"}),
+            json.dumps({"id": "bad", "prompt": "hello", "cwd": str(tmp_path / "missing")}),
+        ),
+        str(tmp_path),
+        "gpt-4o",
+    )
+    output = io.StringIO()
+    summary = run_batch(
+        tasks,
+        output,
+        workers=2,
+        transport_options={"mock_script": str(script)},
+        journal=False,
+        progress=io.StringIO(),
+    )
+    records = {r["id"]: r for r in map(json.loads, output.getvalue().splitlines())}
+    assert set(records) == {"good", "bad"}
+    assert records["good"]["answer"] == "All done."
+    assert records["good"]["status"] == "ok"
+    assert records["bad"]["status"] == "error"
+    assert "is not a directory" in records["bad"]["error"]
+    assert summary["tasks"] == 2
+    assert summary["statuses"] == {"ok": 1, "error": 1}
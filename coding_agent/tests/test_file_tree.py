@@ -0,0 +1,126 @@
+"""gitignore matching and incremental refresh in FileTree."""
+
+import os
+
+import pytest
+
+from file_tree import FileTree, parse_gitignore
+
+
+def make_tree(root, files):
+    for rel, content in files.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+
+def listed(tree, top=None):
+    root = tree.root
+    return sorted(os.path.relpath(p, root).replace(os.sep, "/") for p in tree.files(top or root))
+
+
+def matches(pattern, path, is_dir=False):
+    """Whether a one-line .gitignore holding *pattern* ignores *path*."""
+    return FileTree._ignored("/r/" + path, is_dir, [("/r", parse_gitignore(pattern))])
+
+
+@pytest.mark.parametrize(
+    "pattern, path, is_dir, expected",
+    [
+        ("*.log", "debug.log", False, True),
+        ("*.log", "deep/in/tree/debug.log", False, True),
+        ("*.log", "debug.log.txt", False, False),
+        # A slash anywhere but the end anchors the pattern
+        ("/todo.txt", "todo.txt", False, True),
+        ("/todo.txt", "sub/todo.txt", False, False),
+        ("docs/*.md", "docs/a.md", False, True),
+        ("docs/*.md", "x/docs/a.md", False, False),
+        # "*" does not cross directories, "**" does
+        ("docs/*.md", "docs/deep/a.md", False, False),
+        ("docs/**/*.md", "docs/deep/er/a.md", False, True),
+        ("**/cache", "a/b/cache", True, True),
+        ("out/**", "out/x/y.bin", False, True),
+        # Trailing slash: directories only
+        ("tmp/", "tmp", True, True),
+        ("tmp/", "tmp", False, False),
+        ("file?.txt", "file1.txt", False, True),
+        ("file?.txt", "file10.txt", False, False),
+        ("[ab].py", "a.py", False, True),
+        ("[!ab].py", "a.py", False, False),
+        ("[!ab].py", "c.py", False, True),
+        ("\\#notes", "#notes", False, True),
+    ],
+)
+def test_patterns(pattern, path, is_dir, expected):
+    assert matches(pattern, path, is_dir) is expected
+
+
+def test_comments_blanks_and_negation_order():
+    rules = parse_gitignore("# comment\n\n*.log\n!keep.log\n")
+    assert len(rules) == 2
+    chain = [("/r", rules)]
+    assert FileTree._ignored("/r/a.log", False, chain)
+    # The later negation wins
+    assert not FileTree._ignored("/r/keep.log", False, chain)
+
+
+def test_walk_applies_nested_gitignores(tmp_path):
+    make_tree(
+        tmp_path,
+        {
+            ".gitignore": "*.log\nbuild-out/\n",
+            "app.py": "",
+            "app.log": "",
+            "build-out/x.py": "",
+            "pkg/.gitignore": "!important.log\n",
+            "pkg/important.log": "",
+            "pkg/other.log": "",
+            "node_modules/dep.js": "",
+            ".hidden/secret.py": "",
+        },
+    )
+    assert listed(FileTree(str(tmp_path))) == [
+        ".gitignore",
+        "app.py",
+        "pkg/.gitignore",
+        "pkg/important.log",
+    ]
+
+
+def test_rules_above_the_walk_start_still_apply(tmp_path):
+    make_tree(tmp_path, {".gitignore": "*.tmp\n", "sub/a.py": "", "sub/b.tmp": ""})
+    tree = FileTree(str(tmp_path))
+    assert listed(tree, str(tmp_path / "sub")) == ["sub/a.py"]
+
+
+def test_git_info_exclude(tmp_path):
+    make_tree(tmp_path, {".git/info/exclude": "secret.txt\n", "secret.txt": "", "a.txt": ""})
+    assert listed(FileTree(str(tmp_path))) == ["a.txt"]
+
+
+def test_refresh_picks_up_new_files_and_gitignore_edits(tmp_path):
+    make_tree(tmp_path, {"a.py": "", "sub/b.py": ""})
+    tree = FileTree(str(tmp_path))
+    assert listed(tree) == ["a.py", "sub/b.py"]
+
+    (tmp_path / "sub" / "c.py").write_text("")
+    assert listed(tree) == ["a.py", "sub/b.py", "sub/c.py"]
+
+    (tmp_path / ".gitignore").write_text("c.py\n")
+    assert listed(tree) == [".gitignore", "a.py", "sub/b.py"]
+
+    # Same size, new content: the stamp includes the mtime
+    gitignore = tmp_path / ".gitignore"
+    gitignore.write_text("b.py\n")
+    st = gitignore.stat()
+    os.utime(gitignore, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert listed(tree) == [".gitignore", "a.py", "sub/c.py"]
+
+
+def test_invalidate_forces_a_rescan(tmp_path):
+    make_tree(tmp_path, {"a.py": ""})
+    tree = FileTree(str(tmp_path))
+    listing = tree.listing(str(tmp_path))
+    assert tree.listing(str(tmp_path)) is listing
+    tree.invalidate(str(tmp_path / "a.py"))
+    assert tree.listing(str(tmp_path)) is not listing
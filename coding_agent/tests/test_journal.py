@@ -0,0 +1,152 @@
+"""SessionJournal: resume from checkpoints, crash repair and /clear."""
+
+import json
+
+import pytest
+
+from journal import (
+    BLOB_MIN_CHARS,
+    CHECKPOINT_EVERY,
+    INTERRUPTED_RESULT,
+    JournalError,
+    SessionJournal,
+    repair_history,
+)
+
+
+def user(text):
+    return {"role": "user", "content": text}
+
+
+def reopen(journal, root):
+    return SessionJournal.open(journal.id, root=str(root))
+
+
+def test_round_trip_with_blobs(tmp_path):
+    journal = SessionJournal.create("gpt-4o", "/work", root=str(tmp_path))
+    big = "x" * (BLOB_MIN_CHARS + 1)
+    messages = [user("hi"), {"role": "assistant", "content": big}]
+    for message in messages:
+        journal.append(message)
+    journal.close()
+
+    resumed = reopen(journal, tmp_path)
+    assert resumed.header["model"] == "gpt-4o" and resumed.header["cwd"] == "/work"
+    assert resumed.load() == messages
+    # The bulky content lives in blobs/, not inline in the journal
+    with open(journal.journal_path, encoding="utf-8") as f:
+        assert big not in f.read()
+
+
+def test_resume_after_crash_parses_only_the_tail(tmp_path):
+    journal = SessionJournal.create("m", "/w", root=str(tmp_path))
+    messages = [user(f"message {i}") for i in range(CHECKPOINT_EVERY * 2 + 7)]
+    for message in messages:
+        journal.append(message)
+    # No close(): the process died
+
+    with open(journal.index_path, encoding="utf-8") as f:
+        index = json.load(f)
+    assert len(index["records"]) == CHECKPOINT_EVERY * 2
+
+    resumed = reopen(journal, tmp_path)
+    assert resumed.load() == messages
+    assert resumed._since_checkpoint == 7
+
+
+def test_clear_drops_earlier_messages(tmp_path):
+    journal = SessionJournal.create("m", "/w", root=str(tmp_path))
+    journal.append(user("old"))
+    journal.clear()
+    journal.append(user("new"))
+    journal.close()
+    assert reopen(journal, tmp_path).load() == [user("new")]
+
+
+def test_clear_after_checkpoint_in_tail(tmp_path):
+    journal = SessionJournal.create("m", "/w", root=str(tmp_path))
+    for i in range(CHECKPOINT_EVERY):
+        journal.append(user(f"m{i}"))
+    # Written after the checkpoint and never checkpointed themselves
+    journal._write({"type": "clear"})
+    journal._write({"type": "message", "message": user("after")})
+    assert reopen(journal, tmp_path).load() == [user("after")]
+
+
+def test_torn_final_line_is_skipped_and_terminated(tmp_path):
+    journal = SessionJournal.create("m", "/w", root=str(tmp_path))
+    journal.append(user("kept"))
+    journal.close()
+    with open(journal.journal_path, "a", encoding="utf-8") as f:
+        f.write('{"type": "message", "mess')
+
+    resumed = reopen(journal, tmp_path)
+    assert resumed.load() == [user("kept")]
+    resumed.append(user("next"))
+    resumed.close()
+    assert reopen(journal, tmp_path).load() == [user("kept"), user("next")]
+
+
+def test_missing_or_stale_index_falls_back_to_a_full_scan(tmp_path):
+    journal = SessionJournal.create("m", "/w", root=str(tmp_path))
+    journal.append(user("a"))
+    journal.close()
+
+    with open(journal.index_path, "w", encoding="utf-8") as f:
+        json.dump({"offset": 10**9, "records": []}, f)
+    assert reopen(journal, tmp_path).load() == [user("a")]
+
+    with open(journal.index_path, "w", encoding="utf-8") as f:
+        f.write("not json")
+    assert reopen(journal, tmp_path).load() == [user("a")]
+
+    with open(journal.index_path, "w", encoding="utf-8") as f:
+        json.dump({"records": []}, f)
+    assert reopen(journal, tmp_path).load() == [user("a")]
+
+
+def test_open_last_and_unknown(tmp_path):
+    first = SessionJournal.create("m", "/w", root=str(tmp_path))
+    first.close()
+    assert SessionJournal.open("last", root=str(tmp_path)).id == first.id
+    with pytest.raises(JournalError):
+        SessionJournal.open("nope", root=str(tmp_path))
+    with pytest.raises(JournalError):
+        SessionJournal.open("last", root=str(tmp_path / "empty"))
+
+
+def tool_call(call_id, name="read_file"):
+    return {"id": call_id, "type": "function", "function": {"name": name, "arguments": "{}"}}
+
+
+def test_repair_stubs_unanswered_tool_calls():
+    history = [
+        user("go"),
+        {"role": "assistant", "content": None, "tool_calls": [tool_call("a"), tool_call("b")]},
+        {"role": "tool", "tool_call_id": "a", "name": "read_file", "content": "ok"},
+        user("next"),
+    ]
+    repaired = repair_history(history)
+    assert [m.get("tool_call_id") for m in repaired] == [None, None, "a", "b", None]
+    assert repaired[3]["content"] == INTERRUPTED_RESULT
+
+
+def test_repair_stubs_calls_at_the_end():
+    history = [{"role": "assistant", "content": None, "tool_calls": [tool_call("z", "execute_bash")]}]
+    repaired = repair_history(history)
+    assert repaired[-1] == {
+        "role": "tool",
+        "tool_call_id": "z",
+        "name": "execute_bash",
+        "content": INTERRUPTED_RESULT,
+    }
+
+
+def test_complete_history_is_unchanged():
+    history = [
+        user("go"),
+        {"role": "assistant", "content": None, "tool_calls": [tool_call("a")]},
+        {"role": "tool", "tool_call_id": "a", "name": "read_file", "content": "ok"},
+        {"role": "assistant", "content": "done"},
+    ]
+    assert repair_history(history) == history
@@ -0,0 +1,145 @@
+"""apply_edits / apply_unified_diff, and edit_file writing their result back."""
+
+import os
+
+import pytest
+
+from file_tree import get_file_tree
+from patching import PatchError, apply_edits, apply_unified_diff
+from tools import edit_file
+
+# ---------------------------------------------------------------------------
+# apply_edits
+# ---------------------------------------------------------------------------
+
+
+def test_edits_apply_in_order():
+    text, count = apply_edits(
+        "alpha\nbeta\n",
+        [
+            {"old_string": "alpha", "new_string": "ALPHA"},
+            {"old_string": "ALPHA\nbeta", "new_string": "gamma"},
+        ],
+    )
+    assert (text, count) == ("gamma\n", 2)
+
+
+def test_ambiguous_edit_needs_replace_all():
+    with pytest.raises(PatchError, match="matches 2 times"):
+        apply_edits("x = 1\nx = 1\n", [{"old_string": "x = 1", "new_string": "x = 2"}])
+    text, count = apply_edits(
+        "x = 1\nx = 1\n", [{"old_string": "x = 1", "new_string": "x = 2", "replace_all": True}]
+    )
+    assert (text, count) == ("x = 2\nx = 2\n", 2)
+
+
+@pytest.mark.parametrize(
+    "edit, message",
+    [
+        ({"old_string": "", "new_string": "a"}, "empty"),
+        ({"old_string": "a", "new_string": "a"}, "identical"),
+        ({"old_string": "missing", "new_string": "a"}, "not found"),
+    ],
+)
+def test_invalid_edits_are_rejected(edit, message):
+    with pytest.raises(PatchError, match=message):
+        apply_edits("a\n", [edit])
+
+
+# ---------------------------------------------------------------------------
+# apply_unified_diff
+# ---------------------------------------------------------------------------
+
+
+def test_diff_replaces_a_line():
+    diff = "--- a/f\n+++ b/f\n@@ -1,3 +1,3 @@\n a\n-b\n+B\n c\n"
+    assert apply_unified_diff("a\nb\nc\n", diff) == ("a\nB\nc\n", 1)
+
+
+def test_drifted_hunk_is_found_by_context():
+    text = "".join(f"line {i}\n" for i in range(1, 21))
+    # Stated at line 3, really at line 13
+    diff = "@@ -3,2 +3,2 @@\n line 13\n-line 14\n+changed\n"
+    updated, _ = apply_unified_diff(text, diff)
+    assert "line 14\n" not in updated
+    assert "line 13\nchanged\nline 15\n" in updated
+
+
+def test_pure_insertion_goes_after_the_stated_line():
+    assert apply_unified_diff("a\nb\n", "@@ -1,0 +2,1 @@\n+new\n") == ("a\nnew\nb\n", 1)
+
+
+def test_no_newline_at_end_of_file():
+    diff = "@@ -1,2 +1,2 @@\n a\n-b\n\\ No newline at end of file\n+c\n\\ No newline at end of file\n"
+    assert apply_unified_diff("a\nb", diff) == ("a\nc", 1)
+
+
+def test_mismatched_hunk_leaves_nothing_applied():
+    with pytest.raises(PatchError, match="hunk 1"):
+        apply_unified_diff("a\nb\n", "@@ -1,1 +1,1 @@\n-zzz\n+y\n")
+
+
+def test_form_feed_does_not_split_lines():
+    # ast and diff line numbers count "\n" only; str.splitlines() also breaks at \f
+    # The context "a / b" occurs twice; only the stated line picks the right one
+    text = "a\n\x0ca\nb\na\nb\n"
+    diff = "@@ -4,2 +4,2 @@\n a\n-b\n+B\n"
+    assert apply_unified_diff(text, diff) == ("a\n\x0ca\nb\na\nB\n", 1)
+
+
+# ---------------------------------------------------------------------------
+# edit_file
+# ---------------------------------------------------------------------------
+
+
+def test_edit_file_keeps_crlf_line_endings(tmp_path):
+    path = tmp_path / "crlf.txt"
+    path.write_bytes(b"a\r\nb\r\nc\r\n")
+    result = edit_file("crlf.txt", [{"old_string": "b\n", "new_string": "B\nB2\n"}], cwd=str(tmp_path))
+    assert result.startswith("Applied 1 replacement(s)")
+    assert path.read_bytes() == b"a\r\nB\r\nB2\r\nc\r\n"
+
+    edit_file("crlf.txt", patch="@@ -1,2 +1,2 @@\n a\n-B\n+Q\n", cwd=str(tmp_path))
+    assert path.read_bytes() == b"a\r\nQ\r\nB2\r\nc\r\n"
+
+
+def test_edit_file_leaves_mixed_line_endings_alone(tmp_path):
+    path = tmp_path / "mixed.txt"
+    path.write_bytes(b"a\nb\r\nc\n")
+    edit_file("mixed.txt", [{"old_string": "b\r\n", "new_string": "B\r\n"}], cwd=str(tmp_path))
+    assert path.read_bytes() == b"a\nB\r\nc\n"
+
+
+def test_edit_file_refuses_non_utf8(tmp_path):
+    path = tmp_path / "latin1.txt"
+    path.write_bytes(b"x\xff\ny\n")
+    result = edit_file("latin1.txt", [{"old_string": "y", "new_string": "Y"}], cwd=str(tmp_path))
+    assert result.startswith("Error:") and "UTF-8" in result
+    assert path.read_bytes() == b"x\xff\ny\n"
+
+
+def test_edit_file_keeps_mode_and_leaves_no_temp_files(tmp_path):
+    path = tmp_path / "run.sh"
+    path.write_text("echo a\n")
+    path.chmod(0o755)
+    edit_file("run.sh", [{"old_string": "a", "new_string": "b"}], cwd=str(tmp_path))
+    assert path.read_text() == "echo b\n"
+    assert path.stat().st_mode & 0o777 == 0o755
+    assert os.listdir(tmp_path) == ["run.sh"]
+
+
+def test_failed_edit_does_not_touch_the_file(tmp_path):
+    path = tmp_path / "f.txt"
+    path.write_text("one\n")
+    result = edit_file("f.txt", [{"old_string": "two", "new_string": "2"}], cwd=str(tmp_path))
+    assert "was not modified" in result
+    assert path.read_text() == "one\n"
+
+
+def test_edit_file_invalidates_the_file_tree(tmp_path):
+    (tmp_path / "f.txt").write_text("one\n")
+    tree = get_file_tree(str(tmp_path))
+    tree.listing(str(tmp_path))
+    assert str(tmp_path) in tree._dirs
+    edit_file("f.txt", [{"old_string": "one", "new_string": "two"}], cwd=str(tmp_path))
+    assert str(tmp_path) not in tree._dirs
@@ -0,0 +1,49 @@
+"""ResultBudget: read_file results cut to budget say where to continue."""
+
+import re
+
+from result_budget import CHARS_PER_TOKEN, ResultBudget
+from scratch import ScratchDir
+from tools import read_file
+
+
+def shrink(args, result, tokens=50):
+    scratch = ScratchDir("test")
+    try:
+        return ResultBudget(overrides={"read_file": tokens}, scratch=scratch).apply(
+            "read_file", args, result
+        )
+    finally:
+        scratch.close()
+
+
+def test_line_read_resumes_at_next_line(tmp_path):
+    (tmp_path / "f.txt").write_text("".join(f"line {i}\n" for i in range(1, 201)))
+    result = read_file("f.txt", cwd=str(tmp_path), offset=11, limit=100)
+    cut = shrink({"path": "f.txt", "offset": 11, "limit": 100}, result)
+    shown = cut.split("\n")[:-1]
+    resume = int(re.search(r"offset=(\d+)", cut).group(1))
+    assert shown[-1] == f"line {resume - 1}"
+
+
+def test_text_byte_range_resumes_at_next_byte(tmp_path):
+    data = "".join(f"ligne {i} é\n" for i in range(500)).encode("utf-8")
+    (tmp_path / "f.txt").write_bytes(data)
+    args = {"path": "f.txt", "byte_range": [7, 4000]}
+    cut = shrink(args, read_file("f.txt", cwd=str(tmp_path), byte_range=[7, 4000]))
+    start, end = map(int, re.search(r"byte_range=\[(\d+), (\d+)\]", cut).groups())
+    shown = "\n".join(cut.split("\n")[:-1]) + "\n"
+    assert end == 4000
+    assert data[7:start] == shown.encode("utf-8")
+    assert "offset=" not in cut
+
+
+def test_hex_byte_range_resumes_at_next_row(tmp_path):
+    (tmp_path / "f.bin").write_bytes(bytes(range(256)) * 8)
+    args = {"path": "f.bin", "byte_range": [32, 2048]}
+    cut = shrink(args, read_file("f.bin", cwd=str(tmp_path), byte_range=[32, 2048]))
+    rows = cut.split("\n")[:-1]
+    start = int(re.search(r"byte_range=\[(\d+), 2048\]", cut).group(1))
+    assert rows[0].startswith("00000020")
+    assert start == int(rows[-1][:8], 16) + 16
+    assert len(cut) <= 50 * CHARS_PER_TOKEN + 200
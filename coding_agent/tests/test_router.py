@@ -0,0 +1,141 @@
+"""ModelRouter: which failures fail over, and hedged streams closing the loser."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from router import ModelRouter
+from transport import Transport
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+class Source:
+    """A provider stream that records whether it was closed."""
+
+    def __init__(self, chunks, delay=0.0):
+        self.chunks = iter(chunks)
+        self.delay = delay
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        time.sleep(self.delay)
+        return next(self.chunks)
+
+    def close(self):
+        self.closed.set()
+
+
+class Fake(Transport):
+    """Answers per model: an exception to raise, or a result (a Source for streams)."""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.calls = []
+
+    def _answer(self, request):
+        self.calls.append(request["model"])
+        answer = self.answers[request["model"]]
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    def complete(self, request):
+        return self._answer(request)
+
+    def stream(self, request):
+        return self._answer(request)
+
+    async def acomplete(self, request):
+        return self._answer(request)
+
+
+def test_transient_failure_fails_over():
+    inner = Fake({"a": StatusError(503), "b": "from b"})
+    router = ModelRouter(["b"], inner=inner)
+    assert router.complete({"model": "a"}) == "from b"
+    assert inner.calls == ["a", "b"]
+    assert router.health["a"].errors == 1
+
+
+@pytest.mark.parametrize("exc", [StatusError(400), StatusError(401), ValueError("bug")])
+def test_other_failures_raise_at_once(exc):
+    inner = Fake({"a": exc, "b": "from b"})
+    router = ModelRouter(["b"], inner=inner)
+    with pytest.raises(type(exc)):
+        router.complete({"model": "a"})
+    assert inner.calls == ["a"]
+    # A bad request says nothing about the model's health
+    assert not router.health["a"].cooling
+
+
+def test_all_transient_raises_first_error():
+    first = StatusError(503)
+    router = ModelRouter(["b"], inner=Fake({"a": first, "b": StatusError(429)}))
+    with pytest.raises(StatusError) as info:
+        router.complete({"model": "a"})
+    assert info.value is first
+
+
+def test_async_other_failures_raise_at_once():
+    inner = Fake({"a": StatusError(400), "b": "from b"})
+    router = ModelRouter(["b"], inner=inner)
+    with pytest.raises(StatusError):
+        asyncio.run(router.acomplete({"model": "a"}))
+    assert inner.calls == ["a"]
+
+
+def test_hedged_stream_closes_the_loser():
+    slow = Source(["slow"], delay=0.3)
+    fast = Source(["fast", "more"])
+    router = ModelRouter(["b"], inner=Fake({"a": slow, "b": fast}), hedge=True, hedge_after=0.05)
+    try:
+        assert list(router.stream({"model": "a"})) == ["fast", "more"]
+        assert router.health["b"].hedges_won == 1
+        # The slow stream is closed as soon as its first chunk arrives
+        assert slow.closed.wait(2)
+    finally:
+        router.close()
+
+
+def test_hedged_non_transient_failure_skips_the_backup():
+    inner = Fake({"a": StatusError(400), "b": "from b"})
+    router = ModelRouter(["b"], inner=inner, hedge=True, hedge_after=1.0)
+    try:
+        with pytest.raises(StatusError):
+            router.complete({"model": "a"})
+        assert inner.calls == ["a"]
+    finally:
+        router.close()
+
+
+def test_async_hedged_stream_closes_the_loser():
+    closed = []
+
+    class AsyncFake(Transport):
+        async def astream(self, request):
+            try:
+                if request["model"] == "a":
+                    await asyncio.sleep(1)
+                yield request["model"]
+                yield "more"
+            finally:
+                closed.append(request["model"])
+
+    async def run():
+        router = ModelRouter(["b"], inner=AsyncFake(), hedge=True, hedge_after=0.05)
+        chunks = [chunk async for chunk in router.astream({"model": "a"})]
+        await asyncio.sleep(0)
+        return chunks
+
+    assert asyncio.run(run()) == ["b", "more"]
+    assert sorted(closed) == ["a", "b"]
@@ -0,0 +1,89 @@
+"""ShellSession: state that persists between commands, and recovery when it cannot."""
+
+import gc
+import subprocess
+import tempfile
+import weakref
+
+import pytest
+
+from scratch import ScratchDir
+from shell import ShellSession
+
+
+@pytest.fixture
+def shell(tmp_path):
+    session = ShellSession(str(tmp_path))
+    yield session
+    session.close()
+
+
+def test_directory_and_environment_persist(shell, tmp_path):
+    (tmp_path / "sub").mkdir()
+    assert shell.run("cd sub && export GREETING=hi")[2] == 0
+    out, err, code = shell.run('pwd; echo "$GREETING"')
+    assert out.split() == [str(tmp_path / "sub"), "hi"]
+    assert (err, code) == ("", 0)
+    assert shell.cwd == str(tmp_path / "sub")
+
+
+def test_exit_code_and_stderr_are_separate(shell):
+    out, err, code = shell.run("echo out; echo err >&2; false")
+    assert (out, err, code) == ("out\n", "err\n", 1)
+
+
+def test_output_without_trailing_newline(shell):
+    assert shell.run("printf abc")[0] == "abc"
+
+
+def test_timeout_restarts_in_last_directory(shell, tmp_path):
+    (tmp_path / "sub").mkdir()
+    shell.run("cd sub; export KEEP=1")
+    with pytest.raises(subprocess.TimeoutExpired) as raised:
+        shell.run("echo started; sleep 10", timeout=0.5)
+    assert "started" in raised.value.output
+    out, _, code = shell.run('pwd; echo "[$KEEP]"')
+    # Only the working directory survives a restart
+    assert out.split() == [str(tmp_path / "sub"), "[]"]
+    assert code == 0
+
+
+def test_exit_starts_a_fresh_session(shell):
+    assert shell.run("exit 3")[2] is None
+    assert shell.run("echo back") == ("back\n", "", 0)
+
+
+def test_large_output_is_bounded_and_spilled(shell):
+    scratch = ScratchDir("test")
+    try:
+        out, _, code = shell.run("seq 1 100000", budget=4096, scratch=scratch)
+        assert code == 0
+        assert len(out) < 8192
+        assert out.startswith("1\n") and out.rstrip().endswith("100000")
+        spill = out.split("full output in ", 1)[1].split()[0]
+        with open(spill) as f:
+            assert f.read().split() == [str(i) for i in range(1, 100001)]
+    finally:
+        scratch.close()
+
+
+def test_scripts_directory_with_spaces(tmp_path, monkeypatch):
+    temp = tmp_path / "temp dir $HOME"
+    temp.mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(temp))
+    session = ShellSession(str(tmp_path))
+    try:
+        assert session.run("echo ok") == ("ok\n", "", 0)
+    finally:
+        session.close()
+    assert list(temp.iterdir()) == []
+
+
+def test_closed_sessions_are_not_kept_alive(tmp_path):
+    session = ShellSession(str(tmp_path))
+    session.run("true")
+    session.close()
+    ref = weakref.ref(session)
+    del session
+    gc.collect()
+    assert ref() is None
@@ -0,0 +1,110 @@
+"""Speculator: starting read-only calls mid-stream, claiming and discarding them."""
+
+import json
+from types import SimpleNamespace
+
+from speculation import Speculator
+from streaming import StreamAccumulator
+
+
+class Handle:
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class Starts:
+    def __init__(self):
+        self.handles = []
+
+    def __call__(self, name, args):
+        handle = Handle(name, args)
+        self.handles.append(handle)
+        return handle
+
+
+def feed(acc, index, id=None, name=None, arguments=None):
+    function = SimpleNamespace(name=name, arguments=arguments)
+    delta = SimpleNamespace(
+        role=None, content=None,
+        tool_calls=[SimpleNamespace(index=index, id=id, function=function)],
+    )
+    acc.add_chunk(SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=None)]))
+
+
+def setup():
+    starts = Starts()
+    return starts, Speculator(starts), StreamAccumulator()
+
+
+def test_starts_once_arguments_parse():
+    starts, spec, acc = setup()
+    feed(acc, 0, "a", "read_file", '{"path": ')
+    spec.observe(acc)
+    assert starts.handles == []
+    feed(acc, 0, arguments='"x.py"}')
+    spec.observe(acc)
+    spec.observe(acc)
+    assert [(h.name, h.args) for h in starts.handles] == [("read_file", {"path": "x.py"})]
+    assert spec.started == 1
+
+
+def test_claim_matching_and_discard_changed():
+    starts, spec, acc = setup()
+    feed(acc, 0, "a", "read_file", json.dumps({"path": "x.py"}))
+    feed(acc, 1, "b", "grep_search", json.dumps({"pattern": "foo"}))
+    spec.observe(acc)
+    first, second = starts.handles
+    claimed = spec.claim([
+        ("a", "read_file", {"path": "x.py"}),
+        ("b", "grep_search", {"pattern": "bar"}),
+    ])
+    assert claimed == {"a": first}
+    assert not first.cancelled
+    assert second.cancelled
+    assert (spec.used, spec.discarded) == (1, 1)
+    assert spec.running == {}
+
+
+def test_unclaimed_runs_discarded():
+    starts, spec, acc = setup()
+    feed(acc, 0, "a", "read_file", json.dumps({"path": "x.py"}))
+    spec.observe(acc)
+    assert spec.claim([]) == {}
+    assert starts.handles[0].cancelled
+    assert spec.discarded == 1
+
+
+def test_write_blocks_later_calls():
+    starts, spec, acc = setup()
+    feed(acc, 0, "a", "read_file", json.dumps({"path": "x.py"}))
+    feed(acc, 1, "b", "write_file", json.dumps({"path": "x.py", "content": ""}))
+    feed(acc, 2, "c", "read_file", json.dumps({"path": "x.py"}))
+    spec.observe(acc)
+    assert spec.blocked
+    assert [h.args for h in starts.handles] == [{"path": "x.py"}]
+
+
+def test_unfinished_call_holds_back_later_ones():
+    starts, spec, acc = setup()
+    feed(acc, 0, "a", "read_file", '{"path": "x')
+    feed(acc, 1, "b", "read_file", json.dumps({"path": "y.py"}))
+    spec.observe(acc)
+    assert starts.handles == []
+    assert not spec.blocked
+
+
+def test_reset_cancels_and_unblocks():
+    starts, spec, acc = setup()
+    feed(acc, 0, "a", "read_file", json.dumps({"path": "x.py"}))
+    feed(acc, 1, "b", "execute_bash", json.dumps({"command": "ls"}))
+    spec.observe(acc)
+    assert spec.blocked
+    spec.reset()
+    assert starts.handles[0].cancelled
+    assert not spec.blocked
+    assert spec.running == {}
@@ -0,0 +1,76 @@
+"""StreamAccumulator: reassembling prose and tool calls from deltas."""
+
+from types import SimpleNamespace
+
+from streaming import StreamAccumulator
+
+
+def chunk(content=None, tool_calls=None, role=None, finish_reason=None, usage=None):
+    delta = SimpleNamespace(role=role, content=content, tool_calls=tool_calls)
+    choice = SimpleNamespace(delta=delta, finish_reason=finish_reason)
+    return SimpleNamespace(choices=[choice], usage=usage)
+
+
+def call_delta(index=None, id=None, name=None, arguments=None):
+    return SimpleNamespace(
+        index=index, id=id, function=SimpleNamespace(name=name, arguments=arguments)
+    )
+
+
+def test_prose_only():
+    acc = StreamAccumulator()
+    assert acc.add_chunk(chunk(role="assistant", content="Hel")) == "Hel"
+    assert acc.add_chunk(chunk(content="lo")) == "lo"
+    assert acc.add_chunk(chunk(finish_reason="stop")) is None
+    message = acc.build_message()
+    assert message.role == "assistant"
+    assert message.content == "Hello"
+    assert message.tool_calls is None
+    assert acc.finish_reason == "stop"
+
+
+def test_indexed_tool_calls_interleaved():
+    acc = StreamAccumulator()
+    acc.add_chunk(chunk(tool_calls=[call_delta(0, "a", "read_file", '{"pa')]))
+    acc.add_chunk(chunk(tool_calls=[call_delta(1, "b", "grep_search", "")]))
+    acc.add_chunk(chunk(tool_calls=[call_delta(0, arguments='th": "x"}')]))
+    acc.add_chunk(chunk(tool_calls=[call_delta(1, arguments='{"pattern": "y"}')]))
+    calls = acc.build_message().tool_calls
+    assert [(c.id, c.function.name, c.function.arguments) for c in calls] == [
+        ("a", "read_file", '{"path": "x"}'),
+        ("b", "grep_search", '{"pattern": "y"}'),
+    ]
+    assert calls[0].type == "function"
+    assert acc.build_message().content is None
+
+
+def test_unindexed_calls_matched_by_id():
+    acc = StreamAccumulator()
+    acc.add_chunk(chunk(tool_calls=[call_delta(id="a", name="read_file", arguments='{"path"')]))
+    acc.add_chunk(chunk(tool_calls=[call_delta(id="b", name="list_directory", arguments="{}")]))
+    acc.add_chunk(chunk(tool_calls=[call_delta(id="a", arguments=': "x"}')]))
+    assert [c["arguments"] for c in acc.partial_tool_calls()] == ['{"path": "x"}', "{}"]
+
+
+def test_partial_tool_calls_in_index_order():
+    acc = StreamAccumulator()
+    acc.add_chunk(chunk(tool_calls=[call_delta(1, "b", "grep_search", "")]))
+    acc.add_chunk(chunk(tool_calls=[call_delta(0, "a", "read_file", '{"path":')]))
+    assert acc.has_tool_calls
+    assert [c["id"] for c in acc.partial_tool_calls()] == ["a", "b"]
+    assert acc.partial_tool_calls()[0]["arguments"] == '{"path":'
+
+
+def test_missing_arguments_default_to_empty_object():
+    acc = StreamAccumulator()
+    acc.add_chunk(chunk(tool_calls=[call_delta(0, "a", "list_directory")]))
+    assert acc.build_message().tool_calls[0].function.arguments == "{}"
+
+
+def test_usage_and_empty_chunks():
+    acc = StreamAccumulator()
+    usage = SimpleNamespace(prompt_tokens=10, completion_tokens=2)
+    assert acc.add_chunk(SimpleNamespace(choices=[], usage=usage)) is None
+    assert acc.add_chunk(SimpleNamespace(choices=[SimpleNamespace(delta=None)])) is None
+    assert acc.usage is usage
+    assert not acc.has_tool_calls
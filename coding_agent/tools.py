@@ -3,44 +3,203 @@ Tool implementations and OpenAI-compatible definitions for the coding agent.
 All tools accept a `cwd` parameter to resolve relative paths correctly.
 """
 
+import asyncio
+import io
+import mmap
 import os
+import signal
 import subprocess
 import fnmatch
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple
+
+from atomic_io import atomic_write
+from code_index import CodeIndex, compile_pattern, get_code_index, search_file
+from file_cache import FileCache, get_file_cache, peek_file_cache
+from file_tree import get_file_tree, tree_for
+from jobs import get_job_manager
+from output_capture import BoundedCapture, OutputCallback, pump, pump_async
+from patching import PatchError, apply_edits, apply_unified_diff
+from scratch import ScratchDir
+from shell import DEFAULT_TIMEOUT, ShellSession
+from symbols import MAX_MAP_LINES, MAX_MATCHES, SymbolIndex, get_symbol_index
+
+
+# Hard cap on the text a single read_file call may return
+MAX_READ_BYTES = 256 * 1024
+
+# Leading bytes inspected for NULs to tell binary files from text
+BINARY_SNIFF_BYTES = 8192
+
+# Upper bound on the per-command timeout the model may ask for, in seconds
+MAX_BASH_TIMEOUT = 600
 
 
 # ---------------------------------------------------------------------------
 # Implementations
 # ---------------------------------------------------------------------------
 
-def read_file(path: str, cwd: str = ".") -> str:
+def read_file(
+    path: str,
+    cwd: str = ".",
+    offset: Optional[int] = None,
+    limit: Optional[int] = None,
+    byte_range: Optional[List[int]] = None,
+) -> str:
     full_path = path if os.path.isabs(path) else os.path.join(cwd, path)
     if not os.path.exists(full_path):
         return f"Error: '{path}' does not exist"
     if not os.path.isfile(full_path):
         return f"Error: '{path}' is not a file"
     try:
-        with open(full_path, "r", encoding="utf-8", errors="replace") as f:
-            return f.read()
+        cache = get_file_cache(cwd)
+        st = os.stat(full_path)
+        if offset is None and limit is None and byte_range is None and st.st_size <= MAX_READ_BYTES:
+            text = cache.read(full_path)
+            if "\x00" in text[:BINARY_SNIFF_BYTES]:
+                return _binary_file_error(path, st.st_size)
+            return text
+        return _read_file_range(full_path, path, st, offset, limit, byte_range, cache)
     except Exception as e:
         return f"Error reading file: {e}"
 
 
+def _read_file_range(
+    full_path: str,
+    path: str,
+    st: os.stat_result,
+    offset: Optional[int],
+    limit: Optional[int],
+    byte_range: Optional[List[int]],
+    cache: FileCache,
+) -> str:
+    """Serve part of a file through mmap without loading the rest into memory."""
+    if st.st_size == 0:
+        return ""
+    with open(full_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        binary = b"\x00" in mm[:BINARY_SNIFF_BYTES]
+        total = _format_size(st.st_size)
+
+        if byte_range is not None:
+            start = max(int(byte_range[0]), 0)
+            end = min(int(byte_range[1]), st.st_size, start + MAX_READ_BYTES)
+            if start >= st.st_size or end <= start:
+                return f"Error: byte_range {byte_range} is outside '{path}' ({st.st_size} bytes)"
+            data = mm[start:end]
+            if binary:
+                body = "\n".join(
+                    f"{start + i:08x}  {data[i:i + 16].hex(' ')}" for i in range(0, len(data), 16)
+                )
+            else:
+                body = data.decode("utf-8", errors="replace")
+            return f"{body}\n[bytes {start}-{end} of {st.st_size} · {total} total]"
+
+        if binary:
+            return _binary_file_error(path, st.st_size)
+
+        index = cache.line_index(full_path, st, mm)
+        first = max(int(offset or 1), 1) - 1
+        last = index.total_lines if limit is None else min(first + max(int(limit), 0), index.total_lines)
+        if first >= index.total_lines:
+            return f"Error: offset {first + 1} is past the end of '{path}' ({index.total_lines} lines)"
+        start = index.line_start(mm, first)
+        end = index.line_start(mm, last)
+
+        capped = end - start > MAX_READ_BYTES
+        if capped:
+            # Stop at the last whole line that fits under the cap
+            cut = mm.rfind(b"\n", start, start + MAX_READ_BYTES)
+            end = cut + 1 if cut >= start else start + MAX_READ_BYTES
+            last = max(first + mm[start:end].count(b"\n"), first + 1)
+        text = mm[start:end].decode("utf-8", errors="replace")
+
+    note = f"[lines {first + 1}-{last} of {index.total_lines} · {total} total"
+    if capped:
+        note += f"; output capped at {_format_size(MAX_READ_BYTES)}, use offset/limit to read further"
+    return text.rstrip("\n") + f"\n{note}]"
+
+
+def _binary_file_error(path: str, size: int) -> str:
+    return (
+        f"Error: '{path}' appears to be a binary file ({_format_size(size)}); "
+        "use byte_range to inspect raw bytes"
+    )
+
+
+def _format_size(size: int) -> str:
+    if size < 1024:
+        return f"{size}B"
+    elif size < 1024 * 1024:
+        return f"{size / 1024:.1f}KB"
+    return f"{size / (1024 * 1024):.1f}MB"
+
+
 def write_file(path: str, content: str, cwd: str = ".") -> str:
     full_path = path if os.path.isabs(path) else os.path.join(cwd, path)
     try:
         os.makedirs(os.path.dirname(os.path.abspath(full_path)), exist_ok=True)
         with open(full_path, "w", encoding="utf-8") as f:
             f.write(content)
+        get_file_cache(cwd).invalidate(full_path)
+        get_file_tree(cwd).invalidate(full_path)
         return f"Successfully wrote {len(content)} characters to '{path}'"
     except Exception as e:
         return f"Error writing file: {e}"
 
 
+def edit_file(
+    path: str,
+    edits: Optional[List[Dict[str, Any]]] = None,
+    patch: Optional[str] = None,
+    cwd: str = ".",
+) -> str:
+    full_path = path if os.path.isabs(path) else os.path.join(cwd, path)
+    if not os.path.isfile(full_path):
+        return f"Error: '{path}' does not exist or is not a file"
+    if bool(edits) == bool(patch):
+        return "Error: provide exactly one of 'edits' or 'patch'"
+    try:
+        # Raw bytes, not the cache's lossy text: the file is written back whole
+        with open(full_path, "rb") as f:
+            original = f.read().decode("utf-8")
+    except UnicodeDecodeError as e:
+        return f"Error: '{path}' is not valid UTF-8 (byte {e.start}); use write_file or execute_bash instead"
+    except Exception as e:
+        return f"Error editing file: {e}"
+    # Edits and patches are written with \n; match them against a CRLF file's
+    # text with \n and restore the \r\n endings on write
+    crlf = "\r\n" in original and original.count("\r\n") == original.count("\n")
+    text = original.replace("\r\n", "\n") if crlf else original
+    try:
+        if edits:
+            updated, count = apply_edits(text, edits)
+            summary = f"{count} replacement(s)"
+        else:
+            updated, count = apply_unified_diff(text, patch or "")
+            summary = f"{count} hunk(s)"
+    except PatchError as e:
+        return f"Error: {e}; '{path}' was not modified"
+    except Exception as e:
+        return f"Error editing file: {e}"
+
+    try:
+        # Readers never see a half-written file; the file keeps its mode
+        data = (updated.replace("\n", "\r\n") if crlf else updated).encode("utf-8")
+        atomic_write(full_path, data, prefix=".edit-", copy_mode_from=full_path)
+        get_file_cache(cwd).invalidate(full_path)
+        get_file_tree(cwd).invalidate(full_path)
+    except Exception as e:
+        return f"Error writing file: {e}"
+
+    old_lines, new_lines = text.count("\n"), updated.count("\n")
+    return f"Applied {summary} to '{path}' ({new_lines - old_lines:+d} lines, now {new_lines})"
+
+
 def create_directory(path: str, cwd: str = ".") -> str:
     full_path = path if os.path.isabs(path) else os.path.join(cwd, path)
     try:
         os.makedirs(full_path, exist_ok=True)
+        get_file_cache(cwd).invalidate(full_path)
+        get_file_tree(cwd).invalidate(full_path)
         return f"Successfully created directory '{path}'"
     except Exception as e:
         return f"Error creating directory: {e}"
@@ -51,57 +210,193 @@ def list_directory(path: str = ".", cwd: str = ".") -> str:
     if not os.path.exists(full_path):
         return f"Error: '{path}' does not exist"
     try:
-        entries = []
-        for entry in sorted(os.scandir(full_path), key=lambda e: (not e.is_dir(), e.name)):
-            if entry.is_dir():
-                entries.append(f"📁 {entry.name}/")
-            else:
-                size = entry.stat().st_size
-                if size < 1024:
-                    size_str = f"{size}B"
-                elif size < 1024 * 1024:
-                    size_str = f"{size / 1024:.1f}KB"
-                else:
-                    size_str = f"{size / (1024 * 1024):.1f}MB"
-                entries.append(f"📄 {entry.name} ({size_str})")
+        listing = tree_for(full_path, cwd).listing(full_path)
+        if listing is None:
+            return f"Error listing directory: cannot read '{path}'"
+        entries = [f"📁 {name}/" for name in listing.dirs]
+        for name in listing.files:
+            try:
+                size = _format_size(os.stat(os.path.join(full_path, name)).st_size)
+            except OSError:
+                continue
+            entries.append(f"📄 {name} ({size})")
         return "\n".join(entries) if entries else "(empty directory)"
     except Exception as e:
         return f"Error listing directory: {e}"
 
 
-def execute_bash(command: str, cwd: str = ".") -> str:
+def execute_bash(
+    command: str,
+    cwd: str = ".",
+    timeout: Optional[float] = None,
+    shell: Optional[ShellSession] = None,
+    on_output: Optional[OutputCallback] = None,
+    scratch: Optional[ScratchDir] = None,
+) -> str:
+    """
+    Run *command* and return its bounded output and exit code.
+
+    Output is streamed into head+tail captures rather than buffered whole,
+    spilling in full to *scratch* when it overflows; *on_output* sees each
+    chunk as it arrives.
+    """
+    timeout = _bash_timeout(timeout)
     try:
-        result = subprocess.run(
+        if shell is not None:
+            stdout, stderr, returncode = shell.run(command, timeout, on_output, scratch=scratch)
+        else:
+            stdout, stderr, returncode = _run_captured(command, cwd, timeout, on_output, scratch)
+        return _format_bash_result(stdout, stderr, returncode)
+    except subprocess.TimeoutExpired as e:
+        if shell is not None:
+            error = (
+                f"Error: command timed out after {timeout:g} seconds "
+                f"(shell session restarted in {shell.cwd}; environment was reset)"
+            )
+        else:
+            error = f"Error: command timed out after {timeout:g} seconds"
+        return _timeout_error(error, e.output or "", e.stderr or "")
+    except Exception as e:
+        return f"Error executing command: {e}"
+    finally:
+        _revalidate_caches(cwd)
+
+
+def _run_captured(
+    command: str,
+    cwd: str,
+    timeout: float,
+    on_output: Optional[OutputCallback],
+    scratch: Optional[ScratchDir] = None,
+) -> Tuple[str, str, int]:
+    proc = subprocess.Popen(
+        command,
+        shell=True,
+        cwd=cwd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        # Own process group, so a timeout kills everything the command spawned
+        start_new_session=True,
+    )
+    out = BoundedCapture(label="stdout", scratch=scratch)
+    err = BoundedCapture(label="stderr", scratch=scratch)
+    try:
+        assert proc.stdout is not None and proc.stderr is not None
+        streams = {proc.stdout.fileno(): out, proc.stderr.fileno(): err}
+        if pump(streams, timeout, on_output) is None:
+            _kill_group(proc.pid)
+            raise subprocess.TimeoutExpired(command, timeout, output=out.text(), stderr=err.text())
+        return out.text(), err.text(), proc.wait()
+    finally:
+        if proc.poll() is None:
+            _kill_group(proc.pid)
+        proc.wait()
+        for pipe in (proc.stdout, proc.stderr):
+            if pipe is not None:
+                pipe.close()
+
+
+def _kill_group(pid: int) -> None:
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except OSError:
+        pass
+
+
+def _bash_timeout(timeout: Optional[float]) -> float:
+    if not timeout or timeout <= 0:
+        return DEFAULT_TIMEOUT
+    return min(float(timeout), MAX_BASH_TIMEOUT)
+
+
+def _format_bash_result(stdout: str, stderr: str, returncode: Optional[int]) -> str:
+    parts = _output_parts(stdout, stderr)
+    if returncode is None:
+        parts.append("[shell exited; a new session will start with the next command]")
+    else:
+        parts.append(f"[exit code: {returncode}]")
+    return "\n".join(parts)
+
+
+def _timeout_error(error: str, stdout: str, stderr: str) -> str:
+    """*error* followed by whatever the command printed before it was killed."""
+    return "\n".join([error] + _output_parts(stdout, stderr))
+
+
+def _output_parts(stdout: str, stderr: str) -> List[str]:
+    parts = []
+    if stdout:
+        parts.append(stdout.rstrip())
+    if stderr:
+        parts.append(f"[stderr]\n{stderr.rstrip()}")
+    return parts
+
+
+def _revalidate_caches(cwd: str) -> None:
+    """A shell command may have touched any file; drop stale cache entries."""
+    cache = peek_file_cache(cwd)
+    if cache is not None:
+        cache.revalidate()
+
+
+async def execute_bash_async(
+    command: str,
+    cwd: str = ".",
+    timeout: Optional[float] = None,
+    shell: Optional[ShellSession] = None,
+    on_output: Optional[OutputCallback] = None,
+    scratch: Optional[ScratchDir] = None,
+) -> str:
+    """Non-blocking variant of :func:`execute_bash` for the async agent."""
+    if shell is not None:
+        # The session serialises commands itself; just keep it off the loop
+        return await asyncio.to_thread(
+            execute_bash, command, cwd, timeout, shell, on_output, scratch
+        )
+    timeout = _bash_timeout(timeout)
+    out = BoundedCapture(label="stdout", scratch=scratch)
+    err = BoundedCapture(label="stderr", scratch=scratch)
+    try:
+        proc = await asyncio.create_subprocess_shell(
             command,
-            shell=True,
             cwd=cwd,
-            capture_output=True,
-            text=True,
-            timeout=120,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True,
         )
-        parts = []
-        if result.stdout:
-            parts.append(result.stdout.rstrip())
-        if result.stderr:
-            parts.append(f"[stderr]\n{result.stderr.rstrip()}")
-        parts.append(f"[exit code: {result.returncode}]")
-        return "\n".join(parts)
-    except subprocess.TimeoutExpired:
-        return "Error: command timed out after 120 seconds"
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(
+                    pump_async(proc.stdout, out, on_output),
+                    pump_async(proc.stderr, err, on_output),
+                    proc.wait(),
+                ),
+                timeout=timeout,
+            )
+        except asyncio.TimeoutError:
+            _kill_group(proc.pid)
+            await proc.wait()
+            error = f"Error: command timed out after {timeout:g} seconds"
+            return _timeout_error(error, out.text(), err.text())
+        return _format_bash_result(out.text(), err.text(), proc.returncode)
     except Exception as e:
         return f"Error executing command: {e}"
+    finally:
+        out.close()
+        err.close()
+        _revalidate_caches(cwd)
 
 
 def search_files(pattern: str, directory: str = ".", cwd: str = ".") -> str:
     full_dir = directory if os.path.isabs(directory) else os.path.join(cwd, directory)
     try:
         matches = []
-        skip_dirs = {".git", "node_modules", "__pycache__", ".venv", "venv", "env", "dist", "build"}
-        for root, dirs, files in os.walk(full_dir):
-            dirs[:] = [d for d in dirs if d not in skip_dirs and not d.startswith(".")]
-            for filename in files:
-                if fnmatch.fnmatch(filename, pattern):
-                    matches.append(os.path.relpath(os.path.join(root, filename), cwd))
+        root = os.path.abspath(cwd) + os.sep
+        for path in tree_for(full_dir, cwd).files(full_dir):
+            if fnmatch.fnmatch(os.path.basename(path), pattern):
+                matches.append(path[len(root):] if path.startswith(root) else os.path.relpath(path, cwd))
         if not matches:
             return f"No files found matching '{pattern}' in '{directory}'"
         return "\n".join(sorted(matches))
@@ -111,38 +406,159 @@ def search_files(pattern: str, directory: str = ".", cwd: str = ".") -> str:
 
 def grep_search(pattern: str, path: str = ".", recursive: bool = True, cwd: str = ".") -> str:
     full_path = path if os.path.isabs(path) else os.path.join(cwd, path)
+    if not os.path.exists(full_path):
+        return f"Error: '{path}' does not exist"
     try:
-        flags = ["-rn"] if recursive else ["-n"]
-        result = subprocess.run(
-            ["grep"] + flags + ["--include=*.*", "-I", pattern, full_path],
-            capture_output=True,
-            text=True,
-            timeout=30,
-        )
-        if result.returncode == 0:
-            lines = result.stdout.strip().split("\n")
-            rel_lines = []
-            for line in lines:
-                if ":" in line:
-                    file_part, rest = line.split(":", 1)
-                    try:
-                        rel_file = os.path.relpath(file_part, cwd)
-                        rel_lines.append(f"{rel_file}:{rest}")
-                    except ValueError:
-                        rel_lines.append(line)
-                else:
-                    rel_lines.append(line)
-            capped = rel_lines[:100]
-            suffix = f"\n... ({len(rel_lines) - 100} more results)" if len(rel_lines) > 100 else ""
-            return "\n".join(capped) + suffix
-        elif result.returncode == 1:
-            return f"No matches found for '{pattern}'"
+        if os.path.isfile(full_path):
+            rel_lines = search_file(compile_pattern(pattern), full_path, cwd)
         else:
-            return f"grep error: {result.stderr.strip()}"
+            tree = tree_for(full_path, cwd)
+            # Outside the workspace the tree (and so the index) is throwaway
+            index = get_code_index(cwd) if tree is get_file_tree(cwd) else CodeIndex(tree)
+            rel_lines = index.search(pattern, full_path, recursive, cwd)
+        if not rel_lines:
+            return f"No matches found for '{pattern}'"
+        capped = rel_lines[:100]
+        suffix = f"\n... ({len(rel_lines) - 100} more results)" if len(rel_lines) > 100 else ""
+        return "\n".join(capped) + suffix
     except Exception as e:
         return f"Error searching: {e}"
 
 
+def _symbol_index(full_path: str, cwd: str) -> SymbolIndex:
+    """The workspace's persisted index, or a throwaway one for paths outside it."""
+    tree = tree_for(full_path, cwd)
+    index = get_symbol_index(cwd) if tree is get_file_tree(cwd) else SymbolIndex(tree)
+    index.refresh()
+    return index
+
+
+def _symbol_line(path: str, symbol: Tuple[str, str, str, int, int, str]) -> str:
+    kind, _, signature, start, end, doc = symbol
+    return f"{path}:{start}-{end}  {kind}  {signature}" + (f"  — {doc}" if doc else "")
+
+
+def repo_map(path: str = ".", cwd: str = ".") -> str:
+    full_path = path if os.path.isabs(path) else os.path.join(cwd, path)
+    if not os.path.exists(full_path):
+        return f"Error: '{path}' does not exist"
+    try:
+        index = _symbol_index(full_path, cwd)
+        files = index.files_under(full_path)
+        if not files:
+            return f"No Python files found in '{path}'"
+        lines: List[str] = []
+        for rel, entry in files:
+            shown = os.path.relpath(os.path.join(index.root, rel), cwd)
+            lines.append(f"{shown}  ({entry['error']})" if entry.get("error") else shown)
+            for _, qualname, signature, start, end, _ in entry["symbols"]:
+                indent = "  " * (qualname.count(".") + 1)
+                lines.append(f"{indent}{signature}  L{start}-{end}")
+        if len(lines) > MAX_MAP_LINES:
+            more = len(lines) - MAX_MAP_LINES
+            lines = lines[:MAX_MAP_LINES] + [f"... ({more} more lines; map a subdirectory or file)"]
+        return "\n".join(lines)
+    except Exception as e:
+        return f"Error mapping symbols: {e}"
+
+
+def find_symbol(name: str, path: str = ".", cwd: str = ".") -> str:
+    full_path = path if os.path.isabs(path) else os.path.join(cwd, path)
+    if not os.path.exists(full_path):
+        return f"Error: '{path}' does not exist"
+    try:
+        index = _symbol_index(full_path, cwd)
+        matches = index.lookup(name, full_path)
+        if not matches:
+            return f"No definition found for '{name}'"
+        lines = [
+            _symbol_line(os.path.relpath(os.path.join(index.root, rel), cwd), symbol)
+            for rel, symbol in matches[:MAX_MATCHES]
+        ]
+        if len(matches) > MAX_MATCHES:
+            lines.append(f"... ({len(matches) - MAX_MATCHES} more; use a qualified name or a path)")
+        return "\n".join(lines)
+    except Exception as e:
+        return f"Error finding symbol: {e}"
+
+
+def read_symbol(name: str, path: str = ".", cwd: str = ".") -> str:
+    full_path = path if os.path.isabs(path) else os.path.join(cwd, path)
+    if not os.path.exists(full_path):
+        return f"Error: '{path}' does not exist"
+    try:
+        index = _symbol_index(full_path, cwd)
+        matches = index.lookup(name, full_path)
+        exact = [(rel, s) for rel, s in matches if s[1] == name or s[1].endswith("." + name)]
+        if len(exact) != 1:
+            listed = [
+                _symbol_line(os.path.relpath(os.path.join(index.root, rel), cwd), symbol)
+                for rel, symbol in matches[:MAX_MATCHES]
+            ]
+            if not exact:
+                similar = "; similar names:\n" + "\n".join(listed) if listed else ""
+                return f"Error: no definition of '{name}' found in '{path}'{similar}"
+            return (
+                f"'{name}' is defined {len(exact)} times; pass a qualified name (Class.method) "
+                "or the file as path:\n" + "\n".join(listed)
+            )
+        rel, (_, _, _, start, end, _) = exact[0]
+        file_path = os.path.join(index.root, rel)
+        # ast numbers lines by "\n" alone; splitlines() would also break at \f, \x1c-\x1e, \x85...
+        lines = io.StringIO(get_file_cache(cwd).read(file_path)).readlines()
+        header = f"[{os.path.relpath(file_path, cwd)} lines {start}-{end}]\n"
+        return header + "".join(lines[start - 1 : end])
+    except Exception as e:
+        return f"Error reading symbol: {e}"
+
+
+def start_job(command: str, cwd: str = ".", shell: Optional[ShellSession] = None) -> str:
+    # Follow the persistent shell's cd, so jobs start where commands run
+    start_dir = shell.cwd if shell is not None else cwd
+    try:
+        job = get_job_manager(cwd).start(command, start_dir)
+    except Exception as e:
+        return f"Error starting job: {e}"
+    return (
+        f"Started {job.id} (pid {job.proc.pid}) in {start_dir}\n"
+        f"Output is logged to {job.log_path}; poll it with job_output."
+    )
+
+
+def job_status(job_id: Optional[str] = None, cwd: str = ".") -> str:
+    manager = get_job_manager(cwd)
+    if job_id:
+        job = manager.get(job_id)
+        if job is None:
+            return f"Error: no job '{job_id}'"
+        jobs = [job]
+    else:
+        jobs = manager.jobs()
+    _revalidate_caches(cwd)
+    return "\n".join(job.describe() for job in jobs) if jobs else "No jobs started."
+
+
+def job_output(job_id: str, offset: Optional[int] = None, cwd: str = ".") -> str:
+    manager = get_job_manager(cwd)
+    job = manager.get(job_id)
+    if job is None:
+        return f"Error: no job '{job_id}'"
+    _revalidate_caches(cwd)
+    return manager.read(job, offset)
+
+
+def kill_job(job_id: str, cwd: str = ".") -> str:
+    manager = get_job_manager(cwd)
+    job = manager.get(job_id)
+    if job is None:
+        return f"Error: no job '{job_id}'"
+    if not job.running:
+        return f"{job.id} already exited with code {job.proc.returncode}"
+    manager.kill(job)
+    _revalidate_caches(cwd)
+    return f"Killed {job.describe()}"
+
+
 # ---------------------------------------------------------------------------
 # OpenAI-compatible tool definitions (works with litellm for all providers)
 # ---------------------------------------------------------------------------
@@ -152,14 +568,32 @@ TOOL_DEFINITIONS = [
         "type": "function",
         "function": {
             "name": "read_file",
-            "description": "Read the contents of a file. Use to view existing source code, configs, or text files.",
+            "description": (
+                "Read the contents of a file. Use to view existing source code, configs, or text files. "
+                "Large files are capped at 256KB per call; use offset/limit to page through them."
+            ),
             "parameters": {
                 "type": "object",
                 "properties": {
                     "path": {
                         "type": "string",
                         "description": "Path to the file (relative to the working directory)",
-                    }
+                    },
+                    "offset": {
+                        "type": "integer",
+                        "description": "1-based line number to start reading from",
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "Maximum number of lines to return",
+                    },
+                    "byte_range": {
+                        "type": "array",
+                        "items": {"type": "integer"},
+                        "minItems": 2,
+                        "maxItems": 2,
+                        "description": "[start, end) byte offsets to read instead of lines; binary files are shown as hex",
+                    },
                 },
                 "required": ["path"],
             },
@@ -186,6 +620,49 @@ TOOL_DEFINITIONS = [
             },
         },
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "edit_file",
+            "description": (
+                "Modify an existing file in place without resending it. Pass either 'edits' "
+                "(exact-match replacements, applied in order) or 'patch' (a unified diff). "
+                "All changes apply atomically or not at all. Prefer this over write_file "
+                "for changes to existing files."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {
+                        "type": "string",
+                        "description": "File to edit (relative to the working directory)",
+                    },
+                    "edits": {
+                        "type": "array",
+                        "description": "Replacements; each old_string must match exactly once unless replace_all is true",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "old_string": {"type": "string", "description": "Exact text to replace"},
+                                "new_string": {"type": "string", "description": "Replacement text"},
+                                "replace_all": {
+                                    "type": "boolean",
+                                    "description": "Replace every occurrence (default: false)",
+                                    "default": False,
+                                },
+                            },
+                            "required": ["old_string", "new_string"],
+                        },
+                    },
+                    "patch": {
+                        "type": "string",
+                        "description": "Unified diff for this file (@@ hunks; ---/+++ headers optional)",
+                    },
+                },
+                "required": ["path"],
+            },
+        },
+    },
     {
         "type": "function",
         "function": {
@@ -232,7 +709,11 @@ TOOL_DEFINITIONS = [
                     "command": {
                         "type": "string",
                         "description": "The bash command to execute",
-                    }
+                    },
+                    "timeout": {
+                        "type": "number",
+                        "description": "Seconds before the command is killed (default 120, max 600)",
+                    },
                 },
                 "required": ["command"],
             },
@@ -264,7 +745,11 @@ TOOL_DEFINITIONS = [
         "type": "function",
         "function": {
             "name": "grep_search",
-            "description": "Search for a text pattern inside files. Supports regex. Use to find usages of functions, variables, or any text.",
+            "description": (
+                "Search for a text pattern inside files. Supports Python regular expressions "
+                "(an invalid regex is matched literally). Use to find usages of functions, "
+                "variables, or any text. Returns path:line:text, up to 100 results."
+            ),
             "parameters": {
                 "type": "object",
                 "properties": {
@@ -287,6 +772,159 @@ TOOL_DEFINITIONS = [
             },
         },
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "repo_map",
+            "description": (
+                "Outline the Python code under a directory or in a file: each file with its "
+                "classes, functions and methods, their signatures and line ranges. Use it to "
+                "get oriented in a codebase in one call instead of listing and reading files."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "path": {
+                        "type": "string",
+                        "description": "Directory or .py file to map (default: working directory)",
+                        "default": ".",
+                    },
+                },
+                "required": [],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "find_symbol",
+            "description": (
+                "Find where a Python class, function or method is defined. Matches the name, a "
+                "qualified name like 'Class.method', or (if nothing matches exactly) part of a "
+                "name. Returns path:start-end, kind, signature and docstring summary."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "name": {
+                        "type": "string",
+                        "description": "Symbol name, e.g. 'parse_config' or 'Agent.run'",
+                    },
+                    "path": {
+                        "type": "string",
+                        "description": "Directory or file to search in (default: working directory)",
+                        "default": ".",
+                    },
+                },
+                "required": ["name"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "read_symbol",
+            "description": (
+                "Return the full source of one Python class, function or method (decorators "
+                "included) without reading the whole file. If the name is defined more than "
+                "once, lists the definitions; narrow it with 'Class.method' or path."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "name": {
+                        "type": "string",
+                        "description": "Symbol name, e.g. 'parse_config' or 'Agent.run'",
+                    },
+                    "path": {
+                        "type": "string",
+                        "description": "Directory or file containing it (default: working directory)",
+                        "default": ".",
+                    },
+                },
+                "required": ["name"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "start_job",
+            "description": (
+                "Start a long-running command (dev server, full test suite, build) in the "
+                "background and return a job id immediately. Output is logged; read it with "
+                "job_output. Use execute_bash for commands that finish quickly."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "command": {
+                        "type": "string",
+                        "description": "The bash command to run in the background",
+                    }
+                },
+                "required": ["command"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "job_status",
+            "description": "Show whether background jobs are running, their exit codes, and how much output is unread.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "job_id": {
+                        "type": "string",
+                        "description": "Job to report on (default: all jobs)",
+                    }
+                },
+                "required": [],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "job_output",
+            "description": (
+                "Read a background job's output. By default returns only what was printed "
+                "since the last call (newest 32 KB if more); pass offset to re-read from a byte offset."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "job_id": {
+                        "type": "string",
+                        "description": "Job id returned by start_job",
+                    },
+                    "offset": {
+                        "type": "integer",
+                        "description": "Byte offset in the job's log to read from",
+                    },
+                },
+                "required": ["job_id"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "kill_job",
+            "description": "Stop a background job and everything it started (SIGTERM, then SIGKILL).",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "job_id": {
+                        "type": "string",
+                        "description": "Job id returned by start_job",
+                    }
+                },
+                "required": ["job_id"],
+            },
+        },
+    },
 ]
 
 
@@ -294,21 +932,99 @@ TOOL_DEFINITIONS = [
 # Dispatch
 # ---------------------------------------------------------------------------
 
-def execute_tool(name: str, args: Dict[str, Any], cwd: str = ".") -> str:
-    """Dispatch a tool call by name."""
+# Tools with no side effects on the workspace; the agent may run these
+# concurrently when the model requests several of them in one turn.
+# job_output is not one: each read advances the job's read offset, so two
+# in one batch would race on it.  job_status only revalidates the file
+# cache, which is safe from any thread.
+READ_ONLY_TOOLS = frozenset(
+    {
+        "read_file",
+        "list_directory",
+        "search_files",
+        "grep_search",
+        "repo_map",
+        "find_symbol",
+        "read_symbol",
+        "job_status",
+    }
+)
+
+# Read-only tools that may also run ahead of time, while the model is still
+# streaming, and be thrown away unused; job_status is left out because a
+# status taken early may be stale by the time the model's turn ends
+SPECULATIVE_TOOLS = READ_ONLY_TOOLS - {"job_status"}
+
+
+def execute_tool(
+    name: str,
+    args: Dict[str, Any],
+    cwd: str = ".",
+    shell: Optional[ShellSession] = None,
+    on_output: Optional[OutputCallback] = None,
+    scratch: Optional[ScratchDir] = None,
+) -> str:
+    """
+    Dispatch a tool call by name.
+
+    ``shell`` is the agent's persistent session, if it has one; without it
+    each ``execute_bash`` call runs in a fresh shell.  ``on_output`` receives
+    shell output as it is produced, and ``scratch`` holds output too large
+    to return whole.
+    """
     if name == "read_file":
-        return read_file(args["path"], cwd)
+        return read_file(
+            args["path"], cwd, args.get("offset"), args.get("limit"), args.get("byte_range")
+        )
     elif name == "write_file":
         return write_file(args["path"], args["content"], cwd)
+    elif name == "edit_file":
+        return edit_file(args["path"], args.get("edits"), args.get("patch"), cwd)
     elif name == "create_directory":
         return create_directory(args["path"], cwd)
     elif name == "list_directory":
         return list_directory(args.get("path", "."), cwd)
     elif name == "execute_bash":
-        return execute_bash(args["command"], cwd)
+        return execute_bash(args["command"], cwd, args.get("timeout"), shell, on_output, scratch)
     elif name == "search_files":
         return search_files(args["pattern"], args.get("directory", "."), cwd)
     elif name == "grep_search":
         return grep_search(args["pattern"], args.get("path", "."), args.get("recursive", True), cwd)
+    elif name == "repo_map":
+        return repo_map(args.get("path", "."), cwd)
+    elif name == "find_symbol":
+        return find_symbol(args["name"], args.get("path", "."), cwd)
+    elif name == "read_symbol":
+        return read_symbol(args["name"], args.get("path", "."), cwd)
+    elif name == "start_job":
+        return start_job(args["command"], cwd, shell)
+    elif name == "job_status":
+        return job_status(args.get("job_id"), cwd)
+    elif name == "job_output":
+        return job_output(args["job_id"], args.get("offset"), cwd)
+    elif name == "kill_job":
+        return kill_job(args["job_id"], cwd)
     else:
         return f"Error: unknown tool '{name}'"
+
+
+async def execute_tool_async(
+    name: str,
+    args: Dict[str, Any],
+    cwd: str = ".",
+    shell: Optional[ShellSession] = None,
+    on_output: Optional[OutputCallback] = None,
+    scratch: Optional[ScratchDir] = None,
+) -> str:
+    """
+    Dispatch a tool call without blocking the event loop.
+
+    Shell commands run as asyncio subprocesses; the remaining tools are
+    short file-system operations and run on the default thread pool.
+    """
+    if name == "execute_bash":
+        return await execute_bash_async(
+            args["command"], cwd, args.get("timeout"), shell, on_output, scratch
+        )
+    # The shell too: start_job follows the persistent session's directory
+    return await asyncio.to_thread(execute_tool, name, args, cwd, shell, None, scratch)
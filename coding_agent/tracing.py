@@ -0,0 +1,371 @@
+"""
+Timing and token accounting for the agent loop.
+
+Every user turn is a trace.  Inside it, each LLM call and each tool
+execution is a span with its latency and attributes (tokens in, out and
+from the prompt cache for model calls; output bytes for tools), named
+after the OpenTelemetry GenAI conventions.  The ``Tracer`` keeps the
+recent turns in full and running totals for the whole session, which the
+``/stats`` command renders, and can write everything it holds as OTLP/JSON
+(the body of an OTLP ``ExportTraceServiceRequest``) for any collector or
+trace viewer that accepts it.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from atomic_io import atomic_write
+from prompt_cache import cache_tokens
+
+# Turns kept span by span; older ones still count toward the session totals
+MAX_TURNS_KEPT = 200
+
+# Most recent calls per tool whose durations give its latency percentiles
+TOOL_LATENCY_WINDOW = 500
+
+# OTLP span kinds
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+
+# OTLP status codes
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+# Innermost span open in the current thread or task
+_current: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed operation: a turn, an LLM call, a tool execution, a render."""
+
+    def __init__(
+        self,
+        name: str,
+        kind: str,
+        trace_id: str,
+        parent: Optional["Span"] = None,
+        attributes: Optional[Dict[str, Any]] = None,
+    ):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.events: List[Tuple[int, str]] = []
+        self.error: Optional[str] = None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        # Durations come from the monotonic clock, not the wall clock above
+        self._start = time.perf_counter()
+        self.duration = 0.0
+        # Spans finished inside this one (turn spans only)
+        self.children: List["Span"] = []
+
+    def set(self, key: str, value: Any) -> None:
+        if value is not None:
+            self.attributes[key] = value
+
+    def event(self, name: str) -> None:
+        self.events.append((time.time_ns(), name))
+
+    def fail(self, message: str) -> None:
+        self.error = message
+
+    def end(self) -> None:
+        if self.end_ns is None:
+            self.duration = time.perf_counter() - self._start
+            self.end_ns = self.start_ns + int(self.duration * 1e9)
+
+    def offset(self, event: str) -> Optional[float]:
+        """Seconds from the start of the span to its first *event*, if recorded."""
+        for at, name in self.events:
+            if name == event:
+                return (at - self.start_ns) / 1e9
+        return None
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span: Dict[str, Any] = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KIND_CLIENT if self.kind == "llm" else SPAN_KIND_INTERNAL,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": _otlp_attributes(dict(self.attributes, **{"agent.span.kind": self.kind})),
+            "status": {"code": STATUS_ERROR, "message": self.error} if self.error else {"code": STATUS_OK},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.events:
+            span["events"] = [{"timeUnixNano": str(at), "name": name} for at, name in self.events]
+        return span
+
+    # ------------------------------------------------------------------
+    # Attributes for the two common span kinds
+    # ------------------------------------------------------------------
+
+    def record_usage(self, usage: Any) -> None:
+        """Token counts from a litellm ``Usage`` object (LLM spans)."""
+        if usage is None:
+            return
+        read, written = cache_tokens(usage)
+        self.set("gen_ai.usage.input_tokens", int(_get(usage, "prompt_tokens") or 0))
+        self.set("gen_ai.usage.output_tokens", int(_get(usage, "completion_tokens") or 0))
+        self.set("gen_ai.usage.cache_read_input_tokens", read)
+        self.set("gen_ai.usage.cache_creation_input_tokens", written)
+
+    def record_tool_result(self, result: str) -> None:
+        """Output size and error status of a tool's raw result (tool spans)."""
+        self.set("tool.output_bytes", len(result.encode("utf-8", "replace")))
+        if result.startswith("Error"):
+            self.fail(result.split("\n", 1)[0][:200])
+
+
+class Tracer:
+    """Collects spans per turn and totals per session."""
+
+    def __init__(
+        self,
+        resource: Optional[Dict[str, Any]] = None,
+        export_path: Optional[str] = None,
+    ):
+        self.resource = {"service.name": "coding-agent", "process.pid": os.getpid()}
+        self.resource.update({k: v for k, v in (resource or {}).items() if v is not None})
+        # Rewritten after every turn so a crash loses at most the turn in flight
+        self.export_path = export_path
+        self.turns: Deque[Span] = deque(maxlen=MAX_TURNS_KEPT)
+        self.totals: Dict[str, float] = {
+            "turns": 0,
+            "turn_seconds": 0.0,
+            "llm_calls": 0,
+            "llm_seconds": 0.0,
+            "llm_errors": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "cache_read_tokens": 0,
+            "cache_write_tokens": 0,
+            "tool_calls": 0,
+            "tool_seconds": 0.0,
+            "tool_errors": 0,
+            "render_seconds": 0.0,
+        }
+        # Per tool name: calls, errors, output bytes, total and longest duration,
+        # and the durations of the last TOOL_LATENCY_WINDOW calls
+        self.tools: Dict[str, Dict[str, Any]] = {}
+        self._turn: Optional[Span] = None
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Recording
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def turn(self) -> Iterator[Span]:
+        """Trace one user turn; spans opened inside it become its children."""
+        span = Span("agent turn", "turn", uuid.uuid4().hex)
+        span.set("agent.turn.number", int(self.totals["turns"]) + 1)
+        self._turn = span
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.fail(f"{type(exc).__name__}: {exc}")
+            raise
+        finally:
+            _current.reset(token)
+            self._turn = None
+            span.end()
+            self._finish_turn(span)
+
+    @contextmanager
+    def span(self, name: str, kind: str, attributes: Optional[Dict[str, Any]] = None) -> Iterator[Span]:
+        """Time a child of the current turn; exceptions mark it failed and propagate."""
+        turn = self._turn
+        span = Span(name, kind, turn.trace_id if turn else uuid.uuid4().hex, turn, attributes)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.fail(f"{type(exc).__name__}: {exc}")
+            raise
+        finally:
+            _current.reset(token)
+            span.end()
+            self._finish(span, turn)
+
+    def current(self) -> Optional[Span]:
+        """The innermost span open in this thread or task."""
+        return current_span()
+
+    def _finish(self, span: Span, turn: Optional[Span]) -> None:
+        attrs = span.attributes
+        with self._lock:
+            if turn is not None:
+                turn.children.append(span)
+            totals = self.totals
+            if span.kind == "llm":
+                totals["llm_calls"] += 1
+                totals["llm_seconds"] += span.duration
+                totals["llm_errors"] += bool(span.error)
+                totals["input_tokens"] += attrs.get("gen_ai.usage.input_tokens", 0)
+                totals["output_tokens"] += attrs.get("gen_ai.usage.output_tokens", 0)
+                totals["cache_read_tokens"] += attrs.get("gen_ai.usage.cache_read_input_tokens", 0)
+                totals["cache_write_tokens"] += attrs.get("gen_ai.usage.cache_creation_input_tokens", 0)
+            elif span.kind == "tool":
+                totals["tool_calls"] += 1
+                totals["tool_seconds"] += span.duration
+                totals["tool_errors"] += bool(span.error)
+                name = attrs.get("gen_ai.tool.name", span.name)
+                tool = self.tools.get(name)
+                if tool is None:
+                    tool = self.tools[name] = {
+                        "calls": 0,
+                        "errors": 0,
+                        "bytes": 0,
+                        "seconds": 0.0,
+                        "max": 0.0,
+                        "recent": deque(maxlen=TOOL_LATENCY_WINDOW),
+                    }
+                tool["calls"] += 1
+                tool["errors"] += bool(span.error)
+                tool["bytes"] += attrs.get("tool.output_bytes", 0)
+                tool["seconds"] += span.duration
+                tool["max"] = max(tool["max"], span.duration)
+                tool["recent"].append(span.duration)
+            elif span.kind == "render":
+                totals["render_seconds"] += span.duration
+
+    def _finish_turn(self, span: Span) -> None:
+        with self._lock:
+            self.totals["turns"] += 1
+            self.totals["turn_seconds"] += span.duration
+            self.turns.append(span)
+        if self.export_path:
+            self.export(self.export_path)
+
+    # ------------------------------------------------------------------
+    # Reporting
+    # ------------------------------------------------------------------
+
+    def turn_summary(self, turn: Span) -> Dict[str, Any]:
+        """Where one turn's time and tokens went."""
+        llm = [s for s in turn.children if s.kind == "llm"]
+        tools = [s for s in turn.children if s.kind == "tool"]
+        render = sum(s.duration for s in turn.children if s.kind == "render")
+        llm_seconds = sum(s.duration for s in llm)
+        # Read-only tools run in parallel: count wall time, not the sum of spans
+        tool_seconds = _covered_seconds(tools)
+        return {
+            "number": turn.attributes.get("agent.turn.number"),
+            "seconds": turn.duration,
+            "llm_calls": len(llm),
+            "llm_seconds": llm_seconds,
+            "input_tokens": sum(s.attributes.get("gen_ai.usage.input_tokens", 0) for s in llm),
+            "output_tokens": sum(s.attributes.get("gen_ai.usage.output_tokens", 0) for s in llm),
+            "cache_read_tokens": sum(
+                s.attributes.get("gen_ai.usage.cache_read_input_tokens", 0) for s in llm
+            ),
+            "tool_calls": len(tools),
+            "tool_seconds": tool_seconds,
+            "render_seconds": render,
+            "other_seconds": max(turn.duration - llm_seconds - tool_seconds - render, 0.0),
+            "error": turn.error or next((s.error for s in llm if s.error), None),
+        }
+
+    def tool_summary(self) -> Dict[str, Dict[str, Any]]:
+        """Per-tool calls, errors, output bytes and latency (seconds; percentiles of recent calls)."""
+        with self._lock:
+            tools = {name: dict(t, recent=sorted(t["recent"])) for name, t in self.tools.items()}
+        summary = {}
+        for name, t in sorted(tools.items(), key=lambda item: -item[1]["seconds"]):
+            summary[name] = {
+                "calls": t["calls"],
+                "errors": t["errors"],
+                "bytes": t["bytes"],
+                "seconds": t["seconds"],
+                "p50": _percentile(t["recent"], 0.5),
+                "p90": _percentile(t["recent"], 0.9),
+                "max": t["max"],
+            }
+        return summary
+
+    # ------------------------------------------------------------------
+    # Export
+    # ------------------------------------------------------------------
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """Kept turns and their spans as an OTLP/JSON ``ExportTraceServiceRequest``."""
+        with self._lock:
+            spans = [s.to_otlp() for turn in self.turns for s in [turn] + turn.children]
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": _otlp_attributes(self.resource)},
+                    "scopeSpans": [{"scope": {"name": "coding_agent"}, "spans": spans}],
+                }
+            ]
+        }
+
+    def export(self, path: str) -> None:
+        """Write ``to_otlp()`` to *path*, replacing it atomically."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        atomic_write(path, json.dumps(self.to_otlp()).encode("utf-8"), prefix=".trace-")
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+def current_span() -> Optional[Span]:
+    """The innermost span open in this thread or task, from any tracer."""
+    return _current.get()
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # int64 values are strings in OTLP/JSON
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(v) for v in value]}}
+    return {"stringValue": str(value)}
+
+
+def _covered_seconds(spans: List[Span]) -> float:
+    """Wall time during which at least one of *spans* was running."""
+    intervals = sorted((s._start, s._start + s.duration) for s in spans)
+    covered = 0.0
+    end = float("-inf")
+    for start, stop in intervals:
+        if stop <= end:
+            continue
+        covered += stop - max(start, end)
+        end = stop
+    return covered
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def _get(obj: Any, name: str) -> Any:
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
@@ -0,0 +1,507 @@
+"""
+Pluggable transports between the agent loop and the model.
+
+The agent builds a request dict and hands it to a ``Transport``; which one
+decides where the response comes from:
+
+    LiteLLMTransport    the provider, through ``litellm`` (the default)
+    RecordingTransport  wraps another transport and saves every response to
+                        a directory, keyed by a hash of the request
+    ReplayTransport     serves a recording back, offline, with optional
+                        simulated latency
+    ScriptedTransport   a mock model that emits predetermined turns (text or
+                        tool calls) regardless of the request
+
+Recorded and scripted turns are stored as plain ``Turn`` dicts (content,
+tool calls, finish reason, usage) and rebuilt into litellm-shaped objects,
+whole or as stream chunks, so the agent cannot tell them from a live call.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Union
+
+from lazy_imports import load_litellm
+from streaming import StreamAccumulator
+
+# {"content", "tool_calls": [{"id", "name", "arguments"}], "finish_reason",
+#  "usage": {...}, "latency": seconds}
+Turn = Dict[str, Any]
+
+# Request keys that do not change what the model is asked
+UNHASHED_KEYS = {"stream", "stream_options"}
+
+# Temp paths in tool results differ between runs (mkdtemp suffixes); they
+# are masked before hashing so a replay still matches its recording
+VOLATILE_PATH = re.compile(r"(agent-[a-z]+-)[a-z0-9_]{8}")
+
+# Characters per synthesized stream chunk when replaying
+REPLAY_CHUNK_CHARS = 24
+
+# Usage fields kept in recordings
+USAGE_FIELDS = (
+    "prompt_tokens",
+    "completion_tokens",
+    "total_tokens",
+    "cache_read_input_tokens",
+    "cache_creation_input_tokens",
+)
+
+
+# True while a ModelRouter has another model ready to take the current
+# request, so layers below it hand failures up instead of retrying them
+_fallback_ready: ContextVar[bool] = ContextVar("fallback_ready", default=False)
+
+
+class ReplayMissError(LookupError):
+    pass
+
+
+@contextmanager
+def fallback_ready(ready: bool) -> Iterator[None]:
+    """Mark calls made inside the block as having (or not having) a fallback model."""
+    token = _fallback_ready.set(ready)
+    try:
+        yield
+    finally:
+        _fallback_ready.reset(token)
+
+
+def has_fallback() -> bool:
+    return _fallback_ready.get()
+
+
+def close_stream(chunks: Any) -> None:
+    """Abandon a stream of chunks, releasing its connection; litellm keeps it one level down."""
+    for stream in (chunks, getattr(chunks, "completion_stream", None)):
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+            return
+
+
+async def aclose_stream(chunks: Any) -> None:
+    """Abandon an async stream of chunks, releasing its connection."""
+    aclose = getattr(chunks, "aclose", None)
+    if aclose is not None:
+        await aclose()
+
+
+# ---------------------------------------------------------------------------
+# Base
+# ---------------------------------------------------------------------------
+
+class Transport:
+    """
+    Sends one completion request and returns a litellm-shaped response.
+
+    Subclasses either override all four entry points (a real backend) or
+    implement ``_turn`` (and optionally ``_delay``) and get them for free.
+    """
+
+    def complete(self, request: Dict[str, Any]) -> Any:
+        turn = self._turn(request)
+        time.sleep(self._delay(turn))
+        return response_from_turn(turn)
+
+    def stream(self, request: Dict[str, Any]) -> Iterator[Any]:
+        turn = self._turn(request)
+        time.sleep(self._delay(turn))
+        return iter(chunks_from_turn(turn))
+
+    async def acomplete(self, request: Dict[str, Any]) -> Any:
+        turn = self._turn(request)
+        await asyncio.sleep(self._delay(turn))
+        return response_from_turn(turn)
+
+    async def astream(self, request: Dict[str, Any]) -> AsyncIterator[Any]:
+        turn = self._turn(request)
+        await asyncio.sleep(self._delay(turn))
+        for chunk in chunks_from_turn(turn):
+            yield chunk
+
+    def close(self) -> None:
+        """Release threads and connections; the transport is not used after this."""
+
+    def _turn(self, request: Dict[str, Any]) -> Turn:
+        raise NotImplementedError
+
+    def _delay(self, turn: Turn) -> float:
+        """Simulated seconds before *turn* is delivered."""
+        return 0.0
+
+
+class LiteLLMTransport(Transport):
+    """Live calls through ``litellm.completion`` / ``acompletion``."""
+
+    def complete(self, request: Dict[str, Any]) -> Any:
+        return load_litellm().completion(**request)
+
+    def stream(self, request: Dict[str, Any]) -> Iterator[Any]:
+        return iter(load_litellm().completion(stream=True, **request))
+
+    async def acomplete(self, request: Dict[str, Any]) -> Any:
+        return await load_litellm().acompletion(**request)
+
+    async def astream(self, request: Dict[str, Any]) -> AsyncIterator[Any]:
+        async for chunk in await load_litellm().acompletion(stream=True, **request):
+            yield chunk
+
+
+# ---------------------------------------------------------------------------
+# Record / replay
+# ---------------------------------------------------------------------------
+
+def request_key(request: Dict[str, Any]) -> str:
+    """Stable hash of what *request* asks the model, ignoring transport details."""
+    relevant = {k: v for k, v in request.items() if k not in UNHASHED_KEYS}
+    canonical = json.dumps(_strip_cache_markup(relevant), sort_keys=True, default=str)
+    return hashlib.sha256(VOLATILE_PATH.sub(r"\1*", canonical).encode("utf-8")).hexdigest()[:32]
+
+
+def _strip_cache_markup(value: Any) -> Any:
+    """Drop ``cache_control`` so requests hash the same with or without --prompt-cache."""
+    if isinstance(value, dict):
+        out = {}
+        for k, v in value.items():
+            if k == "cache_control":
+                continue
+            if k == "content" and isinstance(v, list) and all(
+                isinstance(b, dict) and b.get("type") == "text" for b in v
+            ):
+                # Text blocks that were a plain string before breakpoints were added
+                v = "".join(b.get("text", "") for b in v)
+            out[k] = _strip_cache_markup(v)
+        return out
+    if isinstance(value, list):
+        return [_strip_cache_markup(v) for v in value]
+    return value
+
+
+class RecordingTransport(Transport):
+    """Pass requests to *inner* and save each response under *directory*."""
+
+    def __init__(self, directory: str, inner: Optional[Transport] = None):
+        self.directory = directory
+        self.inner = inner or LiteLLMTransport()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def complete(self, request: Dict[str, Any]) -> Any:
+        start = time.monotonic()
+        response = self.inner.complete(request)
+        self._save(request, turn_from_response(response, time.monotonic() - start))
+        return response
+
+    def stream(self, request: Dict[str, Any]) -> Iterator[Any]:
+        start = time.monotonic()
+        acc = StreamAccumulator()
+        for chunk in self.inner.stream(request):
+            acc.add_chunk(chunk)
+            yield chunk
+        self._save(request, turn_from_accumulator(acc, time.monotonic() - start))
+
+    async def acomplete(self, request: Dict[str, Any]) -> Any:
+        start = time.monotonic()
+        response = await self.inner.acomplete(request)
+        self._save(request, turn_from_response(response, time.monotonic() - start))
+        return response
+
+    async def astream(self, request: Dict[str, Any]) -> AsyncIterator[Any]:
+        start = time.monotonic()
+        acc = StreamAccumulator()
+        async for chunk in self.inner.astream(request):
+            acc.add_chunk(chunk)
+            yield chunk
+        self._save(request, turn_from_accumulator(acc, time.monotonic() - start))
+
+    def _save(self, request: Dict[str, Any], turn: Turn) -> None:
+        key = request_key(request)
+        path = os.path.join(self.directory, f"{key}.json")
+        with self._lock:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    turns = json.load(f)["turns"]
+            except (OSError, ValueError, KeyError):
+                turns = []
+            # The same request may be sent again (e.g. a retried turn); keep each answer
+            turns.append(turn)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"key": key, "turns": turns}, f, indent=1)
+            with open(os.path.join(self.directory, "sequence.jsonl"), "a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, "turn": len(turns) - 1}) + "\n")
+
+
+class ReplayTransport(Transport):
+    """
+    Serve responses recorded by ``RecordingTransport``, without a network.
+
+    Requests are matched by hash; a request that never matches exactly
+    (a tool result that differs run to run) falls back to the recording
+    made at the same position in the sequence, unless *strict*.
+    ``latency`` is a fixed delay in seconds per call, or ``"recorded"`` to
+    reproduce each call's original duration.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        latency: Union[None, float, str] = None,
+        strict: bool = False,
+    ):
+        self.directory = directory
+        self.latency = latency
+        self.strict = strict
+        self.calls = 0
+        self.misses = 0
+        self._served: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._sequence: List[Dict[str, Any]] = []
+        try:
+            with open(os.path.join(directory, "sequence.jsonl"), encoding="utf-8") as f:
+                self._sequence = [json.loads(line) for line in f if line.strip()]
+        except OSError:
+            pass
+
+    def _delay(self, turn: Turn) -> float:
+        if self.latency == "recorded":
+            return float(turn.get("latency") or 0.0)
+        return float(self.latency or 0.0)
+
+    def _turn(self, request: Dict[str, Any]) -> Turn:
+        key = request_key(request)
+        with self._lock:
+            position = self.calls
+            self.calls += 1
+            turns = self._load(key)
+            if turns is None:
+                if self.strict or position >= len(self._sequence):
+                    raise ReplayMissError(
+                        f"no recorded response for request {key} in {self.directory}"
+                    )
+                self.misses += 1
+                entry = self._sequence[position]
+                turns = self._load(entry["key"]) or []
+                return turns[min(entry["turn"], len(turns) - 1)]
+            index = self._served.get(key, 0)
+            self._served[key] = index + 1
+            # Repeats of the same request get the answers recorded for it, in order
+            return turns[min(index, len(turns) - 1)]
+
+    def _load(self, key: str) -> Optional[List[Turn]]:
+        try:
+            with open(os.path.join(self.directory, f"{key}.json"), encoding="utf-8") as f:
+                return json.load(f)["turns"] or None
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+# ---------------------------------------------------------------------------
+# Scripted mock model
+# ---------------------------------------------------------------------------
+
+class ScriptedTransport(Transport):
+    """
+    A fake model that plays back a fixed list of turns, one per request.
+
+    Each step is ``{"content": str}`` for a final answer, or
+    ``{"tool_calls": [{"name": ..., "arguments": {...}}], "content": ...}``
+    to request tools.  Once the script runs out it starts again from the
+    top if *loop*, otherwise it answers ``"Done."``.  Usage is estimated
+    from the request size, so token accounting still has numbers to add up.
+    """
+
+    def __init__(self, steps: List[Dict[str, Any]], loop: bool = False, latency: float = 0.0):
+        self.steps = steps
+        self.loop = loop
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _delay(self, turn: Turn) -> float:
+        return self.latency
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs: Any) -> "ScriptedTransport":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        steps = data["steps"] if isinstance(data, dict) else data
+        return cls(steps, **kwargs)
+
+    def _turn(self, request: Dict[str, Any]) -> Turn:
+        with self._lock:
+            n = self.calls
+            self.calls += 1
+        if self.steps and (self.loop or n < len(self.steps)):
+            step = self.steps[n % len(self.steps)]
+        else:
+            step = {"content": "Done."}
+        tool_calls = [
+            {
+                "id": f"call_{n}_{i}",
+                "name": call["name"],
+                "arguments": json.dumps(call.get("arguments", {})),
+            }
+            for i, call in enumerate(step.get("tool_calls") or [])
+        ]
+        prompt = len(json.dumps(request.get("messages", []), default=str)) // 4
+        completion = len(json.dumps(step)) // 4
+        return {
+            "content": step.get("content"),
+            "tool_calls": tool_calls,
+            "finish_reason": "tool_calls" if tool_calls else "stop",
+            "usage": {
+                "prompt_tokens": prompt,
+                "completion_tokens": completion,
+                "total_tokens": prompt + completion,
+            },
+        }
+
+
+def create_transport(
+    record: Optional[str] = None,
+    replay: Optional[str] = None,
+    mock_script: Optional[str] = None,
+    replay_latency: Union[None, float, str] = None,
+    fallback_models: Optional[List[str]] = None,
+    hedge: bool = False,
+    hedge_after: Optional[float] = None,
+    route: str = "order",
+    limits: Any = None,
+    max_retries: int = 0,
+) -> Optional[Transport]:
+    """
+    The transport for the --record / --replay / --mock-script options, if
+    any, behind a ``RetryingTransport`` drawing on the shared *limits*
+    (a ``ratelimit.RateLimits``) when retries or limits are configured,
+    and behind a ``ModelRouter`` when fallbacks or hedging are.
+    """
+    transport: Optional[Transport] = None
+    if record:
+        transport = RecordingTransport(record)
+    elif mock_script:
+        transport = ScriptedTransport.from_file(mock_script)
+    elif replay:
+        transport = ReplayTransport(replay, latency=replay_latency)
+    if limits is not None or max_retries:
+        from ratelimit import RetryingTransport
+
+        # Inside the router, so budgets apply to the model actually called; while
+        # the router has a fallback left, failures go straight back to it
+        transport = RetryingTransport(transport, limits=limits, max_retries=max_retries)
+    if fallback_models or hedge:
+        from router import ModelRouter
+
+        transport = ModelRouter(
+            fallback_models or [], inner=transport, hedge=hedge, hedge_after=hedge_after, prefer=route
+        )
+    return transport
+
+
+# ---------------------------------------------------------------------------
+# Turn <-> litellm-shaped objects
+# ---------------------------------------------------------------------------
+
+def turn_from_response(response: Any, latency: float = 0.0) -> Turn:
+    choice = response.choices[0]
+    message = choice.message
+    return {
+        "content": message.content,
+        "tool_calls": [
+            {"id": tc.id, "name": tc.function.name, "arguments": tc.function.arguments}
+            for tc in (message.tool_calls or [])
+        ],
+        "finish_reason": choice.finish_reason,
+        "usage": _usage_dict(getattr(response, "usage", None)),
+        "latency": round(latency, 4),
+    }
+
+
+def turn_from_accumulator(acc: StreamAccumulator, latency: float = 0.0) -> Turn:
+    message = acc.build_message()
+    return {
+        "content": message.content,
+        "tool_calls": [
+            {"id": tc.id, "name": tc.function.name, "arguments": tc.function.arguments}
+            for tc in (message.tool_calls or [])
+        ],
+        "finish_reason": acc.finish_reason,
+        "usage": _usage_dict(acc.usage),
+        "latency": round(latency, 4),
+    }
+
+
+def _usage_dict(usage: Any) -> Optional[Dict[str, int]]:
+    if usage is None:
+        return None
+    out = {}
+    for field in USAGE_FIELDS:
+        value = usage.get(field) if isinstance(usage, dict) else getattr(usage, field, None)
+        if isinstance(value, int):
+            out[field] = value
+    return out
+
+
+def _tool_call_objects(turn: Turn, with_index: bool = False) -> List[Any]:
+    calls = []
+    for i, tc in enumerate(turn.get("tool_calls") or []):
+        call = SimpleNamespace(
+            id=tc["id"],
+            type="function",
+            function=SimpleNamespace(name=tc["name"], arguments=tc["arguments"]),
+        )
+        if with_index:
+            call.index = i
+        calls.append(call)
+    return calls
+
+
+def response_from_turn(turn: Turn) -> Any:
+    """A non-streamed response object for *turn*."""
+    message = SimpleNamespace(
+        role="assistant",
+        content=turn.get("content"),
+        tool_calls=_tool_call_objects(turn) or None,
+    )
+    usage = turn.get("usage")
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=message, finish_reason=turn.get("finish_reason"))],
+        usage=SimpleNamespace(**usage) if usage else None,
+    )
+
+
+def chunks_from_turn(turn: Turn) -> List[Any]:
+    """Stream chunks that a ``StreamAccumulator`` reassembles into *turn*."""
+    chunks = []
+
+    def chunk(finish_reason: Optional[str] = None, usage: Any = None, **delta: Any) -> Any:
+        choice = SimpleNamespace(
+            delta=SimpleNamespace(role=delta.pop("role", None), **delta), finish_reason=finish_reason
+        )
+        return SimpleNamespace(choices=[choice], usage=usage)
+
+    content = turn.get("content") or ""
+    chunks.append(chunk(role="assistant", content=None, tool_calls=None))
+    for i in range(0, len(content), REPLAY_CHUNK_CHARS):
+        chunks.append(chunk(content=content[i : i + REPLAY_CHUNK_CHARS], tool_calls=None))
+    calls = _tool_call_objects(turn, with_index=True)
+    if calls:
+        chunks.append(chunk(content=None, tool_calls=calls))
+    usage = turn.get("usage")
+    chunks.append(
+        chunk(
+            finish_reason=turn.get("finish_reason") or "stop",
+            usage=SimpleNamespace(**usage) if usage else None,
+            content=None,
+            tool_calls=None,
+        )
+    )
+    return chunks